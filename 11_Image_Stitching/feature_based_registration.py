@@ -0,0 +1,119 @@
+"""
+Feature-based registration at a reduced working resolution.
+
+Features are detected on a copy of the image scaled to about work_megapix
+megapixels, then their coordinates are scaled back so that every homography
+is expressed in full-resolution pixels. Detection cost therefore no longer
+grows with the sensor resolution.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# points: float32 (N, 2) full-resolution keypoint coordinates
+# descriptors: (N, D) descriptor array
+# size: (width, height) of the full-resolution image
+Features = namedtuple('Features', ['points', 'descriptors', 'size'])
+
+
+def work_scale(size, megapix):
+    """
+    Scale factor bringing an image of (width, height) to about megapix megapixels
+
+    Returns:
+        Scale factor, at most 1.0
+    """
+    if megapix is None or megapix <= 0:
+        return 1.0
+    return min(1.0, float(np.sqrt(megapix * 1e6 / (size[0] * size[1]))))
+
+
+class FeatureExtractor:
+    """
+    Detects ORB or SIFT features on a downscaled copy of each image
+    """
+
+    def __init__(self, work_megapix=0.6, detector='sift', max_features=2000):
+        """
+        Args:
+            work_megapix: Working resolution in megapixels (None for full resolution)
+            detector: 'sift' or 'orb'
+            max_features: Maximum features per image
+        """
+        self.work_megapix = work_megapix
+        self.detector_name = detector
+        if detector == 'orb':
+            self.detector = cv2.ORB_create(nfeatures=max_features)
+            self.norm = cv2.NORM_HAMMING
+        elif detector == 'sift':
+            self.detector = cv2.SIFT_create(nfeatures=max_features)
+            self.norm = cv2.NORM_L2
+        else:
+            raise ValueError(f"Unknown detector: {detector}")
+        self.matcher = cv2.BFMatcher(self.norm)
+
+    def extract(self, img):
+        """
+        Detect and describe features
+
+        Args:
+            img: Input image (BGR or grayscale)
+
+        Returns:
+            Features with full-resolution coordinates
+        """
+        h, w = img.shape[:2]
+        scale = work_scale((w, h), self.work_megapix)
+        small = img if scale == 1.0 else cv2.resize(img, None, fx=scale, fy=scale,
+                                                     interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        keypoints, descriptors = self.detector.detectAndCompute(small, None)
+        points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+        # Keypoint coordinates refer to pixel centers; rescale around them
+        points = (points + 0.5) / scale - 0.5
+        return Features(points, descriptors, (w, h))
+
+    def match(self, a, b, ratio=0.75):
+        """
+        Ratio-test matches between two feature sets
+
+        Returns:
+            (src, dst): matched float32 points of a and b, each (M, 2)
+        """
+        empty = np.empty((0, 2), np.float32)
+        if a.descriptors is None or b.descriptors is None or len(a.points) < 2 or len(b.points) < 2:
+            return empty, empty
+        pairs = self.matcher.knnMatch(a.descriptors, b.descriptors, k=2)
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < ratio * p[1].distance]
+        if not good:
+            return empty, empty
+        src = a.points[[m.queryIdx for m in good]]
+        dst = b.points[[m.trainIdx for m in good]]
+        return src, dst
+
+
+def estimate_homography(src, dst, threshold=4.0, min_inliers=20):
+    """
+    RANSAC homography mapping src points onto dst points
+
+    Args:
+        src: Source points (N, 2)
+        dst: Destination points (N, 2)
+        threshold: RANSAC reprojection threshold in pixels
+        min_inliers: Minimum inliers for the result to be trusted
+
+    Returns:
+        (H, inliers) or (None, 0) if the estimate is unreliable
+    """
+    if len(src) < max(4, min_inliers):
+        return None, 0
+    H, mask = cv2.findHomography(src, dst, cv2.RANSAC, threshold)
+    if H is None:
+        return None, 0
+    inliers = int(mask.sum())
+    if inliers < min_inliers:
+        return None, 0
+    return H, inliers
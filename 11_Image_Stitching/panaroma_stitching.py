@@ -0,0 +1,346 @@
+"""
+Incremental panorama stitching for large image sets.
+
+Three resolutions are used, as in OpenCV's stitching pipeline:
+    - registration on features detected at work_megapix,
+    - seam estimation on a small "seam resolution" label canvas,
+    - composition at full resolution, tile by tile, into a memory-mapped canvas.
+Images are registered one at a time. A new image is first matched against
+the previous one; its predicted footprint is then looked up in a grid
+spatial index so that only overlapping images are matched, never all pairs.
+"""
+
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from feature_based_registration import FeatureExtractor, estimate_homography, work_scale
+from image_alignment import boxes_intersect, footprint_bounds, scaling, translation, warp_corners, warp_points
+
+
+class GridIndex:
+    """
+    Uniform-grid spatial index of axis-aligned boxes
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.boxes = {}
+
+    def _cells(self, box):
+        c = self.cell_size
+        x0, y0 = int(np.floor(box[0] / c)), int(np.floor(box[1] / c))
+        x1, y1 = int(np.floor(box[2] / c)), int(np.floor(box[3] / c))
+        return ((cx, cy) for cy in range(y0, y1 + 1) for cx in range(x0, x1 + 1))
+
+    def insert(self, key, box):
+        self.boxes[key] = box
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(key)
+
+    def query(self, box):
+        """Keys whose boxes intersect box"""
+        found = set()
+        for cell in self._cells(box):
+            found.update(self.cells.get(cell, ()))
+        return [k for k in found if boxes_intersect(self.boxes[k], box)]
+
+
+class IncrementalStitcher:
+    """
+    Registers images one by one and composes the mosaic tile by tile
+
+    Homographies map full-resolution image pixels to mosaic pixels of the
+    first image's frame; the canvas offset is applied only at composition.
+    """
+
+    def __init__(self, work_megapix=0.6, seam_megapix=0.1, detector='sift', max_features=2000,
+                 max_candidates=6, ransac_threshold=4.0, min_inliers=25, tile_size=1024,
+                 cache_size=4):
+        """
+        Args:
+            work_megapix: Registration resolution in megapixels
+            seam_megapix: Seam estimation resolution in megapixels (per input image)
+            detector: Feature detector, 'sift' or 'orb'
+            max_features: Features per image at the working resolution
+            max_candidates: Maximum overlapping images matched per new image
+            ransac_threshold: RANSAC threshold in full-resolution pixels
+            min_inliers: Minimum inliers to accept a pairwise match
+            tile_size: Composition tile side in pixels
+            cache_size: Number of decoded full-resolution images kept in memory;
+                images added as arrays are spilled to .npy files in a temporary
+                directory so they go through the same cache
+        """
+        self.extractor = FeatureExtractor(work_megapix, detector, max_features)
+        self.seam_megapix = seam_megapix
+        self.max_candidates = max_candidates
+        self.ransac_threshold = ransac_threshold
+        self.min_inliers = min_inliers
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+
+        self.sources = []
+        self.features = []
+        self.homographies = []
+        self.index = None
+        self.match_attempts = 0
+        self._cache = OrderedDict()
+        self._spill_dir = None
+
+    def _load(self, i):
+        source = self.sources[i]
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+        img = np.load(source) if source.endswith('.npy') else cv2.imread(source, cv2.IMREAD_COLOR)
+        if img is None:
+            raise IOError(f"Cannot read image: {source}")
+        self._cache[i] = img
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return img
+
+    def _match_into_mosaic(self, features, candidates):
+        """Correspondences from the new image to mosaic coordinates, per candidate"""
+        src_all, dst_all = [], []
+        for j in candidates:
+            self.match_attempts += 1
+            src, dst = self.extractor.match(features, self.features[j])
+            H, _ = estimate_homography(src, dst, self.ransac_threshold, self.min_inliers)
+            if H is None:
+                continue
+            residual = np.linalg.norm(cv2.perspectiveTransform(src[None], H)[0] - dst, axis=1)
+            keep = residual < self.ransac_threshold
+            src_all.append(src[keep])
+            dst_all.append(warp_points(self.homographies[j], dst[keep]))
+        if not src_all:
+            return None, None
+        return np.vstack(src_all), np.vstack(dst_all).astype(np.float32)
+
+    def add(self, image):
+        """
+        Register one image against the mosaic
+
+        Args:
+            image: BGR image array or path to an image file
+
+        Returns:
+            Index of the image, or None if it could not be registered
+        """
+        img = cv2.imread(image, cv2.IMREAD_COLOR) if isinstance(image, str) else image
+        if img is None:
+            raise IOError(f"Cannot read image: {image}")
+        features = self.extractor.extract(img)
+
+        if not self.homographies:
+            H = np.eye(3)
+            w, h = features.size
+            self.index = GridIndex(cell_size=max(w, h))
+        else:
+            # Predict the footprint from the previous image, then match all overlapping images
+            last = len(self.homographies) - 1
+            src, dst = self._match_into_mosaic(features, [last])
+            if src is None:
+                recent = list(range(max(0, last - self.max_candidates), last))[::-1]
+                src, dst = self._match_into_mosaic(features, recent)
+                if src is None:
+                    return None
+            H, _ = estimate_homography(src, dst, self.ransac_threshold, self.min_inliers)
+            if H is None:
+                return None
+
+            box = footprint_bounds(H, features.size)
+            overlapping = [j for j in self.index.query(box) if j != last]
+            overlapping.sort(key=lambda j: -_overlap_area(box, self.index.boxes[j]))
+            if overlapping:
+                more_src, more_dst = self._match_into_mosaic(features, overlapping[:self.max_candidates - 1])
+                if more_src is not None:
+                    src, dst = np.vstack([src, more_src]), np.vstack([dst, more_dst])
+                    H_joint, _ = estimate_homography(src, dst, self.ransac_threshold, self.min_inliers)
+                    H = H if H_joint is None else H_joint
+
+        i = len(self.sources)
+        if not isinstance(image, str):
+            # Keep only a path, so in-memory inputs are not all held until compose()
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.mkdtemp(prefix='stitch_sources_')
+            image = os.path.join(self._spill_dir, f'{i}.npy')
+            np.save(image, img)
+        self.sources.append(image)
+        self.features.append(features)
+        self.homographies.append(H)
+        self.index.insert(i, footprint_bounds(H, features.size))
+        return i
+
+    def canvas_bounds(self):
+        """
+        Integer mosaic bounds (x0, y0, width, height) in first-image coordinates
+        """
+        corners = np.vstack([warp_corners(H, f.size) for H, f in zip(self.homographies, self.features)])
+        x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(corners.max(axis=0)).astype(int)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def find_seams(self):
+        """
+        Assign every mosaic pixel to one image on a low-resolution label canvas
+
+        Each pixel goes to the image whose footprint contains it farthest from
+        the footprint border (distance-transform seams, as OpenCV's Voronoi
+        seam finder). Only footprint polygons are needed, not image pixels.
+
+        Returns:
+            (labels, seam_scale): uint16 label canvas (0 = empty, i + 1 = image i)
+            and the mosaic-to-canvas scale
+        """
+        x0, y0, width, height = self.canvas_bounds()
+        w, h = self.features[0].size
+        seam_scale = work_scale((w, h), self.seam_megapix)
+        sw, sh = int(np.ceil(width * seam_scale)), int(np.ceil(height * seam_scale))
+        to_seam = scaling(seam_scale) @ translation(-x0, -y0)
+
+        labels = np.zeros((sh, sw), dtype=np.uint16)
+        best = np.zeros((sh, sw), dtype=np.float32)
+        mask = np.zeros((sh, sw), dtype=np.uint8)
+        for i, (H, f) in enumerate(zip(self.homographies, self.features)):
+            corners = warp_corners(to_seam @ H, f.size)
+            mask[:] = 0
+            cv2.fillConvexPoly(mask, np.round(corners).astype(np.int32), 1)
+            dist = cv2.distanceTransform(mask, cv2.DIST_L2, 3)
+            better = dist > best
+            best[better] = dist[better]
+            labels[better] = i + 1
+        return labels, seam_scale
+
+    def compose(self, path=None):
+        """
+        Compose the full-resolution mosaic into a memory-mapped file
+
+        Each image is decoded once and warped only into the tiles its
+        footprint touches, so peak memory is one image plus one tile.
+
+        Args:
+            path: Output .npy path for the canvas (default: a temporary file)
+
+        Returns:
+            numpy.memmap of shape (height, width, 3), dtype uint8
+        """
+        labels, seam_scale = self.find_seams()
+        x0, y0, width, height = self.canvas_bounds()
+        if path is None:
+            path = os.path.join(tempfile.mkdtemp(prefix='mosaic_'), 'mosaic.npy')
+        canvas = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+
+        T = self.tile_size
+        offset = translation(-x0, -y0)
+        for i, (H, f) in enumerate(zip(self.homographies, self.features)):
+            img = self._load(i)
+            bx0, by0, bx1, by1 = footprint_bounds(offset @ H, f.size)
+            for ty in range(max(int(by0) // T, 0), min(int(by1) // T, (height - 1) // T) + 1):
+                for tx in range(max(int(bx0) // T, 0), min(int(bx1) // T, (width - 1) // T) + 1):
+                    tw, th = min(T, width - tx * T), min(T, height - ty * T)
+                    to_tile = translation(-tx * T, -ty * T) @ offset @ H
+
+                    # Seam labels of this tile, upsampled from the label canvas
+                    label_map = np.array([[seam_scale, 0, tx * T * seam_scale],
+                                          [0, seam_scale, ty * T * seam_scale]])
+                    tile_labels = cv2.warpAffine(labels, label_map, (tw, th),
+                                                 flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP)
+                    own = tile_labels == i + 1
+                    if not own.any():
+                        continue
+                    warped = cv2.warpPerspective(img, to_tile, (tw, th), flags=cv2.INTER_LINEAR,
+                                                 borderMode=cv2.BORDER_REFLECT)
+                    tile = canvas[ty * T:ty * T + th, tx * T:tx * T + tw]
+                    tile[own] = warped[own]
+        canvas.flush()
+        return canvas
+
+
+def _overlap_area(a, b):
+    return max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+
+
+def make_synthetic_survey(rows=4, cols=5, view_size=(960, 720), overlap=0.4, seed=0):
+    """
+    Cut overlapping, slightly rotated and scaled views out of a large texture
+
+    Views follow a boustrophedon flight pattern, like an aerial survey.
+
+    Returns:
+        (views, ground_truth): list of BGR images and list of 3x3 homographies
+        mapping view pixels to the first view's frame
+    """
+    rng = np.random.default_rng(seed)
+    vw, vh = view_size
+    step_x, step_y = vw * (1 - overlap), vh * (1 - overlap)
+    W, H = int(vw + step_x * (cols + 1)), int(vh + step_y * (rows + 1))
+
+    scene = rng.integers(0, 256, (H // 4, W // 4, 3), dtype=np.uint8)
+    scene = cv2.resize(scene, (W, H), interpolation=cv2.INTER_CUBIC)
+    for _ in range(400):
+        center = (int(rng.integers(0, W)), int(rng.integers(0, H)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(scene, center, int(rng.integers(5, 60)), color, -1)
+    scene = cv2.GaussianBlur(scene, (0, 0), 1.0)
+
+    views, scene_from_view = [], []
+    for r in range(rows):
+        order = range(cols) if r % 2 == 0 else range(cols - 1, -1, -1)
+        for c in order:
+            cx = vw / 2 + step_x * (c + 0.5) + rng.uniform(-20, 20)
+            cy = vh / 2 + step_y * (r + 0.5) + rng.uniform(-20, 20)
+            A = cv2.getRotationMatrix2D((vw / 2, vh / 2), rng.uniform(-4, 4), rng.uniform(0.97, 1.03))
+            A[:, 2] += (cx - vw / 2, cy - vh / 2)
+            M = np.vstack([A, [0, 0, 1]])
+            views.append(cv2.warpPerspective(scene, M, (vw, vh), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP))
+            scene_from_view.append(M)
+    ref = np.linalg.inv(scene_from_view[0])
+    return views, [ref @ M for M in scene_from_view]
+
+
+def benchmark_stitching(rows=4, cols=5):
+    """
+    Time each stage on a synthetic survey and check registration accuracy
+
+    Returns:
+        Dict with stage timings, match attempts and mean corner error in pixels
+    """
+    views, truth = make_synthetic_survey(rows, cols)
+    stitcher = IncrementalStitcher()
+
+    t0 = time.perf_counter()
+    registered = [stitcher.add(v) for v in views]
+    t_register = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stitcher.find_seams()
+    t_seams = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    canvas = stitcher.compose()
+    t_compose = time.perf_counter() - t0
+
+    errors = [np.linalg.norm(warp_corners(stitcher.homographies[i], v.shape[1::-1]) -
+                             warp_corners(truth[k], v.shape[1::-1]), axis=1).mean()
+              for k, (i, v) in enumerate(zip(registered, views)) if i is not None]
+    n = len(views)
+    return {
+        'images': n,
+        'registered': sum(i is not None for i in registered),
+        'match_attempts': stitcher.match_attempts,
+        'all_pairs': n * (n - 1) // 2,
+        'register_s': t_register,
+        'seams_s': t_seams,
+        'compose_s': t_compose,
+        'canvas': canvas.shape,
+        'corner_error_px': float(np.mean(errors)),
+    }
+
+
+if __name__ == "__main__":
+    for key, value in benchmark_stitching().items():
+        print(f"{key:>16}: {value:.3f}" if isinstance(value, float) else f"{key:>16}: {value}")
@@ -0,0 +1,412 @@
+"""
+Batched histograms, histogram comparison and tiled CLAHE.
+
+Histograms of many frames (or many tiles of one frame) are one np.bincount
+over packed indices: every pixel's bin index is offset by its frame's
+position times the number of bins, so a single call fills the whole
+(frames, bins) table. Joint 2D/3D colour histograms pack the per-channel
+bins into one index the same way. Comparison metrics follow cv2.compareHist
+but broadcast over leading axes, so thousands of pairs (or a full pairwise
+matrix) are compared in one vectorized expression.
+
+CLAHE computes all tile histograms with the same batched bincount, clips
+and redistributes them for all tiles at once, and interpolates between the
+tile lookup tables with one cv2.remap over a small (tiles_y, 256 * tiles_x)
+table image: the output for value v at (x, y) is a bilinear sample at
+column v * tiles_x + tile_x and row tile_y. Row strips run in threads.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+COMPARE_METHODS = ('correlation', 'chi-square', 'intersection', 'bhattacharyya', 'chi-square-alt', 'kl')
+
+
+def _per_channel_bins(bins, n):
+    """Bins of every channel from an int or one int per channel"""
+    if np.isscalar(bins):
+        return (int(bins),) * n
+    bins = tuple(int(b) for b in bins)
+    if len(bins) != n:
+        raise ValueError(f"Expected {n} bin counts, got {len(bins)}")
+    return bins
+
+
+def _per_channel_ranges(ranges, n):
+    """
+    [lo, hi) of every channel from one (lo, hi) pair, a flat cv2.calcHist
+    style list (lo0, hi0, lo1, hi1, ...) or one pair per channel
+    """
+    if all(np.isscalar(v) for v in ranges):
+        flat = tuple(ranges)
+        if len(flat) == 2:
+            return (flat,) * n
+        if len(flat) == 2 * n:
+            return tuple(zip(flat[::2], flat[1::2]))
+    else:
+        pairs = tuple(tuple(r) for r in ranges)
+        if len(pairs) == n and all(len(r) == 2 for r in pairs):
+            return pairs
+    raise ValueError(f"Expected one (lo, hi) range or {n} of them, got {ranges!r}")
+
+
+def _bin_index(values, bins, value_range):
+    """
+    Bin index of every value and a mask of values inside [lo, hi) (None if
+    all are). Indices are floor(v * a + b) in double with a = bins / (hi -
+    lo) and b = -lo * a, clamped to the last bin, as cv2.calcHist computes
+    them. Full-range uint8 input stays uint8 so the caller's first index
+    arithmetic is the only widening pass; other uint8 ranges go through a
+    256-entry table.
+    """
+    lo, hi = value_range
+    if values.dtype == np.uint8 and (lo, hi) == (0, 256) and 256 % bins == 0:
+        shift = (256 // bins).bit_length() - 1
+        if bins == 256:
+            return values, None
+        if 1 << shift == 256 // bins:
+            return values >> shift, None
+        return values // (256 // bins), None
+    a = bins / (hi - lo)
+    b = -lo * a
+    if values.dtype == np.uint8:
+        levels = np.arange(256, dtype=np.float64)
+        table = np.clip(np.floor(levels * a + b), 0, bins - 1).astype(np.intp)
+        return table[values], ((levels >= lo) & (levels < hi))[values]
+    values = values.astype(np.float64)
+    valid = (values >= lo) & (values < hi)
+    return np.clip(np.floor(values * a + b), 0, bins - 1).astype(np.intp), valid
+
+
+def _chunk_bounds(n, pixels_per_frame, chunk_pixels):
+    """Frame ranges of about chunk_pixels pixels (cache-sized index arrays)"""
+    step = max(chunk_pixels // max(pixels_per_frame, 1), 1)
+    return [(f0, min(f0 + step, n)) for f0 in range(0, n, step)]
+
+
+def histograms(frames, channels=None, bins=256, ranges=(0, 256), chunk_pixels=1 << 16):
+    """
+    Histograms of many frames with one bincount per chunk of frames
+
+    Bin indices are packed as a mixed-radix number with the frame as the
+    most significant digit, so one bincount fills the (frames, bins) table.
+
+    Args:
+        frames: (N, H, W) grayscale or (N, H, W, C) multi-channel stack (a
+            single frame may be passed as a stack of one)
+        channels: Channel indices combined into one joint histogram, e.g.
+            (0, 1, 2) for a 3D colour histogram; None for grayscale stacks
+        bins: Bins per channel (int or one per channel)
+        ranges: [lo, hi) value range: one pair, a flat cv2.calcHist style
+            list or one pair per channel; values outside are not counted, as
+            in cv2.calcHist
+        chunk_pixels: Pixels indexed per bincount call
+
+    Returns:
+        (N, *bins) int64 counts
+    """
+    frames = np.asarray(frames)
+    n = len(frames)
+    if channels is None:
+        planes = [frames.reshape(n, -1)]
+    else:
+        planes = [frames.reshape(n, -1, frames.shape[-1])[..., c] for c in channels]
+    bins = _per_channel_bins(bins, len(planes))
+    ranges = _per_channel_ranges(ranges, len(planes))
+    total = int(np.prod(bins))
+    out = np.empty((n, total), dtype=np.int64)
+    for f0, f1 in _chunk_bounds(n, planes[0].shape[1], chunk_pixels):
+        index = np.arange(f1 - f0)[:, None]
+        valid = None
+        for plane, b, r in zip(planes, bins, ranges):
+            q, inside = _bin_index(plane[f0:f1], b, r)
+            if index.shape[1] == 1:
+                index = index * b + q
+            else:
+                index *= b
+                index += q
+            if inside is not None:
+                valid = inside if valid is None else valid & inside
+        if valid is not None:
+            index = index[valid]
+        out[f0:f1] = np.bincount(index.ravel(), minlength=(f1 - f0) * total).reshape(f1 - f0, total)
+    return out.reshape(n, *bins)
+
+
+def channel_histograms(frames, bins=256, value_range=(0, 256), chunk_pixels=1 << 16):
+    """
+    Separate 1D histogram of every channel of every frame
+
+    Channels are a digit of the packed index, so no channel is copied out.
+
+    Args:
+        frames: (N, H, W, C) stack
+
+    Returns:
+        (N, C, bins) int64 counts
+    """
+    frames = np.asarray(frames)
+    n, channels = len(frames), frames.shape[-1]
+    flat = frames.reshape(n, -1, channels)
+    out = np.empty((n, channels * bins), dtype=np.int64)
+    for f0, f1 in _chunk_bounds(n, flat.shape[1] * channels, chunk_pixels):
+        offsets = (np.arange(f1 - f0)[:, None, None] * channels + np.arange(channels)) * bins
+        q, valid = _bin_index(flat[f0:f1], bins, value_range)
+        index = offsets + q
+        if valid is not None:
+            index = index[valid]
+        out[f0:f1] = np.bincount(index.ravel(), minlength=(f1 - f0) * channels * bins).reshape(f1 - f0, -1)
+    return out.reshape(n, channels, bins)
+
+
+def compare_histograms(h1, h2, method='correlation', hist_axes=1):
+    """
+    cv2.compareHist metrics broadcast over any leading axes
+
+    compare_histograms(a[:, None], b[None]) gives the full pairwise matrix.
+    Correlation and Bhattacharyya reduce to dot products (np.einsum), the
+    others to one elementwise expression per bin.
+
+    Args:
+        h1, h2: Histogram arrays whose last hist_axes axes are the bins
+        method: One of COMPARE_METHODS (cv2.HISTCMP_CORREL, CHISQR,
+            INTERSECT, BHATTACHARYYA, CHISQR_ALT, KL_DIV)
+        hist_axes: Number of trailing bin axes (2 or 3 for joint histograms)
+
+    Returns:
+        Array of the broadcast leading shape
+    """
+    h1 = np.asarray(h1, dtype=np.float64)
+    h2 = np.asarray(h2, dtype=np.float64)
+    h1 = h1.reshape(h1.shape[:h1.ndim - hist_axes] + (-1,))
+    h2 = h2.reshape(h2.shape[:h2.ndim - hist_axes] + (-1,))
+    eps = np.finfo(np.float64).eps
+
+    def dot(a, b):
+        return np.einsum('...i,...i->...', a, b)
+
+    if method == 'correlation':
+        n = h1.shape[-1]
+        s1, s2 = h1.sum(axis=-1), h2.sum(axis=-1)
+        num = dot(h1, h2) - s1 * s2 / n
+        den = (dot(h1, h1) - s1 * s1 / n) * (dot(h2, h2) - s2 * s2 / n)
+        return np.divide(num, np.sqrt(np.abs(den)), out=np.ones(np.shape(num)), where=np.abs(den) > eps)
+    if method == 'chi-square':
+        # Bins with an empty h1 are skipped, as in cv2: an infinite denominator
+        diff = h1 - h2
+        diff *= diff
+        diff /= np.where(np.abs(h1) > eps, h1, np.inf)
+        return diff.sum(axis=-1)
+    if method == 'intersection':
+        return np.minimum(h1, h2).sum(axis=-1)
+    if method == 'bhattacharyya':
+        s = h1.sum(axis=-1) * h2.sum(axis=-1)
+        overlap = dot(np.sqrt(h1), np.sqrt(h2))
+        scale = np.divide(1.0, np.sqrt(np.abs(s)), out=np.ones(np.shape(s)), where=np.abs(s) > eps)
+        return np.sqrt(np.maximum(1 - overlap * scale, 0))
+    if method == 'chi-square-alt':
+        diff, total = h1 - h2, h1 + h2
+        diff *= diff
+        diff /= np.where(np.abs(total) > eps, total, np.inf)
+        return 2 * diff.sum(axis=-1)
+    if method == 'kl':
+        p1, p2 = np.maximum(h1, 1e-10), np.maximum(h2, 1e-10)
+        return dot(p1, np.log(p1 / p2))
+    raise ValueError(f"Unknown comparison method: {method}")
+
+
+def clahe_tables(tile_hist, tile_area, clip_limit):
+    """
+    CLAHE lookup tables of all tiles at once, as cv2.createCLAHE
+
+    Counts above the clip are cut and spread evenly over all bins; the
+    remainder adds one count at every (256 // remainder)-th bin from 0.
+
+    Args:
+        tile_hist: (tiles, 256) counts
+        tile_area: Pixels per tile
+        clip_limit: cv2 clip limit (relative to a flat histogram; 0 disables)
+
+    Returns:
+        (tiles, 256) float32 tables
+    """
+    hist = tile_hist.astype(np.int64)
+    if clip_limit > 0:
+        clip = max(int(clip_limit * tile_area / 256), 1)
+        excess = np.maximum(hist - clip, 0).sum(axis=1)
+        np.minimum(hist, clip, out=hist)
+        batch, residual = np.divmod(excess, 256)
+        hist += batch[:, None]
+        step = np.maximum(256 // np.maximum(residual, 1), 1)[:, None]
+        levels = np.arange(256)
+        hist += (levels % step == 0) & (levels // step < residual[:, None])
+    cdf = np.cumsum(hist, axis=1)
+    return np.clip(np.rint(cdf * np.float32(255 / tile_area)), 0, 255).astype(np.float32)
+
+
+class CLAHE:
+    """
+    Contrast limited adaptive histogram equalization over a tile grid
+    """
+
+    def __init__(self, clip_limit=2.0, tile_grid=(8, 8), strip_height=256, workers=None):
+        """
+        Args:
+            clip_limit: Contrast limit as in cv2.createCLAHE (0 disables clipping)
+            tile_grid: Tiles (x, y)
+            strip_height: Rows per thread when interpolating
+            workers: Thread count (default: CPU count)
+        """
+        self.clip_limit = clip_limit
+        self.tile_grid = tile_grid
+        self.strip_height = strip_height
+        self.workers = workers or os.cpu_count()
+
+    def _map(self, fn, items):
+        if self.workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(fn, items))
+        return [fn(item) for item in items]
+
+    def tables(self, gray):
+        """
+        Lookup tables of all tiles
+
+        Returns:
+            ((tiles_y, tiles_x, 256) float32 tables, (tile_h, tile_w))
+        """
+        tx, ty = self.tile_grid
+        h, w = gray.shape
+        if h % ty or w % tx:
+            # cv2 pads both axes with reflected borders when either one does not divide
+            gray = cv2.copyMakeBorder(gray, 0, ty - h % ty, 0, tx - w % tx, cv2.BORDER_REFLECT_101)
+        th, tw = gray.shape[0] // ty, gray.shape[1] // tx
+
+        def band(j):
+            # One tile row as tx frames of th x tw pixels
+            tiles = gray[j * th:(j + 1) * th].reshape(th, tx, tw).transpose(1, 0, 2)
+            return histograms(tiles)
+
+        tile_hist = np.concatenate(self._map(band, list(range(ty))))
+        return clahe_tables(tile_hist, th * tw, self.clip_limit).reshape(ty, tx, 256), (th, tw)
+
+    def apply(self, img):
+        """
+        Equalize a uint8 grayscale image, or the luma of a BGR image
+
+        Returns:
+            Equalized image of the same shape. cv2.remap quantizes the
+            interpolation weights to 1/32, so results differ from
+            cv2.createCLAHE by up to 1/64 of the table difference between
+            neighbouring tiles: one level with clipping, a few without
+        """
+        if img.ndim == 3:
+            yuv = cv2.cvtColor(img, cv2.COLOR_BGR2YUV)
+            yuv[..., 0] = self.apply(yuv[..., 0])
+            return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR)
+        tx, ty = self.tile_grid
+        tables, (th, tw) = self.tables(img)
+        # Columns v * tx + tile_x, rows tile_y
+        table_image = np.ascontiguousarray(tables.transpose(0, 2, 1).reshape(ty, 256 * tx))
+        h, w = img.shape
+        map_x = np.clip(np.arange(w, dtype=np.float32) / np.float32(tw) - 0.5, 0, tx - 1).astype(np.float32)
+        map_y = np.clip(np.arange(h, dtype=np.float32) / np.float32(th) - 0.5, 0, ty - 1).astype(np.float32)
+        out = np.empty_like(img)
+
+        def strip(y0):
+            y1 = min(y0 + self.strip_height, h)
+            xs = img[y0:y1].astype(np.float32)
+            xs *= np.float32(tx)
+            xs += map_x
+            ys = np.repeat(map_y[y0:y1, None], w, axis=1)
+            sampled = cv2.remap(table_image, xs, ys, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+            out[y0:y1] = cv2.convertScaleAbs(sampled)
+
+        self._map(strip, list(range(0, h, self.strip_height)))
+        return out
+
+
+def make_synthetic_frames(n=2000, size=(160, 120), seed=0):
+    """Stack of small BGR frames: drifting colour gradients with noise"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    ramp = np.linspace(0, 1, w, dtype=np.float32)[None, :] * np.linspace(0.3, 1, h, dtype=np.float32)[:, None]
+    base = np.stack([ramp, ramp[::-1], 1 - ramp], axis=2) * 200
+    gains = rng.uniform(0.6, 1.2, (n, 1, 1, 3)).astype(np.float32)
+    frames = base[None] * gains + rng.normal(0, 10, (n, h, w, 3)).astype(np.float32)
+    return np.clip(frames, 0, 255).astype(np.uint8)
+
+
+def make_synthetic_scene(size=(4000, 3000), seed=0):
+    """Low-contrast grayscale scene with a dark and a bright region"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = cv2.GaussianBlur(rng.normal(0, 1, (h // 8, w // 8)).astype(np.float32), (0, 0), 4)
+    img = cv2.resize(img, (w, h), interpolation=cv2.INTER_LINEAR)
+    img = 90 + 25 * img / np.abs(img).max()
+    img[:, : w // 3] *= 0.4
+    img += rng.normal(0, 3, img.shape).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def benchmark_histograms(frame_sets=((100000, (16, 16)), (2000, (160, 120))), clahe_size=(4000, 3000)):
+    """
+    Batched histograms and comparisons against per-frame cv2 loops, and
+    tiled CLAHE against cv2.createCLAHE
+
+    Args:
+        frame_sets: (frame count, (width, height)) stacks to histogram
+
+    Returns:
+        List of dicts with task, method, milliseconds and the largest
+        difference from the cv2 result
+    """
+    results = []
+
+    def timed(task, method, fn):
+        t0 = time.perf_counter()
+        value = fn()
+        results.append({'task': task, 'method': method, 'ms': 1e3 * (time.perf_counter() - t0), 'max_diff': 0})
+        return value
+
+    for n_frames, size in frame_sets:
+        frames = make_synthetic_frames(n_frames, size)
+        label = f"{n_frames} x {size[0]}x{size[1]}"
+        batched = timed(f'{label} 1D per channel', 'bincount batch', lambda: channel_histograms(frames))
+        looped = timed(f'{label} 1D per channel', 'cv2.calcHist loop', lambda: np.array([
+            [cv2.calcHist([f], [c], None, [256], [0, 256]).ravel() for c in range(3)] for f in frames]))
+        results[-1]['max_diff'] = float(np.abs(batched - looped).max())
+
+        joint = timed(f'{label} 3D 8x8x8', 'bincount batch', lambda: histograms(frames, (0, 1, 2), 8))
+        looped = timed(f'{label} 3D 8x8x8', 'cv2.calcHist loop', lambda: np.array([
+            cv2.calcHist([f], [0, 1, 2], None, [8, 8, 8], [0, 256] * 3) for f in frames]))
+        results[-1]['max_diff'] = float(np.abs(joint - looped).max())
+
+    # Consecutive-frame comparisons of 4x4x4 joint histograms of the first
+    # stack. cv2.compareHist reads a 3D numpy array as a multi-channel
+    # image, so it gets the flattened histograms
+    joint = histograms(make_synthetic_frames(*frame_sets[0]), (0, 1, 2), 4)
+    a, b = joint[:-1].astype(np.float32), joint[1:].astype(np.float32)
+    flat_a, flat_b = a.reshape(len(a), -1), b.reshape(len(b), -1)
+    methods = {'correlation': cv2.HISTCMP_CORREL, 'chi-square': cv2.HISTCMP_CHISQR,
+               'bhattacharyya': cv2.HISTCMP_BHATTACHARYYA}
+    for name, flag in methods.items():
+        ours = timed(f'{len(a)} pairs {name}', 'vectorized', lambda: compare_histograms(a, b, name, hist_axes=3))
+        ref = timed(f'{len(a)} pairs {name}', 'cv2.compareHist loop',
+                    lambda: np.array([cv2.compareHist(x, y, flag) for x, y in zip(flat_a, flat_b)]))
+        results[-1]['max_diff'] = float(np.abs((ours - ref) / np.maximum(np.abs(ref), 1)).max())
+
+    scene = make_synthetic_scene(clahe_size)
+    ours = timed('CLAHE', 'tiled remap', lambda: CLAHE(2.0, (8, 8)).apply(scene))
+    ref = timed('CLAHE', 'cv2.createCLAHE', lambda: cv2.createCLAHE(2.0, (8, 8)).apply(scene))
+    results[-1]['max_diff'] = float(cv2.absdiff(ours, ref).max())
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_histograms():
+        print(f"{stats['task']:<40} {stats['method']:<22} {stats['ms']:9.1f} ms  max |diff| {stats['max_diff']:.3g}")
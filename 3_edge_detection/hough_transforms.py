@@ -0,0 +1,648 @@
+"""
+Hough transforms for lines, circles and ellipses with gradient-direction voting.
+
+Edge points come with the direction of their image gradient, which is the
+normal of the curve through them. Instead of voting for every line angle
+(or every centre on a ring around the point), each point votes only within
+a narrow angle band around that normal: a line gets 2 * band / theta_res + 1
+votes per point instead of pi / theta_res, and a circle or ellipse gets one
+centre per band offset and polarity instead of a full ring. All votes of a
+batch are cast at once as flat accumulator indices and counted with
+np.bincount; peaks are picked with a cv2.dilate non-maximum suppression.
+
+Detection is coarse-to-fine. Lines are voted at the nominal resolution and
+every peak is refined on a finer grid using only the edge points that voted
+for it. Circles and ellipses are voted on a coarse grid of shapes into
+large centre cells, keeping only the best score over the shapes per cell
+so memory does not grow with the parameter grid; every peak is then
+refined at full resolution by re-voting the points near the coarse curve
+over a grid of shapes whose step halves each round.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+def edge_points(gray, low=50, high=150, ksize=3):
+    """
+    Canny edge points and their gradient directions
+
+    The Sobel derivatives are computed once and reused for both the Canny
+    edges and the angles.
+
+    Args:
+        gray: uint8 grayscale image
+        low: Lower Canny hysteresis threshold
+        high: Upper Canny hysteresis threshold
+        ksize: Sobel aperture
+
+    Returns:
+        (xs, ys, angles) float32 arrays in raster order, angles in radians
+        from atan2(gy, gx)
+    """
+    gx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=ksize, borderType=cv2.BORDER_REPLICATE)
+    gy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=ksize, borderType=cv2.BORDER_REPLICATE)
+    edges = cv2.Canny(gx, gy, low, high)
+    ys, xs = np.nonzero(edges)
+    angles = np.arctan2(gy[ys, xs].astype(np.float32), gx[ys, xs].astype(np.float32))
+    return xs.astype(np.float32), ys.astype(np.float32), angles
+
+
+def find_peaks(acc, threshold, size=(3, 3), max_peaks=None):
+    """
+    Local maxima of a 2D accumulator above threshold
+
+    A cell is a peak when it equals the maximum of its size neighbourhood
+    (one cv2.dilate). Two such cells within one window necessarily hold the
+    same value, so plateaus are thinned by a second dilation of the raster
+    rank of the candidates, keeping the first cell of each.
+
+    Args:
+        acc: 2D accumulator
+        threshold: Minimum value of a peak
+        size: (rows, cols) of the suppression window
+        max_peaks: Keep only the strongest peaks
+
+    Returns:
+        (rows, cols, values) arrays, strongest first
+    """
+    acc = acc.astype(np.float32, copy=False)
+    kernel = np.ones(size, np.uint8)
+    local_max = cv2.dilate(acc, kernel, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+    candidates = (acc >= local_max) & (acc >= threshold)
+    rows, cols = np.nonzero(candidates)
+    if len(rows) > 1:
+        rank = np.zeros(acc.shape, dtype=np.float32)
+        rank[rows, cols] = np.arange(len(rows), 0, -1)
+        first = cv2.dilate(rank, kernel, borderType=cv2.BORDER_CONSTANT, borderValue=0)
+        keep = first[rows, cols] == rank[rows, cols]
+        rows, cols = rows[keep], cols[keep]
+    values = acc[rows, cols]
+    order = np.argsort(-values, kind='stable')[:max_peaks]
+    return rows[order], cols[order], values[order]
+
+
+def line_accumulator(xs, ys, angles, shape, rho_res=1.0, theta_res=np.pi / 180, band=np.deg2rad(5)):
+    """
+    Vote every edge point for the lines whose normal is near its gradient
+
+    Args:
+        xs, ys, angles: Edge points from edge_points
+        shape: (h, w) of the image
+        rho_res: Distance resolution in pixels
+        theta_res: Angle resolution in radians
+        band: Half-width of the voting band around the gradient direction
+            in radians; None votes for every angle (standard Hough)
+
+    Returns:
+        (acc, rhos, thetas): (n_theta, n_rho) int64 vote counts and the bin
+        centres, rho = x cos(theta) + y sin(theta) with theta in [0, pi)
+    """
+    diag = float(np.hypot(*shape))
+    n_theta = int(round(np.pi / theta_res))
+    n_rho = int(np.ceil(2 * diag / rho_res)) + 1
+    thetas = np.arange(n_theta) * (np.pi / n_theta)
+    if band is None:
+        theta_idx = np.broadcast_to(np.arange(n_theta), (len(xs), n_theta))
+    else:
+        half = int(np.ceil(band / (np.pi / n_theta)))
+        base = np.rint(np.mod(angles, np.pi) / (np.pi / n_theta)).astype(np.intp)
+        theta_idx = np.mod(base[:, None] + np.arange(-half, half + 1), n_theta)
+    cos_t = np.cos(thetas).astype(np.float32)
+    sin_t = np.sin(thetas).astype(np.float32)
+    rho = xs[:, None] * cos_t[theta_idx] + ys[:, None] * sin_t[theta_idx]
+    rho_idx = np.rint((rho + diag) / rho_res).astype(np.intp)
+    acc = np.bincount((theta_idx * n_rho + rho_idx).ravel(), minlength=n_theta * n_rho)
+    rhos = np.arange(n_rho) * rho_res - diag
+    return acc.reshape(n_theta, n_rho), rhos, thetas
+
+
+def _angle_distance(a, b, period=np.pi):
+    """Absolute difference of angles modulo period"""
+    d = np.mod(a - b, period)
+    return np.minimum(d, period - d)
+
+
+def _points_by_bin(angles, n_theta):
+    """
+    Gradient theta bin of every point, and the points grouped by bin
+
+    Returns:
+        (base, order, starts): order[starts[i]:starts[i + 1]] are the points
+        whose gradient falls in bin i
+    """
+    base = np.mod(np.rint(np.mod(angles, np.pi) / (np.pi / n_theta)).astype(np.intp), n_theta)
+    order = np.argsort(base, kind='stable')
+    starts = np.searchsorted(base[order], np.arange(n_theta + 1))
+    return base, order, starts
+
+
+def _supporting_points(xs, ys, peak, shape, rho_res, theta_res, band, by_bin):
+    """
+    Points that voted into the 3 x 3 accumulator neighbourhood of a peak
+
+    The accumulator evaluates rho at the theta bin centres, so recomputing
+    rho there for the three theta bins around the peak reproduces the
+    votes exactly. With a band, only the points grouped (by_bin, from
+    _points_by_bin) under gradient bins within reach are examined.
+
+    Returns:
+        Indices of the points
+    """
+    t, r = peak
+    diag = float(np.hypot(*shape))
+    n_theta = int(round(np.pi / theta_res))
+    step = np.pi / n_theta
+    bins = np.mod(t + np.arange(-1, 2), n_theta)
+    if band is None:
+        candidates = np.arange(len(xs))
+    else:
+        base, order, starts = by_bin
+        half = int(np.ceil(band / step))
+        reach = np.mod(t + np.arange(-1 - half, 2 + half), n_theta)
+        candidates = np.concatenate([order[starts[i]:starts[i + 1]] for i in reach])
+    thetas = bins * step
+    rho_idx = np.rint((xs[candidates, None] * np.cos(thetas) + ys[candidates, None] * np.sin(thetas) + diag)
+                      / rho_res)
+    hit = np.abs(rho_idx - r) <= 1
+    if band is not None:
+        # Only bins inside each point's own voting band
+        offset = np.mod(bins[None, :] - base[candidates, None] + n_theta // 2, n_theta) - n_theta // 2
+        hit &= np.abs(offset) <= half
+    return candidates[np.any(hit, axis=1)]
+
+
+def _refine_line(xs, ys, theta_c, rho_res, theta_res, refine):
+    """
+    Best line of a point set on a grid refine times finer than the first pass
+
+    Returns:
+        (rho, theta) with theta in [0, pi)
+    """
+    n = int(np.ceil(1.5 * refine))
+    thetas = theta_c + (theta_res / refine) * np.arange(-n, n + 1)
+    rho = xs[:, None] * np.cos(thetas) + ys[:, None] * np.sin(thetas)
+    fine = rho_res / refine
+    rho0 = rho.min()
+    rho_idx = np.rint((rho - rho0) / fine).astype(np.intp)
+    n_rho = int(rho_idx.max()) + 1
+    acc = np.bincount((np.arange(len(thetas)) * n_rho + rho_idx).ravel(), minlength=len(thetas) * n_rho)
+    t, r = divmod(int(np.argmax(acc)), n_rho)
+    rho_best, theta_best = rho0 + r * fine, thetas[t]
+    if not 0 <= theta_best < np.pi:
+        # Same line on the other side of the theta = 0 / pi seam
+        theta_best, rho_best = np.mod(theta_best, np.pi), -rho_best
+    return rho_best, theta_best
+
+
+def _dedupe_lines(lines, rho_tol, theta_tol):
+    """Drop lines (rho, theta, votes) close to a stronger one, including across theta = 0 / pi"""
+    kept = []
+    for rho, theta, votes in lines[np.argsort(-lines[:, 2], kind='stable')]:
+        close = False
+        for k_rho, k_theta, _ in kept:
+            d_theta = theta - k_theta
+            if abs(d_theta) <= theta_tol and abs(rho - k_rho) <= rho_tol:
+                close = True
+            elif np.pi - abs(d_theta) <= theta_tol and abs(rho + k_rho) <= rho_tol:
+                close = True
+        if not close:
+            kept.append((rho, theta, votes))
+    return np.array(kept, dtype=np.float32).reshape(-1, 3)
+
+
+def hough_lines(gray, threshold=100, rho_res=1.0, theta_res=np.pi / 180, band=np.deg2rad(5), refine=4,
+                min_dist=8, min_angle=np.deg2rad(2), max_lines=50, low=50, high=150):
+    """
+    Line detection with gradient-band voting and coarse-to-fine refinement
+
+    The first pass votes at (rho_res, theta_res). Every peak is then refined
+    on a grid refine times finer, spanning its 3 x 3 neighbourhood, with
+    only the edge points that voted into that neighbourhood.
+
+    Args:
+        gray: uint8 grayscale image
+        threshold: Minimum number of edge points on a line
+        rho_res: Distance resolution of the first pass in pixels
+        theta_res: Angle resolution of the first pass in radians
+        band: Voting band half-width around the gradient direction
+            (radians); None votes for every angle (standard Hough)
+        refine: Resolution factor of the refinement (1 skips it)
+        min_dist: Minimum rho difference between lines of similar angle
+        min_angle: Angle below which lines are compared by rho
+        max_lines: Maximum number of lines returned
+        low, high: Canny hysteresis thresholds
+
+    Returns:
+        (n, 3) float32 array of rho, theta and first-pass votes, strongest
+        first
+    """
+    xs, ys, angles = edge_points(gray, low, high)
+    if len(xs) == 0:
+        return np.empty((0, 3), dtype=np.float32)
+    acc, rhos, thetas = line_accumulator(xs, ys, angles, gray.shape, rho_res, theta_res, band)
+    rows, cols, votes = find_peaks(acc, threshold, (3, 3), 4 * max_lines)
+    if refine == 1:
+        lines = np.stack([rhos[cols], thetas[rows], votes], axis=1)
+    else:
+        lines = []
+        by_bin = _points_by_bin(angles, len(thetas)) if band is not None else None
+        for t, r, count in zip(rows, cols, votes):
+            near = _supporting_points(xs, ys, (t, r), gray.shape, rho_res, theta_res, band, by_bin)
+            lines.append(_refine_line(xs[near], ys[near], thetas[t], rho_res, theta_res, refine) + (count,))
+        lines = np.array(lines).reshape(-1, 3)
+    return _dedupe_lines(lines, min_dist, min_angle)[:max_lines]
+
+
+
+def ellipse_perimeter(a, b):
+    """Ramanujan's approximation of the perimeter of an ellipse with semi-axes a, b"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return np.pi * (3 * (a + b) - np.sqrt((3 * a + b) * (a + 3 * b)))
+
+
+def _polarity_signs(polarity):
+    """Signs of the centre offset along the gradient for each polarity voted"""
+    if polarity not in ('both', 'bright', 'dark'):
+        raise ValueError(f"Unknown polarity: {polarity}")
+    # Gradients point to the brighter side: outward for dark shapes, inward for bright ones
+    return {'both': (1.0, -1.0), 'dark': (1.0,), 'bright': (-1.0,)}[polarity]
+
+
+def center_accumulator(xs, ys, angles, shape, shapes, dp=4, band=np.deg2rad(2), n_band=3,
+                       polarity='both', smooth=2, max_votes=1 << 21):
+    """
+    Centre votes of conics along the gradient, best score over the shapes
+
+    For an ellipse with semi-axes (a, b) rotated by theta, the point whose
+    outward normal has direction nu lies at R(theta) (a cos t, b sin t) from
+    the centre, with (cos t, sin t) proportional to (a cos psi, b sin psi)
+    and psi = nu - theta; a circle is a = b. Every edge point votes for one
+    centre per shape, band offset and polarity. Votes are divided by n_band
+    and by the perimeter, so a score of 1 means every pixel of the curve
+    supports the centre.
+
+    Args:
+        xs, ys, angles: Edge points from edge_points
+        shape: (h, w) of the image
+        shapes: (k, 3) array of a, b, theta
+        dp: Centre cell size in pixels
+        band: Half-width of the normal band in radians
+        n_band: Number of normals voted in the band
+        polarity: 'bright' shapes on a dark background, 'dark' ones, or 'both'
+        smooth: Sum the votes over blocks of smooth x smooth centre cells
+            (0 or 1 disables). Cell (i, j) then scores the centre at pixel
+            ((j + 0.5) * dp, (i + 0.5) * dp) for odd sizes and (j * dp, i * dp)
+            for even ones
+        max_votes: Votes cast per batch of shapes, bounding temporaries
+
+    Returns:
+        (score, best): (ceil(h / dp), ceil(w / dp)) float32 best score and
+        int32 index into shapes of the best shape at every centre cell
+    """
+    h, w = -(-shape[0] // dp), -(-shape[1] // dp)
+    shapes = np.asarray(shapes, dtype=np.float32).reshape(-1, 3)
+    signs = _polarity_signs(polarity)
+    offsets = np.linspace(-band, band, n_band) if n_band > 1 else np.zeros(1)
+    nu = angles[:, None] + offsets.astype(np.float32)[None, :]
+    cos_nu, sin_nu = np.cos(nu), np.sin(nu)
+    circular = bool(np.all(shapes[:, 0] == shapes[:, 1]))
+    norm = (1.0 / (n_band * ellipse_perimeter(shapes[:, 0], shapes[:, 1]))).astype(np.float32)
+    inv = np.float32(1.0 / dp)
+    px, py = xs[:, None] * inv, ys[:, None] * inv
+
+    score = np.zeros((h, w), dtype=np.float32)
+    best = np.zeros((h, w), dtype=np.int32)
+    batch = max(1, max_votes // max(nu.size * len(signs), 1))
+    for start in range(0, len(shapes), batch):
+        chunk = shapes[start:start + batch]
+        a, b, theta = (chunk[:, i, None, None] for i in range(3))
+        if circular:
+            dx, dy = (a * inv) * cos_nu, (a * inv) * sin_nu
+        else:
+            # psi = nu - theta from the precomputed cos / sin of nu
+            ct, st = np.cos(theta), np.sin(theta)
+            cos_psi = cos_nu * ct + sin_nu * st
+            sin_psi = sin_nu * ct - cos_nu * st
+            length = np.sqrt((a * cos_psi) ** 2 + (b * sin_psi) ** 2) * np.float32(dp)
+            ex, ey = (a * a) * cos_psi / length, (b * b) * sin_psi / length
+            dx, dy = ex * ct - ey * st, ex * st + ey * ct
+        index = np.arange(len(chunk))[:, None, None] * (h * w)
+        flat = []
+        for sign in signs:
+            cx, cy = px - sign * dx, py - sign * dy
+            valid = (cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)
+            flat.append((index + cy.astype(np.intp) * w + cx.astype(np.intp))[valid])
+        votes = np.bincount(np.concatenate(flat), minlength=len(chunk) * h * w)
+        votes = votes.reshape(len(chunk), h, w).astype(np.float32)
+        votes *= norm[start:start + len(chunk), None, None]
+        if smooth > 1:
+            # Centres near a cell corner, or shapes between grid steps, split their votes
+            for plane in votes:
+                cv2.boxFilter(plane, -1, (smooth, smooth), dst=plane, normalize=False,
+                              borderType=cv2.BORDER_CONSTANT)
+        arg = votes.argmax(axis=0)
+        top = np.take_along_axis(votes, arg[None], axis=0)[0]
+        better = top > score
+        score[better] = top[better]
+        best[better] = arg[better] + start
+    return score, best
+
+
+def _conic_geometry(xs, ys, cx, cy, a, b, theta):
+    """
+    Approximate distance of points to an ellipse (exact for circles), and
+    the direction of the ellipse normal at each point
+    """
+    dx, dy = xs - cx, ys - cy
+    ct, st = np.cos(theta), np.sin(theta)
+    u, v = dx * ct + dy * st, -dx * st + dy * ct
+    r = np.hypot(u / a, v / b)
+    # Radial distance along the ray from the centre
+    distance = np.abs(r - 1) * np.hypot(u, v) / np.maximum(r, 1e-6)
+    normal = np.arctan2(v / (b * b), u / (a * a)) + theta
+    return distance, normal
+
+
+def _refine_conic(points, cx, cy, a, b, theta, steps, limits, polarity, band, n_band):
+    """
+    Fine centre and shape around a coarse detection
+
+    Only points near the coarse curve vote. Each round votes a 3 x 3 x 3
+    grid of shapes (a, b, theta one step apart) into a full-resolution
+    centre window around the current estimate, then halves the steps and
+    the window, until the axes steps reach one pixel.
+
+    Returns:
+        (cx, cy, a, b, theta, support) with support the number of edge
+        points within 1.5 px of the curve and with a gradient within 20
+        degrees of its normal, divided by the perimeter
+    """
+    xs, ys, angles = points
+    da, db, dtheta, dp = steps
+    tolerance = 1.5 * dp + max(da, db)
+    # Points are in raster order: slice the rows the curve can reach first
+    reach = a + tolerance
+    lo, hi = np.searchsorted(ys, cy - reach, side='left'), np.searchsorted(ys, cy + reach, side='right')
+    xs, ys, angles = xs[lo:hi], ys[lo:hi], angles[lo:hi]
+    near = _conic_geometry(xs, ys, cx, cy, a, b, theta)[0] <= tolerance
+    if not np.any(near):
+        return None
+    xs, ys, angles = xs[near], ys[near], angles[near]
+
+    (a_min, a_max), (b_min, b_max) = limits
+    circular = a == b
+    window = dp
+    while True:
+        offsets = np.array([-1.0, 0.0, 1.0])
+        if circular:
+            radii = np.clip(a + da * offsets, a_min, a_max)
+            grid = np.stack([radii, radii, np.zeros(3)], axis=1)
+        else:
+            grid = np.stack(np.meshgrid(np.clip(a + da * offsets, a_min, a_max),
+                                        np.clip(b + db * offsets, b_min, b_max),
+                                        theta + dtheta * offsets, indexing='ij'), axis=-1).reshape(-1, 3)
+            grid = grid[grid[:, 1] <= grid[:, 0]]
+        # Centre window of +-(window + 1) pixels, in shifted coordinates
+        half = int(np.ceil(window)) + 1
+        x0, y0 = int(np.floor(cx)) - half, int(np.floor(cy)) - half
+        size = 2 * half + 1
+        score, best = center_accumulator(xs - x0, ys - y0, angles, (size, size), grid, 1,
+                                         band, n_band, polarity, smooth=3)
+        y, x = np.unravel_index(np.argmax(score), score.shape)
+        a, b, theta = (float(v) for v in grid[best[y, x]])
+        cx, cy = x0 + x + 0.5, y0 + y + 0.5
+        if max(da, db) <= 1:
+            break
+        da, db, dtheta = da / 2, db / 2, dtheta / 2
+        window = max(window / 2, 1)
+
+    distance, normal = _conic_geometry(xs, ys, cx, cy, a, b, theta)
+    aligned = _angle_distance(angles, normal) <= np.deg2rad(20)
+    support = np.count_nonzero((distance <= 1.5) & aligned) / float(ellipse_perimeter(a, b))
+    return cx, cy, a, b, float(np.mod(theta, np.pi)), support
+
+
+def hough_conics(gray, shapes, steps, min_score=0.6, min_dist=20, dp=4, band=np.deg2rad(2), n_band=3,
+                 polarity='both', max_shapes=50, low=50, high=150):
+    """
+    Circles or ellipses from a coarse grid of shapes, refined per detection
+
+    Args:
+        gray: uint8 grayscale image
+        shapes: (k, 3) coarse grid of a, b, theta
+        steps: (da, db, dtheta) spacing of the coarse grid
+        min_score: Minimum share of the perimeter supported by edge points
+        min_dist: Minimum distance between detected centres
+        dp: Coarse centre cell size in pixels
+        band, n_band: Voting band of the refinement, see center_accumulator
+        polarity: 'bright', 'dark' or 'both', see center_accumulator
+        max_shapes: Maximum number of detections
+        low, high: Canny hysteresis thresholds
+
+    Returns:
+        (n, 6) float32 array of cx, cy, a, b, theta and score, strongest first
+    """
+    points = edge_points(gray, low, high)
+    if len(points[0]) == 0:
+        return np.empty((0, 6), dtype=np.float32)
+    # One vote per polarity: the 2 x 2 cell smoothing covers the band at coarse
+    # resolution. Coarse scores still lose some votes to the grid, so the peak
+    # threshold is lower than min_score
+    score, best = center_accumulator(*points, gray.shape, shapes, dp, 0.0, 1, polarity)
+    size = max(3, 2 * int(min_dist // (2 * dp)) + 1)
+    rows, cols, _ = find_peaks(score, 0.75 * min_score, (size, size), 2 * max_shapes)
+
+    limits = ((shapes[:, 0].min(), shapes[:, 0].max()), (shapes[:, 1].min(), shapes[:, 1].max()))
+    found = []
+    for r, c in zip(rows, cols):
+        a, b, theta = shapes[best[r, c]]
+        refined = _refine_conic(points, c * dp, r * dp, a, b, theta,
+                                tuple(steps) + (dp,), limits, polarity, band, n_band)
+        if refined is not None and refined[-1] >= min_score:
+            found.append(refined)
+    if not found:
+        return np.empty((0, 6), dtype=np.float32)
+    found = np.array(found, dtype=np.float32)
+    found = found[np.argsort(-found[:, 5], kind='stable')]
+    kept = []
+    for row in found:
+        if all(np.hypot(row[0] - k[0], row[1] - k[1]) >= min_dist for k in kept):
+            kept.append(row)
+    return np.array(kept[:max_shapes], dtype=np.float32).reshape(-1, 6)
+
+
+def hough_circles(gray, min_radius=10, max_radius=100, min_score=0.6, min_dist=20, dp=4, **kwargs):
+    """
+    Circle detection with gradient-direction centre voting
+
+    Args:
+        gray: uint8 grayscale image
+        min_radius, max_radius: Radius range in pixels
+        min_score: Minimum share of the circumference supported by edge points
+        min_dist: Minimum distance between centres
+        dp: Coarse centre cell size, also the coarse radius step
+        kwargs: band, n_band, polarity, max_shapes, low, high (see hough_conics)
+
+    Returns:
+        (n, 4) float32 array of cx, cy, radius and score
+    """
+    radii = np.arange(min_radius, max_radius + 1, dp, dtype=np.float32)
+    shapes = np.stack([radii, radii, np.zeros_like(radii)], axis=1)
+    found = hough_conics(gray, shapes, (dp / 2, dp / 2, 0.0), min_score, min_dist, dp, **kwargs)
+    return found[:, [0, 1, 2, 5]]
+
+
+def hough_ellipses(gray, axis_range=(20, 120), min_ratio=0.4, axis_step=8, angle_step=np.deg2rad(15),
+                   min_score=0.6, min_dist=20, dp=8, **kwargs):
+    """
+    Ellipse detection with gradient-direction centre voting
+
+    Args:
+        gray: uint8 grayscale image
+        axis_range: Range of both semi-axes in pixels
+        min_ratio: Smallest minor / major axis ratio
+        axis_step: Coarse semi-axis step in pixels
+        angle_step: Coarse orientation step in radians
+        min_score: Minimum share of the perimeter supported by edge points
+        min_dist: Minimum distance between centres
+        dp: Coarse centre cell size
+        kwargs: band, n_band, polarity, max_shapes, low, high (see hough_conics)
+
+    Returns:
+        (n, 6) float32 array of cx, cy, a, b, theta and score, a >= b and
+        theta the orientation of the major axis in [0, pi), as cv2.ellipse
+        (in radians)
+    """
+    axes = np.arange(axis_range[0], axis_range[1] + 1, axis_step, dtype=np.float32)
+    angles = np.arange(0, np.pi, angle_step, dtype=np.float32)
+    shapes = np.array([(a, b, t) for a in axes for b in axes if min_ratio * a <= b <= a
+                       for t in (angles if b < a else angles[:1])], dtype=np.float32)
+    return hough_conics(gray, shapes, (axis_step / 2, axis_step / 2, angle_step / 2),
+                        min_score, min_dist, dp, **kwargs)
+
+
+def make_synthetic_shapes(size=(1920, 1080), n_lines=8, n_circles=10, n_ellipses=6, noise=8, seed=0):
+    """
+    Lines, filled circles and filled ellipses on a noisy background
+
+    Returns:
+        (uint8 image, dict of ground truth arrays: 'lines' rho, theta;
+        'circles' cx, cy, r; 'ellipses' cx, cy, a, b, theta)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.full((h, w), 60, dtype=np.uint8)
+    truth = {'lines': [], 'circles': [], 'ellipses': []}
+    for _ in range(n_lines):
+        theta = rng.uniform(0, np.pi)
+        rho = rng.uniform(0.2, 0.8) * (w * np.cos(theta) + h * np.sin(theta))
+        c, s = np.cos(theta), np.sin(theta)
+        x0, y0 = rho * c, rho * s
+        p1 = (int(round(x0 - 3000 * s)), int(round(y0 + 3000 * c)))
+        p2 = (int(round(x0 + 3000 * s)), int(round(y0 - 3000 * c)))
+        cv2.line(img, p1, p2, 200, 3, cv2.LINE_AA)
+        truth['lines'].append((rho, theta))
+    for _ in range(n_circles):
+        r = rng.uniform(15, 90)
+        cx, cy = rng.uniform(r, w - r), rng.uniform(r, h - r)
+        cv2.circle(img, (int(round(cx * 16)), int(round(cy * 16))), int(round(r * 16)), 170, -1,
+                   cv2.LINE_AA, shift=4)
+        truth['circles'].append((cx, cy, r))
+    for _ in range(n_ellipses):
+        a = rng.uniform(40, 110)
+        b = a * rng.uniform(0.45, 0.8)
+        theta = rng.uniform(0, np.pi)
+        cx, cy = rng.uniform(a, w - a), rng.uniform(a, h - a)
+        cv2.ellipse(img, ((cx, cy), (2 * a, 2 * b), np.rad2deg(theta)), 120, -1, cv2.LINE_AA)
+        truth['ellipses'].append((cx, cy, a, b, theta))
+    img = cv2.add(img.astype(np.float32), rng.normal(0, noise, img.shape).astype(np.float32))
+    img = cv2.GaussianBlur(img, (0, 0), 1.0)
+    return np.clip(img, 0, 255).astype(np.uint8), {k: np.array(v) for k, v in truth.items()}
+
+
+def _recall(found, truth, match):
+    """Share of true shapes matched by some detection"""
+    if len(truth) == 0:
+        return 1.0
+    if len(found) == 0:
+        return 0.0
+    return float(np.mean([np.any(match(found, t)) for t in truth]))
+
+
+def _match_line(found, t, center):
+    rho, theta = t
+    raw = found[:, 1] - theta
+    # Signed distances of the image centre, flipped for lines across theta = 0 / pi
+    side = np.where(np.abs(raw) > np.pi / 2, -1, 1)
+    d_found = side * (center[0] * np.cos(found[:, 1]) + center[1] * np.sin(found[:, 1]) - found[:, 0])
+    d_true = center[0] * np.cos(theta) + center[1] * np.sin(theta) - rho
+    return (_angle_distance(found[:, 1], theta) <= np.deg2rad(1)) & (np.abs(d_found - d_true) <= 5)
+
+
+def _match_circle(found, t):
+    cx, cy, r = t
+    return (np.hypot(found[:, 0] - cx, found[:, 1] - cy) <= 3) & (np.abs(found[:, 2] - r) <= 3)
+
+
+def _match_ellipse(found, t):
+    cx, cy, a, b, theta = t
+    return ((np.hypot(found[:, 0] - cx, found[:, 1] - cy) <= 4) & (np.abs(found[:, 2] - a) <= 5)
+            & (np.abs(found[:, 3] - b) <= 5) & (_angle_distance(found[:, 4], theta) <= np.deg2rad(8)))
+
+
+def benchmark_hough(size=(1920, 1080), repeats=3):
+    """
+    Gradient-band voting against full voting and OpenCV
+
+    Lines: cv2.Canny + cv2.HoughLines, this module with the band (coarse to
+    fine) and with full voting at full resolution. Circles:
+    cv2.HoughCircles against hough_circles. Ellipses: hough_ellipses alone
+    (OpenCV has no ellipse Hough transform).
+
+    Returns:
+        List of dicts with shape, method, milliseconds per image, number of
+        detections and recall of the synthetic shapes
+    """
+    img, truth = make_synthetic_shapes(size)
+    threshold = 200
+    center = (img.shape[1] / 2, img.shape[0] / 2)
+
+    def match_line(found, t):
+        return _match_line(found, t, center)
+
+    def cv_lines():
+        lines = cv2.HoughLines(cv2.Canny(img, 50, 150), 1, np.pi / 180, threshold)
+        return np.empty((0, 2)) if lines is None else lines[:, 0]
+
+    def cv_circles():
+        circles = cv2.HoughCircles(cv2.medianBlur(img, 5), cv2.HOUGH_GRADIENT, 1, 20,
+                                   param1=150, param2=30, minRadius=10, maxRadius=100)
+        return np.empty((0, 3)) if circles is None else circles[0]
+
+    cases = (
+        ('lines', 'cv2.HoughLines', cv_lines, match_line),
+        ('lines', 'band, refined', lambda: hough_lines(img, threshold), match_line),
+        ('lines', 'full voting', lambda: hough_lines(img, threshold, band=None, refine=1), match_line),
+        ('circles', 'cv2.HoughCircles', cv_circles, _match_circle),
+        ('circles', 'band, coarse to fine', lambda: hough_circles(img, 10, 100), _match_circle),
+        ('ellipses', 'band, coarse to fine', lambda: hough_ellipses(img), _match_ellipse),
+    )
+    results = []
+    for kind, name, fn, match in cases:
+        found = fn()
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            found = fn()
+        elapsed = (time.perf_counter() - t0) / repeats
+        results.append({'shape': kind, 'method': name, 'ms': 1e3 * elapsed, 'found': len(found),
+                        'recall': _recall(np.asarray(found), truth[kind], match)})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_hough():
+        print(f"{stats['shape']:<9} {stats['method']:<22} {stats['ms']:9.1f} ms  "
+              f"{stats['found']:6d} found  recall {stats['recall']:.2f}")
@@ -0,0 +1,376 @@
+"""
+Graph-based (Felzenszwalb-Huttenlocher) segmentation.
+
+Pixels are graph nodes and neighbouring pixels are joined by edges weighted by
+their colour distance. Edges are visited in increasing weight and two regions
+merge when the edge is no heavier than the internal difference of both regions
+plus scale / size.
+
+Weights are quantized to small integer keys, so sorting is a counting sort and
+the edges fall into narrow weight buckets. Every bucket is merged as one batch
+of vectorized union-find operations on flat arrays, which keeps the Python
+overhead proportional to the number of buckets rather than the number of
+edges. The merge tests themselves use the exact float weights.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Neighbour offsets (dy, dx) whose edges cover each pixel pair exactly once
+OFFSETS_4 = ((0, 1), (1, 0))
+OFFSETS_8 = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class DisjointSet:
+    """
+    Union-find over flat arrays with path compression and union by rank
+
+    Besides the forest, every root carries the size of its component and its
+    internal difference (largest edge weight merged into it).
+    """
+
+    def __init__(self, n):
+        self.parent = np.arange(n, dtype=np.int32)
+        self.rank = np.zeros(n, dtype=np.uint8)
+        self.size = np.ones(n, dtype=np.int32)
+        self.internal = np.zeros(n, dtype=np.float32)
+
+    def find(self, x):
+        """
+        Roots of the nodes x, compressing their paths
+
+        Returns:
+            int32 array of roots, same shape as x
+        """
+        parent = self.parent
+        root = parent[x]
+        up = parent[root]
+        # Only the nodes that have not reached their root keep climbing
+        todo = np.flatnonzero(up != root)
+        while len(todo):
+            root[todo] = up[todo]
+            up_todo = parent[root[todo]]
+            moving = up_todo != root[todo]
+            todo = todo[moving]
+            up[todo] = up_todo[moving]
+        parent[x] = root
+        return root
+
+    def union(self, a, b, weights=None):
+        """
+        Merge the components of every pair (a[i], b[i])
+
+        Each round hooks the lower-ranked root of every pair under the other
+        one (ties broken by index, so no cycles can form), then re-finds the
+        roots of the pairs that are still apart.
+
+        Args:
+            a, b: Node arrays of equal length
+            weights: Edge weights of the pairs; the internal difference of each
+                merged component is raised to the largest of them
+        """
+        ra, rb = self.find(a), self.find(b)
+        apart = ra != rb
+        hooked = []
+        while apart.any():
+            ra, rb = ra[apart], rb[apart]
+            # Strict total order on roots: rank first, then index
+            lower = (self.rank[ra] < self.rank[rb]) | ((self.rank[ra] == self.rank[rb]) & (ra < rb))
+            child = np.where(lower, ra, rb)
+            target = np.where(lower, rb, ra)
+            self.parent[child] = target
+            # Conflicting writes leave each child under one of its targets
+            child = np.unique(child)
+            np.maximum.at(self.rank, self.parent[child], self.rank[child] + 1)
+            hooked.append(child)
+            # Parallel hooking can chain the children; pointer doubling
+            # flattens them in a logarithmic number of passes
+            while True:
+                up = self.parent[self.parent[child]]
+                if np.array_equal(up, self.parent[child]):
+                    break
+                self.parent[child] = up
+            ra, rb = self.find(ra), self.find(rb)
+            apart = ra != rb
+
+        if hooked:
+            hooked = np.concatenate(hooked)
+            roots = self.find(hooked)
+            np.add.at(self.size, roots, self.size[hooked])
+        if weights is not None:
+            np.maximum.at(self.internal, self.find(a), weights)
+
+    def labels(self):
+        """Consecutive component labels of all nodes"""
+        roots = self.find(np.arange(len(self.parent), dtype=np.int32))
+        return np.unique(roots, return_inverse=True)[1].astype(np.int32)
+
+
+def pixel_edges(img, connectivity=8, offset=0):
+    """
+    Vectorized edge list of the pixel grid
+
+    Args:
+        img: float32 image (H, W, C)
+        connectivity: 4 or 8
+        offset: Added to every node index
+
+    Returns:
+        (a, b, w): int32 node indices and float32 colour distances
+    """
+    h, w = img.shape[:2]
+    index = np.arange(h * w, dtype=np.int32).reshape(h, w) + offset
+    a_parts, b_parts, w_parts = [], [], []
+    for dy, dx in (OFFSETS_4 if connectivity == 4 else OFFSETS_8):
+        ys, yd = slice(0, h - dy), slice(dy, h)
+        xs, xd = (slice(0, w - dx), slice(dx, w)) if dx >= 0 else (slice(-dx, w), slice(0, w + dx))
+        diff = img[ys, xs] - img[yd, xd]
+        dist = np.sqrt(np.einsum('...c,...c->...', diff, diff))
+        a_parts.append(index[ys, xs].ravel())
+        b_parts.append(index[yd, xd].ravel())
+        w_parts.append(dist.ravel())
+    return np.concatenate(a_parts), np.concatenate(b_parts), np.concatenate(w_parts)
+
+
+def sort_edges(a, b, w, quantization=16):
+    """
+    Counting sort of the edges by quantized weight
+
+    Args:
+        a, b, w: Edge list from pixel_edges
+        quantization: Buckets per unit of colour distance
+
+    Returns:
+        (a, b, w, starts): sorted edges and bucket offsets, bucket v being
+        a[starts[v]:starts[v + 1]]
+    """
+    keys = np.minimum(w * quantization, np.iinfo(np.uint16).max).astype(np.uint16)
+    starts = np.zeros(int(keys.max(initial=0)) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(keys), out=starts[1:])
+    # NumPy's stable sort of 16-bit keys is a radix (counting) sort
+    order = np.argsort(keys, kind='stable')
+    return a[order], b[order], w[order], starts
+
+
+def merge_sorted_edges(ds, a, b, w, starts, k):
+    """
+    Felzenszwalb merging of bucket-sorted edges, one batch per bucket
+
+    A region that has just merged along an edge of weight v has internal
+    difference v and so accepts any further edge of (nearly) the same weight.
+    Within a bucket an edge is therefore taken when each side either passes
+    the threshold as it stood before the bucket or has been merged by another
+    accepted edge of the bucket; the accepted set is grown to a fixed point.
+    With equal weights this is exactly one sequential order of the ties, and
+    narrow buckets keep the approximation error far below k / size.
+
+    Args:
+        ds: DisjointSet to update
+        a, b, w: Edges sorted by sort_edges
+        starts: Bucket offsets from sort_edges
+        k: Scale parameter
+    """
+    touched = np.zeros(len(ds.parent), dtype=bool)
+    for v in np.flatnonzero(np.diff(starts)):
+        lo, hi = starts[v], starts[v + 1]
+        ra, rb = ds.find(a[lo:hi]), ds.find(b[lo:hi])
+        apart = ra != rb
+        if not apart.any():
+            continue
+        ra, rb, weights = ra[apart], rb[apart], w[lo:hi][apart]
+        pass_a = weights <= ds.internal[ra] + k / ds.size[ra]
+        pass_b = weights <= ds.internal[rb] + k / ds.size[rb]
+        accept = pass_a & pass_b
+        if not accept.all():
+            while True:
+                touched[ra[accept]] = True
+                touched[rb[accept]] = True
+                grown = (pass_a | touched[ra]) & (pass_b | touched[rb])
+                if np.array_equal(grown, accept):
+                    break
+                accept = grown
+            touched[ra] = False
+            touched[rb] = False
+        if accept.any():
+            ds.union(ra[accept], rb[accept], weights[accept])
+
+
+def merge_small_components(ds, a, b, min_size):
+    """
+    Merge every component below min_size into a neighbour, in bulk
+
+    Each round hooks all small components at once along their lightest
+    boundary edge, Boruvka style, so the number of rounds is logarithmic in
+    the worst case rather than one merge per edge.
+
+    Args:
+        ds: DisjointSet to update
+        a, b: Edge endpoints sorted by weight
+        min_size: Minimum component size in pixels
+    """
+    while len(a):
+        ra, rb = ds.find(a), ds.find(b)
+        small_a = ds.size[ra] < min_size
+        small_b = ds.size[rb] < min_size
+        # Edges between two large components, or inside one, stay that way
+        keep = (ra != rb) & (small_a | small_b)
+        if not keep.any():
+            break
+        a, b, ra, rb = a[keep], b[keep], ra[keep], rb[keep]
+        small_a, small_b = small_a[keep], small_b[keep]
+
+        position = np.arange(len(a))
+        roots = np.concatenate([ra[small_a], rb[small_b]])
+        partners = np.concatenate([rb[small_a], ra[small_b]])
+        order = np.argsort(np.concatenate([position[small_a], position[small_b]]), kind='stable')
+        roots, partners = roots[order], partners[order]
+        # np.unique keeps the first, i.e. lightest, edge of every small root
+        roots, first = np.unique(roots, return_index=True)
+        ds.union(roots, partners[first])
+
+
+class FelzenszwalbSegmenter:
+    """
+    Felzenszwalb-Huttenlocher segmentation with bucketed batch merging
+    """
+
+    def __init__(self, scale=100.0, sigma=0.8, min_size=20, connectivity=8, quantization=16,
+                 strip_height=None, workers=None):
+        """
+        Args:
+            scale: Larger values give larger regions (colour distance units of 0-255 images)
+            sigma: Gaussian pre-smoothing
+            min_size: Minimum region size enforced after merging
+            connectivity: 4 or 8 neighbours
+            quantization: Sort buckets per unit of colour distance
+            strip_height: Rows per strip for strip-parallel mode (None: whole image)
+            workers: Threads for strip-parallel mode
+        """
+        if connectivity not in (4, 8):
+            raise ValueError(f"Connectivity must be 4 or 8, got {connectivity}")
+        self.scale = scale
+        self.sigma = sigma
+        self.min_size = min_size
+        self.connectivity = connectivity
+        self.quantization = quantization
+        self.strip_height = strip_height
+        self.workers = workers
+
+    def _prepare(self, img):
+        img = img.astype(np.float32)
+        if img.ndim == 2:
+            img = img[..., None]
+        if self.sigma > 0:
+            img = cv2.GaussianBlur(img, (0, 0), self.sigma)
+            if img.ndim == 2:
+                img = img[..., None]
+        return img
+
+    def _segment_block(self, img, offset=0):
+        """Merge one block of rows; returns its DisjointSet in local indices"""
+        h, w = img.shape[:2]
+        ds = DisjointSet(h * w)
+        a, b, w, starts = sort_edges(*pixel_edges(img, self.connectivity), self.quantization)
+        merge_sorted_edges(ds, a, b, w, starts, self.scale)
+        merge_small_components(ds, a, b, self.min_size)
+        return ds
+
+    def _boundary_edges(self, img, y):
+        """Edges between row y - 1 and row y"""
+        a, b, weights = pixel_edges(img[y - 1:y + 1], self.connectivity, offset=(y - 1) * img.shape[1])
+        # Keep the vertical and diagonal edges crossing the boundary
+        crossing = (b - a) >= img.shape[1] - 1
+        return a[crossing], b[crossing], weights[crossing]
+
+    def segment(self, img):
+        """
+        Segment an image
+
+        Args:
+            img: Input image (BGR or grayscale)
+
+        Returns:
+            int32 label image with consecutive labels from 0
+        """
+        img = self._prepare(img)
+        h, w = img.shape[:2]
+        if not self.strip_height or self.strip_height >= h:
+            return self._segment_block(img).labels().reshape(h, w)
+
+        bounds = list(range(0, h, self.strip_height))
+        with ThreadPoolExecutor(self.workers) as pool:
+            blocks = list(pool.map(lambda y: self._segment_block(img[y:y + self.strip_height]), bounds))
+
+        # Stitch the strip forests into one global DisjointSet
+        ds = DisjointSet(0)
+        offsets = [y * w for y in bounds]
+        ds.parent = np.concatenate([block.parent + off for block, off in zip(blocks, offsets)])
+        ds.rank = np.concatenate([block.rank for block in blocks])
+        ds.size = np.concatenate([block.size for block in blocks])
+        ds.internal = np.concatenate([block.internal for block in blocks])
+
+        edges = [self._boundary_edges(img, y) for y in bounds[1:]]
+        a = np.concatenate([e[0] for e in edges])
+        b = np.concatenate([e[1] for e in edges])
+        a, b, weights, starts = sort_edges(a, b, np.concatenate([e[2] for e in edges]), self.quantization)
+        merge_sorted_edges(ds, a, b, weights, starts, self.scale)
+        merge_small_components(ds, a, b, self.min_size)
+        return ds.labels().reshape(h, w)
+
+
+def make_synthetic_image(size=(1024, 1024), n_regions=60, noise=6.0, seed=0):
+    """
+    Piecewise-constant colour regions (Voronoi cells) with noise
+
+    Returns:
+        uint8 BGR image (H, W, 3)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    centers = rng.uniform(0, (w, h), (n_regions, 2)).astype(np.float32)
+    colors = rng.integers(0, 256, (n_regions, 3)).astype(np.float32)
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    nearest = np.zeros((h, w), dtype=np.int32)
+    best = np.full((h, w), np.inf, dtype=np.float32)
+    for i, (cx, cy) in enumerate(centers):
+        d = (xs - cx) ** 2 + (ys - cy) ** 2
+        closer = d < best
+        best[closer] = d[closer]
+        nearest[closer] = i
+    img = colors[nearest] + rng.normal(0, noise, (h, w, 3))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def benchmark_felzenszwalb(sizes=((1024, 1024), (2048, 2048)), scale=100.0, sigma=0.8, min_size=50):
+    """
+    Runtime and segment counts against skimage.segmentation.felzenszwalb
+
+    Returns:
+        List of dicts with method, image size, seconds and number of segments
+    """
+    from skimage.segmentation import felzenszwalb
+
+    results = []
+    for size in sizes:
+        img = make_synthetic_image(size)
+        methods = [
+            ('skimage', lambda: felzenszwalb(img, scale=scale, sigma=sigma, min_size=min_size)),
+            ('bucketed union-find', FelzenszwalbSegmenter(scale, sigma, min_size).segment),
+            ('strip-parallel', FelzenszwalbSegmenter(scale, sigma, min_size, strip_height=256).segment),
+        ]
+        for name, fn in methods:
+            t0 = time.perf_counter()
+            labels = fn() if name == 'skimage' else fn(img)
+            elapsed = time.perf_counter() - t0
+            results.append({'method': name, 'size': size, 'seconds': elapsed,
+                            'segments': int(labels.max()) + 1})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_felzenszwalb():
+        w, h = stats['size']
+        print(f"{stats['method']:<20} {w}x{h}  {stats['seconds']:6.2f} s  {stats['segments']} segments")
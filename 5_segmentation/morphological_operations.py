@@ -0,0 +1,365 @@
+"""
+Large-kernel morphology with constant cost per pixel.
+
+Dilations and erosions by line segments use the van Herk/Gil-Werman running
+max/min: the line is cut into blocks of the segment length, prefix and suffix
+extrema are accumulated inside each block, and every output is the extremum of
+one suffix and one prefix value. That is three comparisons per pixel whatever
+the segment length.
+
+Rectangles are a horizontal and a vertical line pass. Octagons, and disks
+approximated by them, are horizontal, vertical and two diagonal line passes;
+diagonal passes shear the image so that diagonals become columns.
+
+All passes run column-wise on row blocks, so every accumulate step is one
+contiguous row operation, and scratch buffers are reused between calls.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+# Line directions (dy, dx) of a pass
+HORIZONTAL = (0, 1)
+VERTICAL = (1, 0)
+DIAGONAL = (1, 1)
+ANTI_DIAGONAL = (1, -1)
+
+
+def rect(width, height):
+    """Rectangle of width x height pixels as line passes"""
+    return [(HORIZONTAL, width), (VERTICAL, height)]
+
+
+def line(length, angle=0):
+    """Line segment of length pixels at 0, 45, 90 or 135 degrees"""
+    directions = {0: HORIZONTAL, 45: ANTI_DIAGONAL, 90: VERTICAL, 135: DIAGONAL}
+    if angle not in directions:
+        raise ValueError(f"Line angle must be one of {sorted(directions)}, got {angle}")
+    return [(directions[angle], length)]
+
+
+def octagon(radius):
+    """
+    Regular octagon of the given inradius as four line passes
+
+    A horizontal and a vertical segment of half-length a and two diagonal
+    segments of half-length b sum to an octagon with extent a + 2b along the
+    axes and sqrt(2)(a + b) along the diagonals; a = 0.414r, b = 0.293r makes
+    both equal to r.
+    """
+    b = int(round(radius * (1 - 1 / np.sqrt(2))))
+    a = radius - 2 * b
+    passes = [(HORIZONTAL, 2 * a + 1), (VERTICAL, 2 * a + 1)]
+    if b > 0:
+        passes += [(DIAGONAL, 2 * b + 1), (ANTI_DIAGONAL, 2 * b + 1)]
+    return passes
+
+
+def disk(radius):
+    """Disk approximated by the octagon of the same radius (four-direction decomposition)"""
+    return octagon(radius)
+
+
+def element_extent(passes):
+    """Half-height and half-width of the element described by line passes"""
+    half_y = sum((int(length) // 2) * abs(dy) for (dy, dx), length in passes)
+    half_x = sum((int(length) // 2) * abs(dx) for (dy, dx), length in passes)
+    return half_y, half_x
+
+
+def structuring_element_mask(passes):
+    """
+    Binary mask of the element described by line passes
+
+    Returns:
+        uint8 array, useful to compare with cv2.getStructuringElement
+    """
+    half_y, half_x = element_extent(passes)
+    mask = np.zeros((2 * half_y + 1, 2 * half_x + 1), dtype=np.uint8)
+    mask[half_y, half_x] = 1
+    return MorphologyEngine().dilate(mask, passes)
+
+
+def _neutral(dtype, op):
+    """Border value that never wins op, like OpenCV's default morphology border"""
+    if dtype == np.bool_:
+        return op is np.minimum
+    info = np.iinfo(dtype) if dtype.kind in 'ui' else np.finfo(dtype)
+    return info.min if op is np.maximum else info.max
+
+
+class MorphologyEngine:
+    """
+    Morphological operators built from van Herk/Gil-Werman line passes
+
+    Scratch buffers are cached by shape and dtype, so repeated operations on
+    frames of one size allocate nothing after the first call.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _buffer(self, name, shape, dtype):
+        key = (name, shape, np.dtype(dtype))
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def _columns(self, src, length, op, fill, out):
+        """Running extremum of length pixels down every column of src into out"""
+        h, w = src.shape
+        r = length // 2
+        blocks = -(-(h + 2 * r) // length)
+        n = blocks * length
+        padded = self._buffer('padded', (n, w), src.dtype)
+        padded[:r] = fill
+        padded[r:r + h] = src
+        padded[r + h:] = fill
+        prefix = self._buffer('prefix', (n, w), src.dtype)
+        suffix = self._buffer('suffix', (n, w), src.dtype)
+        # Row i of every block at once; one contiguous row operation per step
+        # (ufunc.accumulate along a middle axis is an order of magnitude slower)
+        rows = padded.reshape(blocks, length, w)
+        pre = prefix.reshape(blocks, length, w)
+        suf = suffix.reshape(blocks, length, w)
+        pre[:, 0] = rows[:, 0]
+        suf[:, -1] = rows[:, -1]
+        for i in range(1, length):
+            op(pre[:, i - 1], rows[:, i], out=pre[:, i])
+            op(suf[:, -i], rows[:, -i - 1], out=suf[:, -i - 1])
+        # Window [y, y + length - 1] of the padded column
+        op(suffix[:h], prefix[length - 1:length - 1 + h], out=out)
+        return out
+
+    def _sheared_view(self, buf, shape, direction):
+        """
+        View of an (h, w + h - 1) buffer whose rows are shifted one pixel per row
+
+        Writing an image through the view shears it so that the diagonals of
+        direction become columns of buf; reading through it undoes the shear.
+        """
+        h, w = shape
+        stride = buf.strides[0]
+        if direction == DIAGONAL:
+            # img[y, x] -> buf[y, x + h - 1 - y]
+            return np.lib.stride_tricks.as_strided(buf[:, h - 1:], shape=(h, w),
+                                                   strides=(stride - buf.itemsize, buf.itemsize))
+        # img[y, x] -> buf[y, x + y]
+        return np.lib.stride_tricks.as_strided(buf, shape=(h, w), strides=(stride + buf.itemsize, buf.itemsize))
+
+    def _transpose(self, src, dst):
+        if src.dtype in (np.uint8, np.uint16, np.int16, np.int32, np.float32, np.float64):
+            return cv2.transpose(src, dst)
+        np.copyto(dst, src.T)
+        return dst
+
+    def line_pass(self, src, direction, length, op, out=None):
+        """
+        Running max (op=np.maximum) or min (np.minimum) along one line direction
+
+        Args:
+            src: 2-D image
+            direction: HORIZONTAL, VERTICAL, DIAGONAL or ANTI_DIAGONAL
+            length: Segment length in pixels (made odd so the segment is centred)
+            op: np.maximum for dilation, np.minimum for erosion
+            out: Optional output array, may be src
+
+        Returns:
+            Filtered image
+        """
+        length = int(length) | 1
+        if out is None:
+            out = np.empty_like(src)
+        if length == 1:
+            np.copyto(out, src)
+            return out
+        fill = _neutral(src.dtype, op)
+
+        if direction == VERTICAL:
+            return self._columns(src, length, op, fill, out)
+        if direction == HORIZONTAL:
+            t = self._transpose(src, self._buffer('transposed', src.shape[::-1], src.dtype))
+            result = self._columns(t, length, op, fill, self._buffer('transposed_out', t.shape, src.dtype))
+            return self._transpose(result, out)
+        h, w = src.shape
+        sheared = self._buffer('sheared', (h, w + h - 1), src.dtype)
+        sheared.fill(fill)
+        self._sheared_view(sheared, src.shape, direction)[...] = src
+        result = self._columns(sheared, length, op, fill, self._buffer('sheared_out', sheared.shape, src.dtype))
+        out[...] = self._sheared_view(result, src.shape, direction)
+        return out
+
+    def _apply(self, img, passes, op, out):
+        if img.ndim == 3:
+            if out is None:
+                out = np.empty_like(img)
+            for c in range(img.shape[2]):
+                out[..., c] = self._apply(np.ascontiguousarray(img[..., c]), passes, op, None)
+            return out
+        if out is None:
+            out = np.empty_like(img)
+        if not passes:
+            np.copyto(out, img)
+            return out
+
+        # Rectangles are exact pass by pass; once diagonals mix with other
+        # directions an intermediate extremum may come from outside the image,
+        # so run on a copy padded by the element extent and crop
+        directions = {direction for direction, length in passes if int(length) > 1}
+        pad_y, pad_x = element_extent(passes)
+        if len(directions) > 1 and directions & {DIAGONAL, ANTI_DIAGONAL}:
+            h, w = img.shape
+            work = self._buffer('bordered', (h + 2 * pad_y, w + 2 * pad_x), img.dtype)
+            work.fill(_neutral(img.dtype, op))
+            work[pad_y:pad_y + h, pad_x:pad_x + w] = img
+            for direction, length in passes:
+                self.line_pass(work, direction, length, op, work)
+            np.copyto(out, work[pad_y:pad_y + h, pad_x:pad_x + w])
+            return out
+
+        src = img
+        for direction, length in passes:
+            out = self.line_pass(src, direction, length, op, out)
+            src = out
+        return out
+
+    def dilate(self, img, passes, out=None):
+        """Dilation by the element given as line passes"""
+        return self._apply(img, passes, np.maximum, out)
+
+    def erode(self, img, passes, out=None):
+        """Erosion by the element given as line passes"""
+        return self._apply(img, passes, np.minimum, out)
+
+    def opening(self, img, passes, out=None):
+        """Erosion followed by dilation"""
+        out = self.erode(img, passes, out)
+        return self.dilate(out, passes, out)
+
+    def closing(self, img, passes, out=None):
+        """Dilation followed by erosion"""
+        out = self.dilate(img, passes, out)
+        return self.erode(out, passes, out)
+
+    def top_hat(self, img, passes, out=None):
+        """Image minus its opening (bright details smaller than the element)"""
+        out = self.opening(img, passes, out)
+        return np.subtract(img, out, out=out)
+
+    def black_hat(self, img, passes, out=None):
+        """Closing minus the image (dark details smaller than the element)"""
+        out = self.closing(img, passes, out)
+        return np.subtract(out, img, out=out)
+
+    def gradient(self, img, passes, out=None):
+        """Dilation minus erosion"""
+        eroded = self.erode(img, passes, self._buffer('gradient', img.shape, img.dtype))
+        out = self.dilate(img, passes, out)
+        return np.subtract(out, eroded, out=out)
+
+    def reconstruct(self, marker, mask, out=None, check_every=8):
+        """
+        Morphological reconstruction by dilation of marker under mask
+
+        Two-level masks (0 and one other value) take a shortcut: each
+        8-connected component of the mask fills with the largest marker value
+        inside it. Other masks iterate 3x3 geodesic dilations in place until
+        stable.
+
+        Args:
+            marker: Marker image
+            mask: Mask image
+            out: Optional output array, may be marker
+            check_every: Geodesic dilations between convergence checks
+
+        Returns:
+            Reconstructed image
+        """
+        if out is None:
+            out = np.empty_like(mask)
+        np.minimum(marker, mask, out=out)
+        foreground = mask > 0
+        if np.array_equal(mask, foreground * mask.max()):
+            n, labels = cv2.connectedComponents(foreground.view(np.uint8), connectivity=8)
+            peak = np.zeros(n, dtype=mask.dtype)
+            np.maximum.at(peak, labels[foreground], out[foreground])
+            peak[0] = 0
+            np.take(peak, labels, out=out)
+            return out
+
+        kernel = np.ones((3, 3), np.uint8)
+        previous = self._buffer('reconstruct', mask.shape, mask.dtype)
+        while True:
+            np.copyto(previous, out)
+            for _ in range(check_every):
+                cv2.dilate(out, kernel, dst=out)
+                np.minimum(out, mask, out=out)
+            if np.array_equal(previous, out):
+                return out
+
+
+def make_synthetic_mask(size=(4096, 3072), n_blobs=150, noise=0.002, seed=0):
+    """
+    Binary mask of blobs with salt-and-pepper noise
+
+    Returns:
+        uint8 image with values 0 and 255
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for _ in range(n_blobs):
+        center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        axes = (int(rng.integers(10, 120)), int(rng.integers(10, 120)))
+        cv2.ellipse(mask, center, axes, float(rng.uniform(0, 180)), 0, 360, 255, -1)
+    flips = rng.random((h, w)) < noise
+    mask[flips] = 255 - mask[flips]
+    return mask
+
+
+def benchmark_morphology(size=(4096, 3072), kernel_sizes=(3, 11, 31, 51, 101), repeats=3):
+    """
+    Dilation and opening time against OpenCV across kernel sizes
+
+    Returns:
+        List of dicts with shape, kernel size, milliseconds for both methods
+        and IoU of the two results
+    """
+    img = make_synthetic_mask(size)
+    engine = MorphologyEngine()
+    out = np.empty_like(img)
+    results = []
+
+    def timed(fn):
+        best = np.inf
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - t0)
+        return 1e3 * best, result
+
+    for k in kernel_sizes:
+        for shape, passes, cv_shape in (('rect', rect(k, k), cv2.MORPH_RECT),
+                                        ('disk', disk(k // 2), cv2.MORPH_ELLIPSE)):
+            kernel = cv2.getStructuringElement(cv_shape, (k, k))
+            for op, ours, theirs in (
+                    ('dilate', lambda: engine.dilate(img, passes, out), lambda: cv2.dilate(img, kernel)),
+                    ('open', lambda: engine.opening(img, passes, out),
+                     lambda: cv2.morphologyEx(img, cv2.MORPH_OPEN, kernel))):
+                ms_ours, a = timed(ours)
+                ms_cv, b = timed(theirs)
+                union = np.logical_or(a, b).sum()
+                iou = np.logical_and(a, b).sum() / union if union else 1.0
+                results.append({'shape': shape, 'op': op, 'kernel': k, 'ms_line_passes': ms_ours,
+                                'ms_opencv': ms_cv, 'iou': float(iou)})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_morphology():
+        print(f"{stats['shape']:<5} {stats['op']:<7} {stats['kernel']:4d} px  "
+              f"line passes {stats['ms_line_passes']:8.1f} ms  OpenCV {stats['ms_opencv']:8.1f} ms  "
+              f"IoU {stats['iou']:.4f}")
@@ -0,0 +1,505 @@
+"""
+Batch contour analysis on packed point arrays.
+
+All contours of a frame live in one (M, 2) point array with an offsets array
+marking where each contour starts, so per-contour quantities are segmented
+reductions over that array (np.bincount on segment ids, ufunc.reduceat on
+offsets) instead of one cv2 call per contour. Results go into a columnar
+ContourTable whose range queries use lazily built sorted indexes.
+
+Convex hulls are built for all contours at once by pruning: the lowest and
+highest point of every x column are gathered in (contour, x) order with
+np.minimum.at / np.maximum.at, and every round drops each point that does not
+make a strict turn with its current neighbours in the lower or upper chain. A point
+above the segment joining two other points can never be a lower-hull vertex,
+so all such points of all contours can be dropped in the same round.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class PackedContours:
+    """
+    Contours stored as one concatenated point array
+
+    Attributes:
+        points: (M, 2) int32 array of (x, y) points
+        offsets: (n + 1,) int64 array; contour i is points[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, points, offsets):
+        self.points = np.ascontiguousarray(points, dtype=np.int32).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.diff(self.offsets)
+        if np.any(self.lengths < 1):
+            raise ValueError("Every contour needs at least one point")
+        self.segment = np.repeat(np.arange(len(self), dtype=np.intp), self.lengths)
+        # Index of the following point, wrapping around inside each contour
+        self.next = np.arange(1, len(self.points) + 1, dtype=np.intp)
+        if len(self):
+            self.next[self.offsets[1:] - 1] = self.offsets[:-1]
+
+    @classmethod
+    def from_cv2(cls, contours):
+        """Pack a list of cv2 contours ((k, 1, 2) arrays)"""
+        lengths = np.array([len(c) for c in contours], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        points = np.concatenate([c.reshape(-1, 2) for c in contours]) if contours else np.empty((0, 2))
+        return cls(points, offsets)
+
+    @classmethod
+    def from_mask(cls, mask, mode=cv2.RETR_EXTERNAL, method=cv2.CHAIN_APPROX_NONE):
+        """Find and pack the contours of a binary mask with a single cv2.findContours call"""
+        contours, _ = cv2.findContours(mask, mode, method)
+        return cls.from_cv2(contours)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """Contour i as a cv2-style (k, 1, 2) array"""
+        return self.points[self.offsets[i]:self.offsets[i + 1]].reshape(-1, 1, 2)
+
+    def to_cv2(self):
+        return [self[i] for i in range(len(self))]
+
+    def take(self, indices):
+        """New PackedContours with the given contours, gathered without a Python loop"""
+        indices = np.asarray(indices, dtype=np.intp)
+        lengths = self.lengths[indices]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        return PackedContours(self.points[ragged_arange(self.offsets[indices], lengths)], offsets)
+
+    def following(self, values):
+        """
+        values[self.next] for a per-point array, built from a shifted copy
+        plus one fix-up per contour instead of a full gather
+        """
+        out = np.empty_like(values)
+        out[:-1] = values[1:]
+        if len(self):
+            out[self.offsets[1:] - 1] = values[self.offsets[:-1]]
+        return out
+
+    def segment_sum(self, values):
+        """Per-contour sum of a per-point array"""
+        return np.bincount(self.segment, weights=values, minlength=len(self))
+
+    def area(self, oriented=False):
+        """Shoelace area of every contour, as cv2.contourArea"""
+        x, y = self.points[:, 0].astype(np.float64), self.points[:, 1].astype(np.float64)
+        signed = 0.5 * self.segment_sum(x * self.following(y) - self.following(x) * y)
+        return signed if oriented else np.abs(signed)
+
+    def perimeter(self, closed=True):
+        """Arc length of every contour, as cv2.arcLength"""
+        d = self.following(self.points) - self.points
+        # Squared steps are exact small integers; one sqrt replaces np.hypot
+        step = np.sqrt((d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1]).astype(np.float64))
+        if not closed:
+            step[self.offsets[1:] - 1] = 0
+        return self.segment_sum(step)
+
+    def bounding_rect(self):
+        """Upright bounding boxes (x, y, w, h), as cv2.boundingRect"""
+        if not len(self):
+            return np.empty((0, 4), dtype=np.int32)
+        starts = self.offsets[:-1]
+        low = np.minimum.reduceat(self.points, starts, axis=0)
+        high = np.maximum.reduceat(self.points, starts, axis=0)
+        return np.concatenate([low, high - low + 1], axis=1).astype(np.int32)
+
+    def moments(self):
+        """
+        Moments up to third order by Green's theorem, as cv2.moments
+
+        Terms are accumulated in coordinates relative to each contour's
+        bounding-box corner, which keeps the float64 sums small and lets the
+        central moments skip the cancellation of large spatial moments; the
+        spatial moments are shifted back per contour afterwards.
+
+        Returns:
+            Dict of per-contour arrays with cv2.moments keys: spatial 'm00' ..
+            'm03', central 'mu20' .. 'mu03' and normalized 'nu20' .. 'nu03'
+        """
+        n = len(self)
+        keys = ('m00', 'm10', 'm01', 'm20', 'm11', 'm02', 'm30', 'm21', 'm12', 'm03')
+        if not n:
+            return {k: np.empty(0) for k in keys + _CENTRAL_KEYS + tuple('nu' + k[2:] for k in _CENTRAL_KEYS)}
+        starts = self.offsets[:-1]
+        origin = np.minimum.reduceat(self.points, starts, axis=0)
+        local = (self.points - origin[self.segment]).T.astype(np.float64)
+        origin = origin.astype(np.float64)
+        x0, y0 = local
+        x1, y1 = self.following(x0), self.following(y0)
+
+        # Chunks keep the dozen temporaries of each term cache-resident
+        terms = np.empty((10, len(x0)))
+        for begin in range(0, len(x0), _MOMENT_CHUNK):
+            chunk = slice(begin, begin + _MOMENT_CHUNK)
+            _moment_terms(x0[chunk], y0[chunk], x1[chunk], y1[chunk], terms[:, chunk])
+        sums = np.add.reduceat(terms, starts, axis=1)
+        sums /= np.array([2, 6, 6, 12, 24, 12, 20, 60, 60, 20], dtype=np.float64)[:, None]
+        # Clockwise contours give negative moments; cv2 reports them for the positive orientation
+        sums *= np.where(sums[0] < 0, -1.0, 1.0)
+        local_m = dict(zip(keys, sums))
+
+        moments = _shift_moments(local_m, origin[:, 0], origin[:, 1])
+        moments.update(_central_moments(local_m))
+        return moments
+
+    def centroids(self):
+        """
+        Area and centroid of every contour from the first-order moments only
+
+        Much cheaper than moments() when the higher orders are not needed.
+        Contours with zero area get the centre of their bounding box.
+
+        Returns:
+            (area, cx, cy) arrays
+        """
+        if not len(self):
+            return np.empty(0), np.empty(0), np.empty(0)
+        starts = self.offsets[:-1]
+        origin = np.minimum.reduceat(self.points, starts, axis=0)
+        local = self.points - origin[self.segment]
+        x0, y0 = local[:, 0], local[:, 1]
+        x1, y1 = self.following(x0), self.following(y0)
+        cross = (x0 * y1 - x1 * y0).astype(np.float64)
+        m00 = np.add.reduceat(cross, starts) / 2
+        m10 = np.add.reduceat(cross * (x0 + x1), starts) / 6
+        m01 = np.add.reduceat(cross * (y0 + y1), starts) / 6
+        area = np.abs(m00)
+        safe = np.where(m00 != 0, m00, 1)
+        extent = np.maximum.reduceat(local, starts, axis=0)
+        cx = origin[:, 0] + np.where(m00 != 0, m10 / safe, extent[:, 0] / 2)
+        cy = origin[:, 1] + np.where(m00 != 0, m01 / safe, extent[:, 1] / 2)
+        return area, cx, cy
+
+    def convex_hull_chains(self):
+        """
+        Lower and upper convex hull chains of every contour
+
+        Returns:
+            (lower, upper): each a (segment, x, y) tuple of arrays sorted by
+            contour then x; both chains run from the leftmost-lowest to the
+            rightmost-highest point of the contour
+        """
+        n = len(self)
+        if not n:
+            empty = (np.empty(0, np.intp), np.empty(0, np.int64), np.empty(0, np.int64))
+            return empty, empty
+        # Only the lowest and highest point of every x column can be a hull
+        # vertex. Columns get dense ids inside each contour's x-range, so both
+        # extremes come from one minimum.at/maximum.at and are already ordered
+        # by (contour, x); repeated points of revisiting contours collapse too.
+        starts = self.offsets[:-1]
+        low = np.minimum.reduceat(self.points, starts, axis=0).astype(np.int64)
+        width = np.maximum.reduceat(self.points[:, 0], starts).astype(np.int64) - low[:, 0] + 1
+        local_x = self.points[:, 0] - low[self.segment, 0]
+        if width.sum() <= 4 * len(self.points):
+            column_start = np.concatenate([[0], np.cumsum(width)[:-1]])
+            column = column_start[self.segment] + local_x
+            column_segment = np.repeat(np.arange(n), width)
+            column_x = np.arange(width.sum()) - column_start[column_segment] + low[column_segment, 0]
+        else:
+            # Sparse polygons with wide boxes: number the occupied columns instead
+            keys, column = np.unique((self.segment.astype(np.int64) << 32) | local_x, return_inverse=True)
+            column_segment = (keys >> 32).astype(np.intp)
+            column_x = (keys & 0xFFFFFFFF) + low[column_segment, 0]
+        y = self.points[:, 1].astype(np.int64)
+        y_min = np.full(len(column_x), np.iinfo(np.int64).max)
+        y_max = np.full(len(column_x), np.iinfo(np.int64).min)
+        np.minimum.at(y_min, column, y)
+        np.maximum.at(y_max, column, y)
+        occupied = y_min <= y_max
+        segment, x = column_segment[occupied], column_x[occupied]
+        y_min, y_max = y_min[occupied], y_max[occupied]
+
+        # Close the chains with the vertical edges of the first and last column:
+        # the lower chain gets the last column's highest point appended and the
+        # upper chain the first column's lowest point prepended, one per contour
+        first = np.ones(len(segment), dtype=bool)
+        first[1:] = segment[1:] != segment[:-1]
+        last = np.roll(first, -1)
+        position = np.arange(len(segment)) + segment
+        lower = _insert_points(n, segment, x, y_min, position, position[last] + 1, y_max[last], last)
+        upper = _insert_points(n, segment, x, y_max, position + 1, position[first], y_min[first], first)
+        return _prune_chain(*lower, True), _prune_chain(*upper, False)
+
+
+def _insert_points(n, segment, x, y, at, extra_at, extra_y, extra):
+    """Scatter column points and one extra point per contour into (segment, x, y) chain arrays"""
+    size = len(segment) + n
+    chain = (np.empty(size, np.intp), np.empty(size, np.int64), np.empty(size, np.int64))
+    for array, values, extra_values in ((chain[0], segment, segment[extra]), (chain[1], x, x[extra]), (chain[2], y, extra_y)):
+        array[at] = values
+        array[extra_at] = extra_values
+    return chain
+
+
+_MOMENT_CHUNK = 1 << 14
+
+
+def _moment_terms(x0, y0, x1, y1, terms):
+    """Green's theorem terms of m00 .. m03 for edges (x0, y0) -> (x1, y1), before the divisors"""
+    cross, xs, ys = x0 * y1 - x1 * y0, x0 + x1, y0 + y1
+    x0sq, x1sq, y0sq, y1sq = x0 * x0, x1 * x1, y0 * y0, y1 * y1
+    terms[0] = cross
+    terms[1] = xs
+    terms[2] = ys
+    terms[3] = x0 * xs + x1sq
+    terms[4] = x0 * (ys + y0) + x1 * (ys + y1)
+    terms[5] = y0 * ys + y1sq
+    terms[6] = xs * (x0sq + x1sq)
+    terms[7] = x0sq * (3 * y0 + y1) + 2 * x1 * x0 * ys + x1sq * (y0 + 3 * y1)
+    terms[8] = y0sq * (3 * x0 + x1) + 2 * y1 * y0 * xs + y1sq * (x0 + 3 * x1)
+    terms[9] = ys * (y0sq + y1sq)
+    terms[1:] *= cross
+
+
+_CENTRAL_KEYS = ('mu20', 'mu11', 'mu02', 'mu30', 'mu21', 'mu12', 'mu03')
+
+
+def _shift_moments(m, ox, oy):
+    """Spatial moments about the origin from moments about (ox, oy)"""
+    from math import comb
+    shifted = {}
+    for key in m:
+        p, q = int(key[1]), int(key[2])
+        total = np.zeros_like(m['m00'])
+        for i in range(p + 1):
+            for j in range(q + 1):
+                total += comb(p, i) * comb(q, j) * ox ** (p - i) * oy ** (q - j) * m[f'm{i}{j}']
+        shifted[key] = total
+    return shifted
+
+
+def _central_moments(m):
+    """Central and normalized central moments from spatial moments, as in cv2.moments"""
+    m00 = m['m00']
+    safe = np.where(m00 != 0, m00, 1)
+    cx = np.where(m00 != 0, m['m10'] / safe, 0)
+    cy = np.where(m00 != 0, m['m01'] / safe, 0)
+    mu = {
+        'mu20': m['m20'] - cx * m['m10'],
+        'mu11': m['m11'] - cx * m['m01'],
+        'mu02': m['m02'] - cy * m['m01'],
+        'mu30': m['m30'] - cx * (3 * m['m20'] - 2 * cx * m['m10']),
+        'mu21': m['m21'] - cx * (2 * m['m11'] - 2 * cx * m['m01']) - cy * m['m20'],
+        'mu12': m['m12'] - cy * (2 * m['m11'] - 2 * cy * m['m10']) - cx * m['m02'],
+        'mu03': m['m03'] - cy * (3 * m['m02'] - 2 * cy * m['m01']),
+    }
+    inv = np.where(m00 != 0, 1 / np.abs(safe), 0)
+    for key in _CENTRAL_KEYS:
+        order = int(key[2]) + int(key[3])
+        mu['nu' + key[2:]] = mu[key] * inv ** (1 + order / 2)
+    return mu
+
+
+def ragged_arange(starts, lengths):
+    """Concatenation of arange(s, s + n) for every (s, n) pair"""
+    lengths = np.asarray(lengths, dtype=np.intp)
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp)
+    shift = np.repeat(np.asarray(starts, dtype=np.intp) - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(total, dtype=np.intp) + shift
+
+
+def _prune_chain(segment, x, y, keep_left_turns):
+    """Drop points that do not make a strict turn in the wanted direction until none are left"""
+    while True:
+        first = np.ones(len(segment), dtype=bool)
+        first[1:] = segment[1:] != segment[:-1]
+        last = np.ones(len(segment), dtype=bool)
+        last[:-1] = first[1:]
+        if len(segment) < 3:
+            return segment, x, y
+        # Turn of (previous, point, next); endpoints of every chain always stay
+        cross = np.zeros(len(segment), dtype=np.int64)
+        cross[1:-1] = ((x[1:-1] - x[:-2]) * (y[2:] - y[1:-1]) - (y[1:-1] - y[:-2]) * (x[2:] - x[1:-1]))
+        bad = cross <= 0 if keep_left_turns else cross >= 0
+        bad &= ~first & ~last
+        if not bad.any():
+            return segment, x, y
+        keep = ~bad
+        segment, x, y = segment[keep], x[keep], y[keep]
+
+
+def chain_edges(chain):
+    """Consecutive point pairs of hull chains: (segment, x0, y0, x1, y1)"""
+    segment, x, y = chain
+    same = segment[1:] == segment[:-1]
+    return segment[:-1][same], x[:-1][same], y[:-1][same], x[1:][same], y[1:][same]
+
+
+class ContourTable:
+    """
+    Columnar table of per-contour descriptors
+
+    Every column is a NumPy array of the same length. An 'index' column keeps
+    the position of each row in the PackedContours it was computed from, so
+    query results can be mapped back with PackedContours.take.
+    """
+
+    def __init__(self, columns):
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        n = len(next(iter(columns.values()))) if columns else 0
+        if any(len(values) != n for values in columns.values()):
+            raise ValueError("All columns must have the same length")
+        if 'index' not in columns:
+            columns = {'index': np.arange(n), **columns}
+        self.columns = columns
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self.columns['index'])
+
+    def __getitem__(self, key):
+        """Column by name, or a new table with the rows selected by a mask or index array"""
+        if isinstance(key, str):
+            return self.columns[key]
+        return ContourTable({name: values[key] for name, values in self.columns.items()})
+
+    def names(self):
+        return list(self.columns)
+
+    def _sorted_column(self, name):
+        if name not in self._sorted:
+            order = np.argsort(self.columns[name], kind='stable')
+            self._sorted[name] = (order, self.columns[name][order])
+        return self._sorted[name]
+
+    def select(self, **ranges):
+        """
+        Row indices whose columns fall inside the given inclusive ranges
+
+        Args:
+            ranges: column=(low, high); either bound may be None
+
+        Returns:
+            Sorted array of row positions
+        """
+        if not ranges:
+            return np.arange(len(self))
+        # Start from the narrowest range found by binary search on sorted columns
+        spans = {}
+        for name, (low, high) in ranges.items():
+            order, values = self._sorted_column(name)
+            start = 0 if low is None else np.searchsorted(values, low, side='left')
+            stop = len(values) if high is None else np.searchsorted(values, high, side='right')
+            spans[name] = (order, start, stop)
+        narrowest = min(spans, key=lambda name: spans[name][2] - spans[name][1])
+        order, start, stop = spans[narrowest]
+        rows = order[start:stop]
+        for name, (low, high) in ranges.items():
+            if name == narrowest:
+                continue
+            values = self.columns[name][rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            rows = rows[keep]
+        return np.sort(rows)
+
+    def query(self, **ranges):
+        """New table with the rows inside the given ranges (see select)"""
+        return self[self.select(**ranges)]
+
+
+def basic_table(packed):
+    """Area, perimeter, upright bounding box and centroid of every contour"""
+    area, cx, cy = packed.centroids()
+    box = packed.bounding_rect()
+    return ContourTable({
+        'area': area,
+        'perimeter': packed.perimeter(),
+        'x': box[:, 0], 'y': box[:, 1], 'width': box[:, 2], 'height': box[:, 3],
+        'cx': cx, 'cy': cy,
+        'points': packed.lengths,
+    })
+
+
+def make_synthetic_mask(size=(4096, 3072), n_shapes=12000, seed=0):
+    """
+    Binary mask of small ellipses, rectangles and star polygons
+
+    Returns:
+        uint8 mask with values 0 and 255
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    mask = np.zeros((h, w), dtype=np.uint8)
+    for i in range(n_shapes):
+        cx, cy = int(rng.integers(0, w)), int(rng.integers(0, h))
+        r = int(rng.integers(4, 14))
+        kind = i % 3
+        if kind == 0:
+            cv2.ellipse(mask, (cx, cy), (r, int(rng.integers(2, r + 1))), float(rng.uniform(0, 180)), 0, 360, 255, -1)
+        elif kind == 1:
+            box = ((cx, cy), (2 * r, int(rng.integers(2, 2 * r))), float(rng.uniform(0, 90)))
+            cv2.fillPoly(mask, [cv2.boxPoints(box).astype(np.int32)], 255)
+        else:
+            angles = np.linspace(0, 2 * np.pi, 11)[:-1] + rng.uniform(0, np.pi)
+            radii = np.where(np.arange(10) % 2 == 0, r, r / 2.5)
+            star = np.stack([cx + radii * np.cos(angles), cy + radii * np.sin(angles)], axis=1)
+            cv2.fillPoly(mask, [star.astype(np.int32)], 255)
+    return mask
+
+
+def benchmark_contour_analysis(size=(4096, 3072), n_shapes=20000):
+    """
+    Packed segmented reductions against one cv2 call per contour
+
+    Returns:
+        List of dicts with stage, milliseconds and contour count
+    """
+    mask = make_synthetic_mask(size, n_shapes)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    results = []
+
+    t0 = time.perf_counter()
+    packed = PackedContours.from_cv2(contours)
+    t1 = time.perf_counter()
+    table = basic_table(packed)
+    t2 = time.perf_counter()
+    results.append({'stage': 'pack', 'ms': 1e3 * (t1 - t0), 'contours': len(packed)})
+    results.append({'stage': 'packed area/perimeter/box/centroid', 'ms': 1e3 * (t2 - t1), 'contours': len(table)})
+
+    t0 = time.perf_counter()
+    reference = []
+    for c in contours:
+        m = cv2.moments(c)
+        reference.append((cv2.contourArea(c), cv2.arcLength(c, True), cv2.boundingRect(c),
+                          m['m10'] / m['m00'] if m['m00'] else 0))
+    results.append({'stage': 'cv2 per-contour loop', 'ms': 1e3 * (time.perf_counter() - t0),
+                    'contours': len(reference)})
+    area_error = np.abs(table['area'] - np.array([r[0] for r in reference])).max()
+    perimeter_error = np.abs(table['perimeter'] - np.array([r[1] for r in reference])).max()
+    box_error = np.abs(np.stack([table[k] for k in ('x', 'y', 'width', 'height')], 1)
+                       - np.array([r[2] for r in reference])).max()
+    has_area = table['area'] > 0
+    cx_error = np.abs(table['cx'] - np.array([r[3] for r in reference]))[has_area].max()
+    results.append({'stage': f'max |error| area {area_error:.1e} perimeter {perimeter_error:.1e} '
+                             f'box {box_error} cx {cx_error:.1e}',
+                    'ms': 0.0, 'contours': len(table)})
+
+    t0 = time.perf_counter()
+    queries = 100
+    for q in range(queries):
+        low = 20 + q
+        rows = table.select(area=(low, low + 50), perimeter=(None, 80))
+    results.append({'stage': f'{queries} range queries (sorted index)', 'ms': 1e3 * (time.perf_counter() - t0),
+                    'contours': len(rows)})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_contour_analysis():
+        print(f"{stats['stage']:<60} {stats['ms']:8.1f} ms  {stats['contours']:6d} contours")
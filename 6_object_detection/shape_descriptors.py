@@ -0,0 +1,242 @@
+"""
+Shape descriptors for thousands of contours at once.
+
+Works on PackedContours from contour_analysis: Hu moments come from the
+batched Green's-theorem moments, convexity and solidity from the batched
+convex hull chains, and minimum-area rotated rectangles from rotating
+calipers evaluated for every hull edge of every contour together. Every
+descriptor is one column of the ContourTable returned by describe_contours.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from contour_analysis import ContourTable, PackedContours, chain_edges, make_synthetic_mask, ragged_arange
+
+
+def hu_moments(m):
+    """
+    Seven Hu invariants from normalized central moments, as cv2.HuMoments
+
+    Args:
+        m: Moments dict from PackedContours.moments
+
+    Returns:
+        (n, 7) array
+    """
+    n20, n11, n02 = m['nu20'], m['nu11'], m['nu02']
+    n30, n21, n12, n03 = m['nu30'], m['nu21'], m['nu12'], m['nu03']
+    a, b = n30 + n12, n21 + n03
+    c, d = n30 - 3 * n12, 3 * n21 - n03
+    return np.stack([
+        n20 + n02,
+        (n20 - n02) ** 2 + 4 * n11 ** 2,
+        c ** 2 + d ** 2,
+        a ** 2 + b ** 2,
+        c * a * (a ** 2 - 3 * b ** 2) + d * b * (3 * a ** 2 - b ** 2),
+        (n20 - n02) * (a ** 2 - b ** 2) + 4 * n11 * a * b,
+        d * a * (a ** 2 - 3 * b ** 2) - c * b * (3 * a ** 2 - b ** 2),
+    ], axis=1)
+
+
+def hull_measures(packed, chains=None):
+    """
+    Convex hull area and perimeter of every contour
+
+    The area is the integral between the upper and lower chains, summed as
+    trapezoids over chain edges, so the hull polygon is never assembled.
+
+    Returns:
+        (hull_area, hull_perimeter) arrays
+    """
+    lower, upper = packed.convex_hull_chains() if chains is None else chains
+    n = len(packed)
+    area = np.zeros(n)
+    perimeter = np.zeros(n)
+    for chain, sign in ((upper, 1.0), (lower, -1.0)):
+        segment, x0, y0, x1, y1 = chain_edges(chain)
+        area += sign * np.bincount(segment, weights=(x1 - x0) * (y0 + y1) / 2, minlength=n)
+        perimeter += np.bincount(segment, weights=np.hypot(x1 - x0, y1 - y0), minlength=n)
+    return np.abs(area), perimeter
+
+
+def min_area_rects(packed, chains=None, max_pairs=2_000_000):
+    """
+    Minimum-area rotated rectangles by rotating calipers over all hull edges
+
+    For every hull edge the hull points of the same contour are projected onto
+    the edge direction and its normal; the edge with the smallest extent
+    product gives the rectangle. Edge-point pairs are processed in chunks of
+    at most max_pairs.
+
+    Returns:
+        (center, size, angle): (n, 2) centers (x, y), (n, 2) sizes (width along
+        the chosen side, height), and angles in degrees in [0, 90)
+    """
+    lower, upper = packed.convex_hull_chains() if chains is None else chains
+    n = len(packed)
+    # Hull points grouped by contour
+    p_seg = np.concatenate([lower[0], upper[0]])
+    order = np.argsort(p_seg, kind='stable')
+    p_seg = p_seg[order]
+    px = np.concatenate([lower[1], upper[1]])[order].astype(np.float64)
+    py = np.concatenate([lower[2], upper[2]])[order].astype(np.float64)
+    p_count = np.bincount(p_seg, minlength=n)
+    p_start = np.concatenate([[0], np.cumsum(p_count)[:-1]])
+
+    edges = [chain_edges(lower), chain_edges(upper)]
+    e_seg = np.concatenate([e[0] for e in edges])
+    ex = np.concatenate([e[3] - e[1] for e in edges]).astype(np.float64)
+    ey = np.concatenate([e[4] - e[2] for e in edges]).astype(np.float64)
+    length = np.hypot(ex, ey)
+    valid = length > 0
+    e_seg, ux, uy = e_seg[valid], ex[valid] / length[valid], ey[valid] / length[valid]
+
+    hull_points = px + 1j * py
+    direction = ux - 1j * uy
+    extents = np.empty((len(e_seg), 4))
+    pairs = p_count[e_seg]
+    bounds = np.searchsorted(np.cumsum(pairs), np.arange(max_pairs, pairs.sum() + max_pairs, max_pairs))
+    begin = 0
+    for end in np.unique(np.minimum(bounds + 1, len(e_seg))):
+        if end <= begin:
+            continue
+        counts = pairs[begin:end]
+        edge = np.repeat(np.arange(begin, end), counts)
+        point = ragged_arange(p_start[e_seg[begin:end]], counts)
+        # (px + i py) * conj(ux + i uy) = along + i across
+        rotated = hull_points[point] * direction[edge]
+        along, across = rotated.real, rotated.imag
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        extents[begin:end, 0] = np.minimum.reduceat(along, starts)
+        extents[begin:end, 1] = np.maximum.reduceat(along, starts)
+        extents[begin:end, 2] = np.minimum.reduceat(across, starts)
+        extents[begin:end, 3] = np.maximum.reduceat(across, starts)
+        begin = end
+
+    width = extents[:, 1] - extents[:, 0]
+    height = extents[:, 3] - extents[:, 2]
+    best_order = np.lexsort((width * height, e_seg))
+    first = np.ones(len(best_order), dtype=bool)
+    first[1:] = e_seg[best_order][1:] != e_seg[best_order][:-1]
+    best = best_order[first]
+    seg = e_seg[best]
+
+    # Contours without a hull edge (single points) get a zero-size rectangle at the point
+    center = np.stack([px[p_start], py[p_start]], axis=1) if len(px) else np.zeros((n, 2))
+    size = np.zeros((n, 2))
+    angle = np.zeros(n)
+    mid_along = (extents[best, 0] + extents[best, 1]) / 2
+    mid_across = (extents[best, 2] + extents[best, 3]) / 2
+    center[seg, 0] = mid_along * ux[best] - mid_across * uy[best]
+    center[seg, 1] = mid_along * uy[best] + mid_across * ux[best]
+    w, h = width[best], height[best]
+    theta = np.degrees(np.arctan2(uy[best], ux[best])) % 180
+    # Report the side whose direction lies in [0, 90) as the width
+    turn = theta >= 90
+    theta[turn] -= 90
+    w, h = np.where(turn, h, w), np.where(turn, w, h)
+    size[seg, 0], size[seg, 1], angle[seg] = w, h, theta
+    return center, size, angle
+
+
+def describe_contours(packed):
+    """
+    All descriptors of all contours as one ContourTable
+
+    Columns: area, perimeter, cx, cy, x, y, width, height, hu1..hu7,
+    hull_area, hull_perimeter, convexity (hull perimeter / perimeter),
+    solidity (area / hull area), circularity (4 pi area / perimeter^2),
+    aspect_ratio and extent of the upright box, and rect_cx, rect_cy,
+    rect_width, rect_height, rect_angle of the minimum-area rectangle.
+    """
+    moments = packed.moments()
+    box = packed.bounding_rect()
+    chains = packed.convex_hull_chains()
+    area = moments['m00']
+    perimeter = packed.perimeter()
+    hull_area, hull_perimeter = hull_measures(packed, chains)
+    center, size, angle = min_area_rects(packed, chains)
+    hu = hu_moments(moments)
+
+    def ratio(a, b):
+        return np.divide(a, b, out=np.zeros(len(a)), where=b > 0)
+
+    columns = {
+        'area': area,
+        'perimeter': perimeter,
+        'cx': np.where(area > 0, ratio(moments['m10'], area), box[:, 0] + (box[:, 2] - 1) / 2),
+        'cy': np.where(area > 0, ratio(moments['m01'], area), box[:, 1] + (box[:, 3] - 1) / 2),
+        'x': box[:, 0], 'y': box[:, 1], 'width': box[:, 2], 'height': box[:, 3],
+    }
+    columns.update({f'hu{i + 1}': hu[:, i] for i in range(7)})
+    columns.update({
+        'hull_area': hull_area,
+        'hull_perimeter': hull_perimeter,
+        'convexity': ratio(hull_perimeter, perimeter),
+        'solidity': ratio(area, hull_area),
+        'circularity': ratio(4 * np.pi * area, perimeter ** 2),
+        'aspect_ratio': box[:, 2] / box[:, 3],
+        'extent': area / (box[:, 2] * box[:, 3]),
+        'rect_cx': center[:, 0], 'rect_cy': center[:, 1],
+        'rect_width': size[:, 0], 'rect_height': size[:, 1], 'rect_angle': angle,
+    })
+    return ContourTable(columns)
+
+
+def describe_contours_cv2(contours):
+    """Reference: the same descriptors with one set of cv2 calls per contour"""
+    rows = []
+    for c in contours:
+        m = cv2.moments(c)
+        hull = cv2.convexHull(c)
+        (rcx, rcy), (rw, rh), rangle = cv2.minAreaRect(c)
+        rows.append((cv2.contourArea(c), cv2.arcLength(c, True), *cv2.boundingRect(c),
+                     *cv2.HuMoments(m).ravel(), cv2.contourArea(hull), cv2.arcLength(hull, True),
+                     rcx, rcy, rw, rh, rangle))
+    return np.array(rows)
+
+
+def benchmark_shape_descriptors(size=(4096, 3072), n_shapes=16000):
+    """
+    Batch descriptors against the per-contour cv2 loop
+
+    Returns:
+        List of dicts with method, milliseconds, contour count and the largest
+        differences from cv2
+    """
+    mask = make_synthetic_mask(size, n_shapes)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+
+    t0 = time.perf_counter()
+    table = describe_contours(PackedContours.from_cv2(contours))
+    t_packed = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    reference = describe_contours_cv2(contours)
+    t_cv2 = time.perf_counter() - t0
+
+    hu = np.stack([table[f'hu{i + 1}'] for i in range(7)], axis=1)
+    rect_area = table['rect_width'] * table['rect_height']
+    errors = {
+        'area': np.abs(table['area'] - reference[:, 0]).max(),
+        'hull_area': np.abs(table['hull_area'] - reference[:, 13]).max(),
+        'hull_perimeter': np.abs(table['hull_perimeter'] - reference[:, 14]).max(),
+        # Relative to each invariant's largest value: near-zero invariants of
+        # symmetric shapes carry cv2's own cancellation error
+        'hu (relative)': (np.abs(hu - reference[:, 6:13]) / np.abs(reference[:, 6:13]).max(axis=0)).max(),
+        'rect area': np.abs(rect_area - reference[:, 17] * reference[:, 18]).max(),
+    }
+    return [
+        {'method': 'packed batch', 'ms': 1e3 * t_packed, 'contours': len(table), 'errors': errors},
+        {'method': 'cv2 per contour', 'ms': 1e3 * t_cv2, 'contours': len(reference), 'errors': {}},
+    ]
+
+
+if __name__ == "__main__":
+    for stats in benchmark_shape_descriptors():
+        print(f"{stats['method']:<16} {stats['ms']:8.1f} ms  {stats['contours']:6d} contours")
+        for name, value in stats['errors'].items():
+            print(f"    max |difference| {name:<16} {value:.3g}")
@@ -0,0 +1,451 @@
+"""
+Sliding-window detection without per-window Python work.
+
+Windows of every pyramid level are numpy sliding_window_view views of the
+level image, so nothing is copied until a batch of surviving windows is
+scored. Window sums, variances and Haar-like rectangle features cost four
+integral-image lookups each, evaluated for the whole window grid with strided
+slices of the integral image (dense first stage) or with fancy indexing at the
+surviving window origins (later stages).
+
+A detector is a cascade of stages, each a feature extractor plus a pluggable
+classifier (any callable mapping an (N, F) feature batch to N scores, such as
+LinearClassifier). Windows whose score falls below a stage threshold are
+dropped before the next, more expensive stage is evaluated.
+"""
+
+import time
+
+import cv2
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def build_pyramid(img, window=(24, 24), scale=1.25, max_levels=None):
+    """
+    Image pyramid down to the window size
+
+    Args:
+        img: Grayscale image
+        window: (height, width) of the detection window
+        scale: Size ratio between consecutive levels
+        max_levels: Optional cap on the number of levels
+
+    Returns:
+        List of (factor, level) pairs; level coordinates times factor give
+        image coordinates
+    """
+    levels = [(1.0, img)]
+    factor = 1.0
+    while max_levels is None or len(levels) < max_levels:
+        factor *= scale
+        h, w = int(img.shape[0] / factor), int(img.shape[1] / factor)
+        if h < window[0] or w < window[1]:
+            break
+        # Each level is resampled from the previous one, which keeps the
+        # total cost near that of the first resize
+        levels.append((factor, cv2.resize(levels[-1][1], (w, h), interpolation=cv2.INTER_AREA)))
+    return levels
+
+
+def integral_images(img):
+    """
+    Zero-padded integral and squared integral images
+
+    Returns:
+        (ii, ii_sq) float64 arrays of shape (h + 1, w + 1)
+    """
+    ii, ii_sq = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    return ii, ii_sq
+
+
+def window_grid(shape, window=(24, 24), step=4):
+    """Number of window rows and columns that fit into an image of the given shape"""
+    ny = (shape[0] - window[0]) // step + 1
+    nx = (shape[1] - window[1]) // step + 1
+    return max(ny, 0), max(nx, 0)
+
+
+def window_views(img, window=(24, 24), step=4):
+    """
+    All windows of an image as a zero-copy (ny, nx, wh, ww) view
+
+    Window (i, j) has its top-left corner at (i * step, j * step).
+    """
+    return sliding_window_view(img, window)[::step, ::step]
+
+
+def grid_rect_sums(ii, rect, grid, step):
+    """
+    Sum of a rectangle at the same offset in every window of the grid
+
+    Args:
+        ii: Padded integral image
+        rect: (dy, dx, h, w) rectangle inside the window
+        grid: (ny, nx) window grid
+        step: Window stride
+
+    Returns:
+        (ny, nx) array of sums, from four strided slices of ii
+    """
+    dy, dx, h, w = rect
+    ny, nx = grid
+
+    def corner(y, x):
+        return ii[y:y + (ny - 1) * step + 1:step, x:x + (nx - 1) * step + 1:step]
+
+    return corner(dy + h, dx + w) - corner(dy, dx + w) - corner(dy + h, dx) + corner(dy, dx)
+
+
+def point_rect_sums(ii, ys, xs, rect):
+    """Sum of a rectangle at the same offset in the windows with top-left corners (ys, xs)"""
+    dy, dx, h, w = rect
+    y0, x0 = ys + dy, xs + dx
+    return ii[y0 + h, x0 + w] - ii[y0, x0 + w] - ii[y0 + h, x0] + ii[y0, x0]
+
+
+class HaarFeature:
+    """
+    Weighted sum of rectangle sums inside the window
+
+    Args:
+        rects: List of (dy, dx, h, w, weight) in window coordinates
+    """
+
+    def __init__(self, rects):
+        self.rects = [tuple(int(v) for v in r[:4]) + (float(r[4]),) for r in rects]
+
+    @classmethod
+    def two_vertical(cls, dy, dx, h, w):
+        """Top half minus bottom half of an (h, w) rectangle"""
+        half = h // 2
+        return cls([(dy, dx, half, w, 1.0), (dy + half, dx, half, w, -1.0)])
+
+    @classmethod
+    def two_horizontal(cls, dy, dx, h, w):
+        """Left half minus right half of an (h, w) rectangle"""
+        half = w // 2
+        return cls([(dy, dx, h, half, 1.0), (dy, dx + half, h, half, -1.0)])
+
+    @classmethod
+    def three_horizontal(cls, dy, dx, h, w):
+        """Outer thirds minus twice the middle third"""
+        third = w // 3
+        return cls([(dy, dx, h, 3 * third, 1.0), (dy, dx + third, h, third, -3.0)])
+
+    @classmethod
+    def four_checker(cls, dy, dx, h, w):
+        """Diagonal quadrants minus anti-diagonal quadrants"""
+        hh, hw = h // 2, w // 2
+        return cls([(dy, dx, hh, hw, 1.0), (dy + hh, dx + hw, hh, hw, 1.0),
+                    (dy, dx + hw, hh, hw, -1.0), (dy + hh, dx, hh, hw, -1.0)])
+
+    def on_grid(self, ii, grid, step):
+        return sum(weight * grid_rect_sums(ii, (dy, dx, h, w), grid, step) for dy, dx, h, w, weight in self.rects)
+
+    def at_points(self, ii, ys, xs):
+        return sum(weight * point_rect_sums(ii, ys, xs, (dy, dx, h, w)) for dy, dx, h, w, weight in self.rects)
+
+
+class LinearClassifier:
+    """
+    Score = features @ weights + bias
+
+    Args:
+        weights: (F,) weights
+        bias: Scalar offset
+    """
+
+    def __init__(self, weights, bias=0.0):
+        self.weights = np.asarray(weights, dtype=np.float64).ravel()
+        self.bias = float(bias)
+
+    def __call__(self, features):
+        return features.reshape(len(features), -1) @ self.weights + self.bias
+
+
+class CascadeStage:
+    """
+    One cascade stage
+
+    Args:
+        classifier: Callable mapping an (N, F) batch to N scores
+        threshold: Windows scoring below it are rejected
+        features: List of HaarFeature evaluated on the integral image (values
+            are divided by window area and standard deviation, as in
+            Viola-Jones), or 'pixels' to feed the normalized window pixels
+    """
+
+    def __init__(self, classifier, threshold=0.0, features='pixels'):
+        self.classifier = classifier
+        self.threshold = threshold
+        self.features = features
+
+
+class SlidingWindowDetector:
+    """
+    Cascaded sliding-window detector over an image pyramid
+
+    Args:
+        stages: List of CascadeStage
+        window: (height, width) of the detection window
+        step: Window stride in level pixels
+        scale: Pyramid scale step
+        min_std: Windows flatter than this are rejected before any stage
+        batch_size: Windows scored per classifier call in the later stages
+    """
+
+    def __init__(self, stages, window=(24, 24), step=4, scale=1.25, min_std=5.0, batch_size=65536):
+        self.stages = stages
+        self.window = tuple(window)
+        self.step = step
+        self.scale = scale
+        self.min_std = min_std
+        self.batch_size = batch_size
+        self.stats = {}
+
+    def _stage_features(self, stage, level, ii, ys, xs, mean, std):
+        area = self.window[0] * self.window[1]
+        if isinstance(stage.features, str):
+            # Only the surviving windows of the view are copied
+            patches = window_views(level, self.window, 1)[ys, xs].astype(np.float32)
+            patches -= mean[:, None, None].astype(np.float32)
+            patches /= std[:, None, None].astype(np.float32)
+            return patches.reshape(len(ys), -1)
+        values = np.stack([f.at_points(ii, ys, xs) for f in stage.features], axis=1)
+        return values / (area * std[:, None])
+
+    def detect_level(self, level):
+        """
+        Run the cascade on one pyramid level
+
+        Returns:
+            (ys, xs, scores, counts): window origins and final-stage scores of
+            the accepted windows, and the number of windows entering each stage
+        """
+        ii, ii_sq = integral_images(level)
+        grid = window_grid(level.shape, self.window, self.step)
+        counts = [grid[0] * grid[1]]
+        if not counts[0]:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, np.empty(0), counts + [0] * (len(self.stages) + 1)
+
+        # Dense stage: mean and variance of every window from strided slices
+        full = (0, 0) + self.window
+        area = self.window[0] * self.window[1]
+        mean = grid_rect_sums(ii, full, grid, self.step) / area
+        var = grid_rect_sums(ii_sq, full, grid, self.step) / area - mean ** 2
+        std = np.sqrt(np.maximum(var, 0))
+        keep = std >= self.min_std
+        stages = self.stages
+        scores = np.zeros(grid)
+        if stages and not isinstance(stages[0].features, str):
+            # A Haar first stage sees nearly every window, so it runs on the
+            # grid too: strided slices beat gathers at scattered origins
+            counts.append(int(keep.sum()))
+            values = np.stack([f.on_grid(ii, grid, self.step) for f in stages[0].features], axis=-1)
+            values /= area * np.where(keep, std, 1)[..., None]
+            scores = stages[0].classifier(values.reshape(-1, values.shape[-1])).reshape(grid)
+            keep &= scores >= stages[0].threshold
+            stages = stages[1:]
+        ys, xs = np.nonzero(keep)
+        mean, std, scores = mean[keep], std[keep], scores[keep]
+        ys, xs = ys * self.step, xs * self.step
+
+        for stage in stages:
+            counts.append(len(ys))
+            passed = np.zeros(len(ys), dtype=bool)
+            for begin in range(0, len(ys), self.batch_size):
+                batch = slice(begin, begin + self.batch_size)
+                features = self._stage_features(stage, level, ii, ys[batch], xs[batch], mean[batch], std[batch])
+                scores[batch] = stage.classifier(features)
+                passed[batch] = scores[batch] >= stage.threshold
+            ys, xs, mean, std, scores = ys[passed], xs[passed], mean[passed], std[passed], scores[passed]
+        counts.append(len(ys))
+        return ys, xs, scores, counts
+
+    def detect(self, img, iou_threshold=0.3):
+        """
+        Detect objects at all pyramid levels
+
+        Returns:
+            (boxes, scores): (K, 4) int array of (x, y, w, h) in image
+            coordinates after non-maximum suppression, and their scores.
+            self.stats holds the window counts entering each stage and the
+            elapsed time.
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        t0 = time.perf_counter()
+        boxes, scores = [], []
+        counts = np.zeros(len(self.stages) + 2, dtype=np.int64)
+        for factor, level in build_pyramid(gray, self.window, self.scale):
+            ys, xs, level_scores, level_counts = self.detect_level(level)
+            counts += level_counts
+            wh, ww = self.window
+            boxes.append(np.stack([xs * factor, ys * factor, np.full(len(xs), ww * factor),
+                                   np.full(len(xs), wh * factor)], axis=1))
+            scores.append(level_scores)
+        boxes = np.round(np.concatenate(boxes)).astype(np.int32)
+        scores = np.concatenate(scores)
+        keep = non_max_suppression(boxes, scores, iou_threshold)
+        elapsed = time.perf_counter() - t0
+        self.stats = {'windows': int(counts[0]), 'stage_inputs': counts[1:-1].tolist(),
+                      'accepted': int(counts[-1]), 'seconds': elapsed,
+                      'windows_per_second': counts[0] / elapsed if elapsed > 0 else float('inf')}
+        return boxes[keep], scores[keep]
+
+
+def non_max_suppression(boxes, scores, iou_threshold=0.3):
+    """
+    Greedy non-maximum suppression
+
+    Args:
+        boxes: (K, 4) array of (x, y, w, h)
+        scores: (K,) scores
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    order = np.argsort(-scores, kind='stable')
+    x0, y0 = boxes[:, 0].astype(np.float64), boxes[:, 1].astype(np.float64)
+    x1, y1 = x0 + boxes[:, 2], y0 + boxes[:, 3]
+    areas = boxes[:, 2].astype(np.float64) * boxes[:, 3]
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(x1[i], x1[rest]) - np.maximum(x0[i], x0[rest]), 0, None)
+        h = np.clip(np.minimum(y1[i], y1[rest]) - np.maximum(y0[i], y0[rest]), 0, None)
+        inter = w * h
+        order = rest[inter <= iou_threshold * (areas[i] + areas[rest] - inter)]
+    return np.array(keep, dtype=np.intp)
+
+
+def make_pattern(window=(24, 24)):
+    """Synthetic target: a dark band over a bright block inside a mid-grey frame"""
+    h, w = window
+    pattern = np.full(window, 0.5, dtype=np.float32)
+    pattern[h // 6:h // 2, w // 6:w - w // 6] = 0.15
+    pattern[h // 2:h - h // 6, w // 6:w - w // 6] = 0.85
+    return pattern
+
+
+def make_synthetic_scene(size=(1920, 1080), n_objects=30, window=(24, 24), seed=0):
+    """
+    Textured background with non-overlapping scaled copies of make_pattern
+
+    Returns:
+        (image, boxes): uint8 grayscale image and (n, 4) ground-truth (x, y, w, h)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    noise = rng.normal(0, 1, (h // 8 + 1, w // 8 + 1)).astype(np.float32)
+    background = cv2.resize(noise, (w, h), interpolation=cv2.INTER_CUBIC) * 25 + 128
+    img = background + rng.normal(0, 6, (h, w)).astype(np.float32)
+    pattern = make_pattern(window)
+    boxes = []
+    occupied = np.zeros((h, w), dtype=bool)
+    while len(boxes) < n_objects:
+        s = float(rng.uniform(1.0, 5.0))
+        bw, bh = int(window[1] * s), int(window[0] * s)
+        x, y = int(rng.integers(0, w - bw)), int(rng.integers(0, h - bh))
+        if occupied[y:y + bh, x:x + bw].any():
+            continue
+        occupied[y:y + bh, x:x + bw] = True
+        img[y:y + bh, x:x + bw] = cv2.resize(pattern, (bw, bh), interpolation=cv2.INTER_LINEAR) * 200 + 25
+        boxes.append((x, y, bw, bh))
+    return np.clip(img, 0, 255).astype(np.uint8), np.array(boxes)
+
+
+def make_demo_detector(window=(24, 24), step=2, scale=1.25):
+    """
+    Three-stage cascade for make_pattern: a dark-over-bright Haar pair, a
+    band-contrast Haar triple, then normalized correlation with the pattern
+    """
+    h, w = window
+    inner = (h // 6, w // 6, h - 2 * (h // 6), w - 2 * (w // 6))
+    template = make_pattern(window)
+    template = (template - template.mean()) / template.std()
+    stages = [
+        CascadeStage(LinearClassifier([-1.0]), 0.25, [HaarFeature.two_vertical(*inner)]),
+        CascadeStage(LinearClassifier([-1.0, -1.0]), 0.3,
+                     [HaarFeature.two_vertical(h // 6, w // 6, h // 3, w - 2 * (w // 6)),
+                      HaarFeature.two_vertical(h // 3, w // 6, h // 3, w - 2 * (w // 6))]),
+        CascadeStage(LinearClassifier(template / template.size), 0.7),
+    ]
+    return SlidingWindowDetector(stages, window, step, scale)
+
+
+def detect_naive(level, detector):
+    """Reference: slice, copy and score every window of one level in a Python loop"""
+    wh, ww = detector.window
+    ny, nx = window_grid(level.shape, detector.window, detector.step)
+    hits = []
+    for i in range(ny):
+        for j in range(nx):
+            y, x = i * detector.step, j * detector.step
+            patch = level[y:y + wh, x:x + ww].astype(np.float64)
+            mean, std = patch.mean(), patch.std()
+            if std < detector.min_std:
+                continue
+            score = 0.0
+            for stage in detector.stages:
+                if isinstance(stage.features, str):
+                    features = ((patch - mean) / std).reshape(1, -1)
+                else:
+                    features = np.array([[sum(weight * patch[dy:dy + h, dx:dx + w].sum()
+                                              for dy, dx, h, w, weight in f.rects) / (wh * ww * std)
+                                          for f in stage.features]])
+                score = stage.classifier(features)[0]
+                if score < stage.threshold:
+                    break
+            else:
+                hits.append((y, x, score))
+    return hits
+
+
+def benchmark_sliding_windows(size=(1920, 1080), n_objects=30, naive_rows=40):
+    """
+    Cascaded engine against the per-window Python loop
+
+    The naive loop runs on naive_rows window rows of the full-size level
+    only, and its throughput is extrapolated from there.
+
+    Returns:
+        List of dicts with method, windows, seconds, windows per second and
+        detection counts
+    """
+    img, truth = make_synthetic_scene(size, n_objects)
+    detector = make_demo_detector()
+    boxes, _ = detector.detect(img)
+    stats = detector.stats
+
+    # A strip through the smallest object, which the full-size level can hold
+    wh = detector.window[0]
+    top = max(int(truth[np.argmin(truth[:, 3]), 1]) - 4 * detector.step, 0)
+    strip = img[top:top + (naive_rows - 1) * detector.step + wh]
+    t0 = time.perf_counter()
+    naive_hits = detect_naive(strip, detector)
+    t_naive = time.perf_counter() - t0
+    naive_windows = int(np.prod(window_grid(strip.shape, detector.window, detector.step)))
+    ys, _, _, _ = detector.detect_level(strip)
+
+    found = 0
+    for x, y, w, h in truth:
+        dx = np.abs(boxes[:, 0] + boxes[:, 2] / 2 - (x + w / 2))
+        dy = np.abs(boxes[:, 1] + boxes[:, 3] / 2 - (y + h / 2))
+        found += bool(np.any((dx < w / 4) & (dy < h / 4) & (np.abs(boxes[:, 2] - w) < w / 3)))
+    return [
+        {'method': 'cascade engine', 'windows': stats['windows'], 'seconds': stats['seconds'],
+         'windows_per_second': stats['windows_per_second'],
+         'detections': f"{len(boxes)} boxes, {found}/{len(truth)} objects found, stage inputs {stats['stage_inputs']}"},
+        {'method': 'python loop', 'windows': naive_windows, 'seconds': t_naive,
+         'windows_per_second': naive_windows / t_naive,
+         'detections': f"{len(naive_hits)} hits on the strip (engine: {len(ys)})"},
+    ]
+
+
+if __name__ == "__main__":
+    for stats in benchmark_sliding_windows():
+        print(f"{stats['method']:<16} {stats['windows']:10d} windows {stats['seconds'] * 1e3:9.1f} ms "
+              f"{stats['windows_per_second'] / 1e6:8.2f} M windows/s  {stats['detections']}")
@@ -0,0 +1,300 @@
+"""
+Memory-bounded semi-global matching.
+
+Matching costs are census Hamming distances stored as uint8 (or uint16 after
+optional block aggregation); path costs and their sum are uint16. The image is
+processed in horizontal strips with an overlap halo, so memory depends on the
+strip height rather than the image height. Path directions are independent
+and are spread over a thread pool, each worker summing into its own
+accumulator.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from disparity_map import INVALID_DISPARITY, disparity_error, make_synthetic_stereo_pair, to_gray_float
+from stereo_matching_block import box_sum, census_cost_volume, census_transform, right_view_costs, subpixel_refine
+
+PATHS_4 = ((0, 1), (0, -1), (1, 0), (-1, 0))
+PATHS_8 = PATHS_4 + ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+def _path_step(prev, cost, P1, P2):
+    """
+    One SGM recursion step for a line of pixels
+
+    L(p, d) = C(p, d) + min(L(p-r, d), L(p-r, d +- 1) + P1, min_k L(p-r, k) + P2) - min_k L(p-r, k)
+
+    Args:
+        prev: uint16 path costs of the predecessors, shape (N, D)
+        cost: Matching costs of the current pixels, shape (N, D)
+        P1: Penalty for disparity changes of one pixel
+        P2: Penalty for larger disparity changes
+
+    Returns:
+        uint16 path costs of the current pixels
+    """
+    floor = prev.min(axis=1, keepdims=True)
+    best = np.minimum(prev, floor + P2)
+    np.minimum(best[:, 1:], prev[:, :-1] + P1, out=best[:, 1:])
+    np.minimum(best[:, :-1], prev[:, 1:] + P1, out=best[:, :-1])
+    best -= floor
+    best += cost
+    return best
+
+
+def aggregate_path(cost, direction, P1, P2, out):
+    """
+    Add the path costs of one scan direction into out
+
+    Args:
+        cost: Matching cost volume (H, W, D), uint8 or uint16
+        direction: (dy, dx) step between a pixel and its successor
+        P1: Small disparity change penalty
+        P2: Large disparity change penalty
+        out: uint16 accumulator of shape (H, W, D)
+    """
+    dy, dx = direction
+    h, w, n = cost.shape
+    P1, P2 = np.uint16(P1), np.uint16(P2)
+
+    if dy == 0:
+        # Horizontal paths sweep columns; each step handles a full column
+        columns = range(w) if dx > 0 else range(w - 1, -1, -1)
+        prev = None
+        for x in columns:
+            c = cost[:, x, :]
+            prev = c.astype(np.uint16) if prev is None else _path_step(prev, c, P1, P2)
+            out[:, x, :] += prev
+        return
+
+    # Vertical and diagonal paths sweep rows; diagonals shift the previous row by dx
+    rows = range(h) if dy > 0 else range(h - 1, -1, -1)
+    prev = None
+    shifted = np.zeros((w, n), dtype=np.uint16)
+    for y in rows:
+        c = cost[y]
+        if prev is None:
+            prev = c.astype(np.uint16)
+        else:
+            if dx == 0:
+                pred = prev
+            else:
+                # Pixels entering the path at the image border have no predecessor;
+                # a flat zero row makes their step term vanish
+                shifted[:] = 0
+                if dx > 0:
+                    shifted[1:] = prev[:-1]
+                else:
+                    shifted[:-1] = prev[1:]
+                pred = shifted
+            prev = _path_step(pred, c, P1, P2)
+        out[y] += prev
+
+
+class SemiGlobalMatcher:
+    """
+    Strip-wise SGM with census costs and uint16 path aggregation
+
+    Peak memory is about (strip_height + 2 * overlap) * W * D bytes for the
+    cost volume plus twice that for each path accumulator.
+    """
+
+    def __init__(self, num_disparities=64, min_disparity=0, paths=8, P1=8, P2=96,
+                 census_window=5, block_size=1, strip_height=None, overlap=16,
+                 max_memory_mb=256, workers=None, subpixel=True, lr_check=True,
+                 lr_tolerance=1.0):
+        """
+        Args:
+            num_disparities: Size of the disparity search range
+            min_disparity: Smallest disparity searched
+            paths: Number of aggregation directions, 4 or 8
+            P1: Penalty for disparity changes of one pixel
+            P2: Penalty for larger disparity changes
+            census_window: Census window size (odd, at most 7)
+            block_size: Optional odd box window summing census costs before SGM
+            strip_height: Rows per strip (default: derived from max_memory_mb)
+            overlap: Extra rows above and below each strip for vertical paths
+            max_memory_mb: Budget for cost volume and accumulators per strip
+            workers: Threads used for path directions (default: CPU count)
+            subpixel: Refine disparities with a parabola fit
+            lr_check: Invalidate pixels failing the left-right consistency check
+            lr_tolerance: Maximum left/right disparity difference in pixels
+        """
+        if paths not in (4, 8):
+            raise ValueError("paths must be 4 or 8")
+        if block_size % 2 == 0:
+            raise ValueError("block_size must be odd")
+        # Out-of-image candidates cost 64 (census_cost_volume), above any Hamming distance
+        bits = census_window * census_window - 1
+        max_cost = max(bits, 64) * block_size * block_size
+        if paths * (max_cost + P2) >= np.iinfo(np.uint16).max:
+            raise ValueError("Path costs would overflow uint16; lower P2 or block_size")
+        self.num_disparities = num_disparities
+        self.min_disparity = min_disparity
+        self.directions = PATHS_8 if paths == 8 else PATHS_4
+        self.P1 = P1
+        self.P2 = P2
+        self.census_window = census_window
+        self.block_size = block_size
+        self.strip_height = strip_height
+        self.overlap = overlap
+        self.max_memory_mb = max_memory_mb
+        self.workers = min(workers or os.cpu_count(), len(self.directions))
+        self.subpixel = subpixel
+        self.lr_check = lr_check
+        self.lr_tolerance = lr_tolerance
+
+    def bytes_per_row(self, width):
+        """Volume bytes per image row: uint8/uint16 costs plus uint16 accumulators"""
+        cost_bytes = 1 if self.block_size == 1 else 2
+        return width * self.num_disparities * (cost_bytes + 2 * (self.workers + 1))
+
+    def _rows_per_strip(self, height, width):
+        if self.strip_height:
+            return self.strip_height
+        budget_rows = int(self.max_memory_mb * 2 ** 20 // self.bytes_per_row(width))
+        return int(np.clip(budget_rows - 2 * self.overlap, 8, height))
+
+    def _cost_volume(self, left, right):
+        d_lo = self.min_disparity
+        volume = census_cost_volume(left, right, d_lo, d_lo + self.num_disparities)
+        if self.block_size > 1:
+            volume = box_sum(volume.astype(np.uint16), self.block_size)
+        return volume
+
+    def _aggregate(self, cost):
+        """Sum of all path costs, with directions split across worker threads"""
+        groups = [self.directions[i::self.workers] for i in range(self.workers)]
+
+        def run(group):
+            acc = np.zeros(cost.shape, dtype=np.uint16)
+            for direction in group:
+                aggregate_path(cost, direction, self.P1, self.P2, acc)
+            return acc
+
+        if self.workers == 1:
+            return run(groups[0])
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            partial = list(pool.map(run, groups))
+        total = partial[0]
+        for acc in partial[1:]:
+            total += acc
+        return total
+
+    def _disparity(self, volume):
+        d_lo = self.min_disparity
+        index = np.argmin(volume, axis=2)
+        if self.subpixel:
+            disparity = subpixel_refine(volume, index) + d_lo
+        else:
+            disparity = (index + d_lo).astype(np.float32)
+
+        if self.lr_check:
+            disparity_r = np.argmin(right_view_costs(volume, d_lo), axis=2) + d_lo
+            h, w = disparity.shape
+            xr = np.arange(w)[None, :] - np.rint(disparity).astype(np.int64)
+            matched = disparity_r[np.arange(h)[:, None], np.clip(xr, 0, w - 1)]
+            consistent = (xr >= 0) & (np.abs(matched - disparity) <= self.lr_tolerance)
+            disparity[~consistent] = INVALID_DISPARITY
+        return disparity
+
+    def compute(self, left, right):
+        """
+        Compute the left disparity map
+
+        Args:
+            left: Rectified left image (BGR or grayscale)
+            right: Rectified right image (BGR or grayscale)
+
+        Returns:
+            float32 disparity map with INVALID_DISPARITY for rejected pixels
+        """
+        left_c = census_transform(to_gray_float(left), self.census_window)
+        right_c = census_transform(to_gray_float(right), self.census_window)
+        h, w = left_c.shape
+        step = self._rows_per_strip(h, w)
+
+        disparity = np.empty((h, w), dtype=np.float32)
+        for y0 in range(0, h, step):
+            y1 = min(y0 + step, h)
+            top, bottom = max(y0 - self.overlap, 0), min(y1 + self.overlap, h)
+            cost = self._cost_volume(left_c[top:bottom], right_c[top:bottom])
+            volume = self._aggregate(cost)
+            del cost
+            disparity[y0:y1] = self._disparity(volume[y0 - top:y1 - top])
+        return disparity
+
+
+def _peak_rss_mb(fn, *args):
+    """
+    Run fn(*args) and return (result, peak resident memory increase in MB)
+
+    Uses the Linux VmHWM counter, which is reset through /proc/self/clear_refs
+    so that allocations made inside OpenCV are measured as well. Returns None
+    for the memory figure on other platforms.
+    """
+    def read_status(key):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1]) / 1024.0
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = read_status('VmRSS')
+    except OSError:
+        return fn(*args), None
+    result = fn(*args)
+    return result, read_status('VmHWM') - baseline
+
+
+def benchmark_sgm(size=(480, 640), disparity_ranges=(64, 128), paths=8, repeats=2):
+    """
+    Compare memory and speed with cv2.StereoSGBM across disparity ranges
+
+    Returns:
+        List of dicts with time, peak memory and accuracy per configuration
+    """
+    results = []
+    for num_disparities in disparity_ranges:
+        left, right, gt, valid = make_synthetic_stereo_pair(size, max_disparity=int(0.75 * num_disparities))
+
+        block = 5
+        sgbm = cv2.StereoSGBM_create(minDisparity=0, numDisparities=num_disparities, blockSize=block,
+                                     P1=8 * block * block, P2=32 * block * block,
+                                     mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY if paths == 4
+                                     else cv2.STEREO_SGBM_MODE_HH4)
+
+        def opencv_sgbm(l, r):
+            disparity = sgbm.compute(l, r).astype(np.float32) / 16.0
+            disparity[disparity < 0] = INVALID_DISPARITY
+            return disparity
+
+        bounded = SemiGlobalMatcher(num_disparities, paths=paths, max_memory_mb=64)
+        whole = SemiGlobalMatcher(num_disparities, paths=paths, strip_height=size[0])
+        configs = [('cv2.StereoSGBM', opencv_sgbm),
+                   ('SGM strips (64 MB budget)', bounded.compute),
+                   ('SGM whole image', whole.compute)]
+        for name, fn in configs:
+            disparity, peak_mb = _peak_rss_mb(fn, left, right)
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                fn(left, right)
+            stats = {'method': name, 'disparities': num_disparities,
+                     'ms': 1e3 * (time.perf_counter() - t0) / repeats, 'peak_mb': peak_mb}
+            stats.update(disparity_error(disparity, gt, valid))
+            results.append(stats)
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_sgm():
+        peak = 'n/a' if stats['peak_mb'] is None else f"{stats['peak_mb']:7.1f} MB"
+        print(f"{stats['method']:<27} D={stats['disparities']:<4} {stats['ms']:8.1f} ms  peak {peak}  "
+              f"bad>1px {stats['bad_pct']:5.2f}%  density {stats['density_pct']:5.1f}%")
@@ -0,0 +1,228 @@
+"""
+Stereo rectification with precomputed, cached remap tables.
+
+stereoRectify and initUndistortRectifyMap depend only on the calibration, so
+a StereoRectifier computes the maps once, stores them in OpenCV's compact
+fixed-point form (CV_16SC2 coordinates plus a uint16 interpolation table),
+caches them on disk under a hash of the calibration and remaps every frame
+into preallocated buffers. An optional ROI restricts remapping to the region
+later stages actually read.
+"""
+
+import hashlib
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+def calibration_hash(K1, D1, K2, D2, R, T, image_size, alpha=0.0):
+    """
+    Stable hash of everything the rectification maps depend on
+
+    Returns:
+        Hex digest string
+    """
+    h = hashlib.sha1()
+    for arr in (K1, D1, K2, D2, R, T):
+        h.update(np.ascontiguousarray(arr, dtype=np.float64).tobytes())
+    h.update(np.array([image_size[0], image_size[1], alpha], dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+class StereoRectifier:
+    """
+    Compute-once stereo rectifier
+
+    Attributes after construction:
+        R1, R2, P1, P2, Q: Outputs of cv2.stereoRectify
+        maps: ((map1_left, map2_left), (map1_right, map2_right)) in CV_16SC2 + uint16 form
+        roi: Active (x, y, w, h) output region, or None for the full frame
+    """
+
+    def __init__(self, K1, D1, K2, D2, R, T, image_size, alpha=0.0, cache_dir=None,
+                 interpolation=cv2.INTER_LINEAR):
+        """
+        Args:
+            K1, D1: Left intrinsics and distortion coefficients
+            K2, D2: Right intrinsics and distortion coefficients
+            R, T: Rotation and translation from the left to the right camera
+            image_size: (width, height) of the input frames
+            alpha: Free scaling parameter of cv2.stereoRectify
+            cache_dir: Directory for cached maps (None disables caching)
+            interpolation: Interpolation used by cv2.remap
+        """
+        self.image_size = tuple(int(v) for v in image_size)
+        self.interpolation = interpolation
+        self.key = calibration_hash(K1, D1, K2, D2, R, T, self.image_size, alpha)
+        self.cache_path = None
+        if cache_dir is not None:
+            self.cache_path = os.path.join(cache_dir, f"rectify_{self.key}.npz")
+
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            self._load(self.cache_path)
+        else:
+            self._compute(K1, D1, K2, D2, R, T, alpha)
+            if self.cache_path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                self._save(self.cache_path)
+
+        self._full_maps = self.maps
+        self.roi = None
+        self._buffers = {}
+
+    def _compute(self, K1, D1, K2, D2, R, T, alpha):
+        self.R1, self.R2, self.P1, self.P2, self.Q, self.valid_roi_left, self.valid_roi_right = \
+            cv2.stereoRectify(K1, D1, K2, D2, self.image_size, R, T, alpha=alpha)
+        self.maps = (
+            cv2.initUndistortRectifyMap(K1, D1, self.R1, self.P1, self.image_size, cv2.CV_16SC2),
+            cv2.initUndistortRectifyMap(K2, D2, self.R2, self.P2, self.image_size, cv2.CV_16SC2),
+        )
+
+    def _save(self, path):
+        # Write to a temporary file first so a crash never leaves a partial cache
+        tmp = path + '.tmp.npz'
+        (l1, l2), (r1, r2) = self.maps
+        np.savez(tmp, left_map1=l1, left_map2=l2, right_map1=r1, right_map2=r2,
+                 R1=self.R1, R2=self.R2, P1=self.P1, P2=self.P2, Q=self.Q,
+                 valid_roi_left=self.valid_roi_left, valid_roi_right=self.valid_roi_right)
+        os.replace(tmp, path)
+
+    def _load(self, path):
+        with np.load(path) as data:
+            self.maps = ((data['left_map1'], data['left_map2']),
+                         (data['right_map1'], data['right_map2']))
+            self.R1, self.R2 = data['R1'], data['R2']
+            self.P1, self.P2, self.Q = data['P1'], data['P2'], data['Q']
+            self.valid_roi_left = tuple(int(v) for v in data['valid_roi_left'])
+            self.valid_roi_right = tuple(int(v) for v in data['valid_roi_right'])
+
+    @property
+    def nbytes(self):
+        """Bytes held by the active remap tables"""
+        return sum(m.nbytes for pair in self.maps for m in pair)
+
+    def set_roi(self, roi):
+        """
+        Restrict remapping to a region of the rectified frame
+
+        The maps are cropped once, so each remap only touches ROI pixels.
+        Note that the rectified output then starts at (x, y), so principal
+        points in P1, P2 and Q must be shifted by the caller if needed.
+
+        Args:
+            roi: (x, y, w, h) in rectified coordinates, or None for the full frame
+        """
+        self.roi = roi
+        if roi is None:
+            self.maps = self._full_maps
+        else:
+            x, y, w, h = roi
+            self.maps = tuple((np.ascontiguousarray(m1[y:y + h, x:x + w]),
+                               np.ascontiguousarray(m2[y:y + h, x:x + w]))
+                              for m1, m2 in self._full_maps)
+        self._buffers = {}
+
+    def _buffer(self, side, img):
+        h, w = self.maps[side][0].shape[:2]
+        shape = (h, w) + img.shape[2:]
+        key = (side, shape, img.dtype)
+        if key not in self._buffers:
+            self._buffers[key] = np.empty(shape, dtype=img.dtype)
+        return self._buffers[key]
+
+    def rectify(self, left, right):
+        """
+        Rectify a stereo frame pair into the rectifier's reusable buffers
+
+        The returned arrays are overwritten by the next call; copy them if
+        they must outlive the frame.
+
+        Args:
+            left: Left input image
+            right: Right input image
+
+        Returns:
+            (left_rectified, right_rectified)
+        """
+        out = []
+        for side, img in enumerate((left, right)):
+            map1, map2 = self.maps[side]
+            dst = self._buffer(side, img)
+            cv2.remap(img, map1, map2, self.interpolation, dst=dst)
+            out.append(dst)
+        return tuple(out)
+
+
+def make_synthetic_calibration(image_size=(1280, 720), baseline=0.12, seed=0):
+    """
+    Plausible stereo calibration with distortion and a slight relative rotation
+
+    Returns:
+        (K1, D1, K2, D2, R, T)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = image_size
+    f = 0.9 * w
+    K1 = np.array([[f, 0, w / 2 + 5], [0, f, h / 2 - 3], [0, 0, 1]])
+    K2 = np.array([[f * 1.01, 0, w / 2 - 4], [0, f * 1.01, h / 2 + 2], [0, 0, 1]])
+    D1 = np.array([-0.12, 0.05, 0.001, -0.0005, 0.0])
+    D2 = np.array([-0.11, 0.045, -0.0008, 0.0004, 0.0])
+    R, _ = cv2.Rodrigues(rng.normal(0, 0.01, 3))
+    T = np.array([-baseline, 0.002, 0.001])
+    return K1, D1, K2, D2, R, T
+
+
+def benchmark_rectification(image_size=(1280, 720), frames=30):
+    """
+    Per-frame cost of rectifying with recomputed, float and fixed-point maps
+
+    Returns:
+        List of dicts with milliseconds per stereo frame and map memory
+    """
+    K1, D1, K2, D2, R, T = make_synthetic_calibration(image_size)
+    w, h = image_size
+    rng = np.random.default_rng(1)
+    left = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    right = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+    def per_frame_recompute():
+        R1, R2, P1, P2, _, _, _ = cv2.stereoRectify(K1, D1, K2, D2, image_size, R, T)
+        ml = cv2.initUndistortRectifyMap(K1, D1, R1, P1, image_size, cv2.CV_32FC1)
+        mr = cv2.initUndistortRectifyMap(K2, D2, R2, P2, image_size, cv2.CV_32FC1)
+        cv2.remap(left, ml[0], ml[1], cv2.INTER_LINEAR)
+        cv2.remap(right, mr[0], mr[1], cv2.INTER_LINEAR)
+
+    R1, R2, P1, P2, _, _, _ = cv2.stereoRectify(K1, D1, K2, D2, image_size, R, T)
+    float_maps = (cv2.initUndistortRectifyMap(K1, D1, R1, P1, image_size, cv2.CV_32FC1),
+                  cv2.initUndistortRectifyMap(K2, D2, R2, P2, image_size, cv2.CV_32FC1))
+
+    def cached_float():
+        cv2.remap(left, float_maps[0][0], float_maps[0][1], cv2.INTER_LINEAR)
+        cv2.remap(right, float_maps[1][0], float_maps[1][1], cv2.INTER_LINEAR)
+
+    rectifier = StereoRectifier(K1, D1, K2, D2, R, T, image_size)
+    roi_rectifier = StereoRectifier(K1, D1, K2, D2, R, T, image_size)
+    roi_rectifier.set_roi((w // 4, h // 4, w // 2, h // 2))
+
+    configs = [
+        ('recompute + float maps', per_frame_recompute, 2 * sum(m.nbytes for m in float_maps[0])),
+        ('cached float maps', cached_float, 2 * sum(m.nbytes for m in float_maps[0])),
+        ('cached CV_16SC2 maps', lambda: rectifier.rectify(left, right), rectifier.nbytes),
+        ('CV_16SC2 maps, center ROI', lambda: roi_rectifier.rectify(left, right), roi_rectifier.nbytes),
+    ]
+    results = []
+    for name, fn, map_bytes in configs:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(frames):
+            fn()
+        results.append({'method': name, 'ms': 1e3 * (time.perf_counter() - t0) / frames,
+                        'map_mb': map_bytes / 2 ** 20})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_rectification():
+        print(f"{stats['method']:<28} {stats['ms']:7.2f} ms/frame  maps {stats['map_mb']:6.1f} MB")
@@ -0,0 +1,169 @@
+"""
+Batched linear (DLT) triangulation.
+
+Each correspondence gives four linear equations A X = 0 in the homogeneous
+point X. Fixing X_w = 1 turns this into a 4x3 least-squares problem whose
+normal equations are solved in closed form for all points at once, with the
+systems laid out as (4, 4, N) arrays so every step is a long contiguous vector
+operation. Chunking keeps scratch memory at a few MB for millions of points.
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+from depth_from_disparity import PointCloudWriter
+
+
+def _dlt_rows(P1, P2, x1, x2):
+    """
+    Build the DLT rows of a chunk in struct-of-arrays layout
+
+    Returns:
+        float64 array (4, 4, N): equation, homogeneous coordinate, point
+    """
+    A = np.empty((4, 4, len(x1)), dtype=np.float64)
+    for k, (P, u, axis) in enumerate(((P1, x1, 0), (P1, x1, 1), (P2, x2, 0), (P2, x2, 1))):
+        np.multiply(P[2][:, None], u[:, axis], out=A[k])
+        A[k] -= P[axis][:, None]
+    # Equalize row scales so that no view dominates the least-squares fit
+    A /= np.sqrt(np.einsum('kcn,kcn->kn', A, A))[:, None, :]
+    return A
+
+
+def triangulate_chunk(P1, P2, x1, x2, method='normal'):
+    """
+    Triangulate one chunk of correspondences
+
+    Args:
+        P1, P2: 3x4 projection matrices
+        x1, x2: Pixel coordinates (N, 2) in the first and second view
+        method: 'normal' (inhomogeneous normal equations) or 'svd' (exact
+            homogeneous solution, slower)
+
+    Returns:
+        float64 array (N, 3) of points
+    """
+    A = _dlt_rows(P1, P2, np.asarray(x1, np.float64), np.asarray(x2, np.float64))
+    if method == 'svd':
+        X = np.linalg.svd(A.transpose(2, 0, 1))[2][:, -1]
+        return X[:, :3] / X[:, 3:]
+    if method != 'normal':
+        raise ValueError(f"Unknown triangulation method: {method}")
+
+    # Normal equations M^T M X = M^T b with M = A[:, :3], b = -A[:, 3];
+    # every entry is a length-N vector, so the whole solve is elementwise
+    m = [[np.einsum('kn,kn->n', A[:, i], A[:, j]) for j in range(3)] for i in range(3)]
+    r = [-np.einsum('kn,kn->n', A[:, i], A[:, 3]) for i in range(3)]
+
+    # Cramer's rule with the symmetric 3x3 matrix m
+    c00 = m[1][1] * m[2][2] - m[1][2] * m[2][1]
+    c01 = m[1][2] * m[2][0] - m[1][0] * m[2][2]
+    c02 = m[1][0] * m[2][1] - m[1][1] * m[2][0]
+    c11 = m[0][0] * m[2][2] - m[0][2] * m[2][0]
+    c12 = m[0][1] * m[2][0] - m[0][0] * m[2][1]
+    c22 = m[0][0] * m[1][1] - m[0][1] * m[1][0]
+    det = m[0][0] * c00 + m[0][1] * c01 + m[0][2] * c02
+    X = np.empty((len(det), 3), dtype=np.float64)
+    X[:, 0] = c00 * r[0] + c01 * r[1] + c02 * r[2]
+    X[:, 1] = c01 * r[0] + c11 * r[1] + c12 * r[2]
+    X[:, 2] = c02 * r[0] + c12 * r[1] + c22 * r[2]
+    X /= det[:, None]
+    return X
+
+
+def triangulate_stream(P1, P2, x1, x2, chunk_size=1 << 18, method='normal'):
+    """
+    Yield triangulated float32 points chunk by chunk
+
+    Args:
+        P1, P2: 3x4 projection matrices
+        x1, x2: Arrays (N, 2) of corresponding pixel coordinates (may be memory-mapped)
+        chunk_size: Correspondences per chunk
+        method: See triangulate_chunk
+    """
+    P1 = np.asarray(P1, dtype=np.float64)
+    P2 = np.asarray(P2, dtype=np.float64)
+    for start in range(0, len(x1), chunk_size):
+        stop = start + chunk_size
+        yield triangulate_chunk(P1, P2, x1[start:stop], x2[start:stop], method).astype(np.float32)
+
+
+def triangulate_points(P1, P2, x1, x2, chunk_size=1 << 18, method='normal'):
+    """
+    Triangulate all correspondences into one float32 (N, 3) array
+    """
+    out = np.empty((len(x1), 3), dtype=np.float32)
+    start = 0
+    for points in triangulate_stream(P1, P2, x1, x2, chunk_size, method):
+        out[start:start + len(points)] = points
+        start += len(points)
+    return out
+
+
+def triangulate_to_file(P1, P2, x1, x2, path, chunk_size=1 << 18, method='normal'):
+    """
+    Triangulate and stream the points to a .ply or .npy file
+
+    Returns:
+        Number of points written
+    """
+    with PointCloudWriter(path) as writer:
+        for points in triangulate_stream(P1, P2, x1, x2, chunk_size, method):
+            writer.write(points)
+    return writer.count
+
+
+def reprojection_error(P, X, x):
+    """
+    Pixel reprojection error of points X (N, 3) observed at x (N, 2) by P
+    """
+    proj = X @ P[:, :3].T + P[:, 3]
+    return np.linalg.norm(proj[:, :2] / proj[:, 2:] - x, axis=1)
+
+
+def benchmark_triangulation(n_points=1_000_000, noise=0.5, seed=0):
+    """
+    Points per second and accuracy of batched DLT vs cv2.triangulatePoints
+
+    Returns:
+        List of dicts with method, points per second and mean 3D error
+    """
+    rng = np.random.default_rng(seed)
+    K = np.array([[1000.0, 0, 640], [0, 1000.0, 360], [0, 0, 1]])
+    R, _ = cv2.Rodrigues(np.array([0.02, -0.1, 0.01]))
+    t = np.array([[-0.5], [0.02], [0.05]])
+    P1 = K @ np.hstack([np.eye(3), np.zeros((3, 1))])
+    P2 = K @ np.hstack([R, t])
+
+    X = np.column_stack([rng.uniform(-4, 4, n_points), rng.uniform(-2, 2, n_points),
+                         rng.uniform(4, 20, n_points)])
+
+    def project(P):
+        p = X @ P[:, :3].T + P[:, 3]
+        return p[:, :2] / p[:, 2:] + rng.normal(0, noise, (n_points, 2))
+
+    x1, x2 = project(P1), project(P2)
+
+    def opencv():
+        Xh = cv2.triangulatePoints(P1, P2, x1.T, x2.T)
+        return (Xh[:3] / Xh[3]).T
+
+    results = []
+    for name, fn in (('cv2.triangulatePoints', opencv),
+                     ('batched DLT (normal equations)', lambda: triangulate_points(P1, P2, x1, x2)),
+                     ('batched DLT (SVD)', lambda: triangulate_points(P1, P2, x1, x2, method='svd'))):
+        t0 = time.perf_counter()
+        est = fn()
+        elapsed = time.perf_counter() - t0
+        results.append({'method': name, 'points_per_s': n_points / elapsed,
+                        'mean_error': float(np.mean(np.linalg.norm(est - X, axis=1))),
+                        'reproj_px': float(np.mean(reprojection_error(P1, est, x1)))})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_triangulation():
+        print(f"{stats['method']:<32} {stats['points_per_s'] / 1e6:6.2f} Mpoints/s  "
+              f"3D error {stats['mean_error']:.4f}  reprojection {stats['reproj_px']:.3f} px")
@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from .gradients import GradientEngine
+
 def apply_sobel(img, ksize=3, dx=1, dy=1):
     """
     Apply Sobel edge detection
@@ -17,17 +19,18 @@ def apply_sobel(img, ksize=3, dx=1, dy=1):
     # Convert to grayscale
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
-    # Apply Sobel
-    sobelx = cv2.Sobel(gray, cv2.CV_64F, dx, 0, ksize=ksize)
-    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, dy, ksize=ksize)
+    # int16 Sobel and float32 magnitude instead of float64 temporaries
+    engine = GradientEngine(ksize)
+    engine.compute(gray, dx, dy)
+    magnitude = engine.magnitude()
     
-    # Compute magnitude
-    magnitude = np.sqrt(sobelx**2 + sobely**2)
-    magnitude = np.uint8(magnitude * 255 / magnitude.max())
+    # Scale to 0-255; a flat image has no gradient and stays black
+    peak = float(magnitude.max())
+    magnitude = cv2.convertScaleAbs(magnitude, alpha=255.0 / peak if peak > 0 else 0.0)
     
     return cv2.cvtColor(magnitude, cv2.COLOR_GRAY2BGR)
 
-def apply_canny(img, threshold1=50, threshold2=150):
+def apply_canny(img, threshold1=50, threshold2=150, engine=None):
     """
     Apply Canny edge detection
     
@@ -35,19 +38,23 @@ def apply_canny(img, threshold1=50, threshold2=150):
         img: Input image (BGR format)
         threshold1: First threshold for the hysteresis procedure
         threshold2: Second threshold for the hysteresis procedure
+        engine: Optional GradientEngine already holding the gradients of img
     
     Returns:
         Edge detected image
     """
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if engine is None:
+        # Convert to grayscale
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        engine = GradientEngine(border=cv2.BORDER_REPLICATE)
+        engine.compute(gray)
     
-    # Apply Canny
-    edges = cv2.Canny(gray, threshold1, threshold2)
+    # Apply Canny to the shared derivatives
+    edges = engine.canny(threshold1, threshold2)
     
     return cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR)
 
-def apply_harris_corner_detection(img, block_size=2, ksize=3, k=0.04, threshold=0.01):
+def apply_harris_corner_detection(img, block_size=2, ksize=3, k=0.04, threshold=0.01, engine=None):
     """
     Apply Harris corner detection
     
@@ -57,15 +64,19 @@ def apply_harris_corner_detection(img, block_size=2, ksize=3, k=0.04, threshold=
         ksize: Aperture parameter for Sobel operator
         k: Harris detector free parameter
         threshold: Threshold for corner detection
+        engine: Optional GradientEngine already holding the gradients of img
     
     Returns:
         Image with detected corners
     """
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if engine is None:
+        # Convert to grayscale
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        engine = GradientEngine(ksize)
+        engine.compute(gray)
     
-    # Apply Harris corner detection
-    corners = cv2.cornerHarris(gray, block_size, ksize, k)
+    # Harris response from the shared structure tensor (as cv2.cornerHarris)
+    corners = engine.harris(block_size, k)
     
     # Dilate to mark the corners
     corners = cv2.dilate(corners, None)
@@ -76,7 +87,42 @@ def apply_harris_corner_detection(img, block_size=2, ksize=3, k=0.04, threshold=
     
     return result
 
-def apply_hough_lines(img, rho=1, theta=np.pi/180, threshold=100, min_line_length=50, max_line_gap=10):
+def apply_shi_tomasi_corners(img, max_corners=200, quality=0.01, min_distance=10, block_size=3, engine=None):
+    """
+    Apply Shi-Tomasi corner detection
+    
+    Args:
+        img: Input image (BGR format)
+        max_corners: Maximum number of corners kept (strongest first)
+        quality: Minimum response relative to the strongest corner
+        min_distance: Radius of the local-maximum test in pixels
+        block_size: Size of neighborhood considered
+        engine: Optional GradientEngine already holding the gradients of img
+    
+    Returns:
+        Image with detected corners
+    """
+    if engine is None:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        engine = GradientEngine()
+        engine.compute(gray)
+    
+    # Smaller structure tensor eigenvalue, kept where it is a local maximum
+    response = engine.min_eigenvalue(block_size)
+    size = 2 * min_distance + 1
+    local_max = cv2.dilate(response, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    ys, xs = np.nonzero((response >= quality * response.max()) & (response >= local_max) & (response > 0))
+    order = np.argsort(response[ys, xs])[::-1][:max_corners]
+    
+    # Create output image
+    result = img.copy()
+    for x, y in zip(xs[order], ys[order]):
+        cv2.circle(result, (int(x), int(y)), 4, (0, 255, 0), 1)
+    
+    return result
+
+def apply_hough_lines(img, rho=1, theta=np.pi/180, threshold=100, min_line_length=50, max_line_gap=10,
+                      canny_low=50, canny_high=150):
     """
     Apply Hough line detection
     
@@ -87,6 +133,8 @@ def apply_hough_lines(img, rho=1, theta=np.pi/180, threshold=100, min_line_lengt
         threshold: Accumulator threshold parameter
         min_line_length: Minimum line length
         max_line_gap: Maximum gap between line segments
+        canny_low: Lower threshold of the Canny edge detector
+        canny_high: Upper threshold of the Canny edge detector
     
     Returns:
         Image with detected lines
@@ -95,7 +143,7 @@ def apply_hough_lines(img, rho=1, theta=np.pi/180, threshold=100, min_line_lengt
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
     # Apply Canny edge detection
-    edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+    edges = cv2.Canny(gray, canny_low, canny_high, apertureSize=3)
     
     # Apply Hough line detection
     lines = cv2.HoughLinesP(edges, rho, theta, threshold, 
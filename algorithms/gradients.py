@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+
+class GradientEngine:
+    """
+    Image gradients computed once and shared by edge and corner detectors
+
+    compute() runs the two Sobel passes into int16 (uint8 input, kernels up
+    to 5) or float32 buffers; magnitude, orientation, the structure tensor
+    behind Harris and Shi-Tomasi, and Canny edges are all derived from those
+    two arrays. Every full-size result goes into a buffer owned by the
+    engine, so processing frames of the same size allocates nothing after
+    the first one. Results are views of the buffers and are overwritten by
+    the next call.
+    """
+
+    def __init__(self, ksize=3, border=cv2.BORDER_REFLECT_101):
+        """
+        Args:
+            ksize: Sobel aperture (1 for [-1, 0, 1], 3, 5 or 7)
+            border: Border mode of the derivative filters. The default
+                matches cv2.Sobel and cv2.cornerHarris; cv2.Canny on an image
+                replicates borders instead, so its edges differ on the
+                outermost pixels unless BORDER_REPLICATE is passed
+        """
+        self.ksize = ksize
+        self.border = border
+        self.gx = None
+        self.gy = None
+        self.input_dtype = None
+        self._float = None
+        self._buffers = {}
+
+    def _buffer(self, name, shape, dtype):
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buf
+        return buf
+
+    def compute(self, gray, dx=1, dy=1):
+        """
+        Horizontal and vertical derivatives of a single-channel image
+
+        Args:
+            gray: uint8 or float32 image
+            dx: Order of the x derivative
+            dy: Order of the y derivative
+
+        Returns:
+            (gx, gy): int16 for uint8 input with ksize <= 5, else float32
+        """
+        exact_int16 = gray.dtype == np.uint8 and self.ksize <= 5 and max(dx, dy) == 1
+        depth, dtype = (cv2.CV_16S, np.int16) if exact_int16 else (cv2.CV_32F, np.float32)
+        self.gx = cv2.Sobel(gray, depth, dx, 0, dst=self._buffer('gx', gray.shape, dtype),
+                            ksize=self.ksize, borderType=self.border)
+        self.gy = cv2.Sobel(gray, depth, 0, dy, dst=self._buffer('gy', gray.shape, dtype),
+                            ksize=self.ksize, borderType=self.border)
+        self.input_dtype = gray.dtype
+        self._float = None
+        return self.gx, self.gy
+
+    def _float_gradients(self):
+        """gx, gy as float32 (the int16 results converted once into buffers)"""
+        if self.gx.dtype == np.float32:
+            return self.gx, self.gy
+        if self._float is None:
+            fx = self._buffer('fx', self.gx.shape, np.float32)
+            fy = self._buffer('fy', self.gy.shape, np.float32)
+            np.copyto(fx, self.gx)
+            np.copyto(fy, self.gy)
+            self._float = (fx, fy)
+        return self._float
+
+    def magnitude(self):
+        """Euclidean gradient magnitude, float32"""
+        fx, fy = self._float_gradients()
+        return cv2.magnitude(fx, fy, self._buffer('magnitude', fx.shape, np.float32))
+
+    def polar(self, degrees=False):
+        """
+        Magnitude and orientation in one pass
+
+        Returns:
+            (magnitude, angle) float32, angle in [0, 2 pi) (or [0, 360))
+        """
+        fx, fy = self._float_gradients()
+        return cv2.cartToPolar(fx, fy, self._buffer('magnitude', fx.shape, np.float32),
+                               self._buffer('angle', fx.shape, np.float32), angleInDegrees=degrees)
+
+    def structure_tensor(self, block_size=3):
+        """
+        Block sums of gx^2, gx gy and gy^2, scaled as cv2.cornerHarris
+
+        Returns:
+            (a, b, c) float32 arrays
+        """
+        fx, fy = self._float_gradients()
+        # cornerHarris / cornerMinEigenVal derivative scale; the 255 is only
+        # applied to uint8 images
+        scale = float((1 << (self.ksize - 1)) * block_size)
+        if self.input_dtype == np.uint8:
+            scale *= 255.0
+        scale = 1.0 / scale
+        scale2 = np.float32(scale * scale)
+        products = (cv2.multiply(fx, fx, self._buffer('a', fx.shape, np.float32), scale=scale2),
+                    cv2.multiply(fx, fy, self._buffer('b', fx.shape, np.float32), scale=scale2),
+                    cv2.multiply(fy, fy, self._buffer('c', fx.shape, np.float32), scale=scale2))
+        return tuple(cv2.boxFilter(p, -1, (block_size, block_size), dst=p, normalize=False,
+                                   borderType=cv2.BORDER_REFLECT_101) for p in products)
+
+    def harris(self, block_size=2, k=0.04):
+        """Harris response det - k trace^2 of the structure tensor, as cv2.cornerHarris"""
+        a, b, c = self.structure_tensor(block_size)
+        trace = cv2.add(a, c, dst=self._buffer('trace', a.shape, np.float32))
+        # det - k trace^2, computed in place in the tensor buffers
+        cv2.multiply(a, c, dst=a)
+        cv2.multiply(b, b, dst=b)
+        cv2.subtract(a, b, dst=a)
+        cv2.multiply(trace, trace, dst=trace, scale=k)
+        return cv2.subtract(a, trace, dst=a)
+
+    def min_eigenvalue(self, block_size=3):
+        """Smaller structure tensor eigenvalue (Shi-Tomasi), as cv2.cornerMinEigenVal"""
+        a, b, c = self.structure_tensor(block_size)
+        half_sum = cv2.addWeighted(a, 0.5, c, 0.5, 0, dst=self._buffer('trace', a.shape, np.float32))
+        # sqrt(((a - c) / 2)^2 + b^2), in place in the tensor buffers
+        cv2.subtract(a, c, dst=a)
+        cv2.magnitude(cv2.multiply(a, 0.5, dst=a), b, c)
+        return cv2.subtract(half_sum, c, dst=a)
+
+    def canny(self, low=50, high=150, l2=False):
+        """
+        Canny edges from the stored derivatives (cv2.Canny on dx, dy)
+
+        Returns:
+            uint8 edge map
+        """
+        gx, gy = self.gx, self.gy
+        if gx.dtype != np.int16:
+            gx = np.clip(np.rint(gx), -32768, 32767).astype(np.int16)
+            gy = np.clip(np.rint(gy), -32768, 32767).astype(np.int16)
+        return cv2.Canny(gx, gy, low, high, edges=self._buffer('edges', gx.shape, np.uint8), L2gradient=l2)
@@ -1,8 +1,18 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 from PIL import Image
 
-def apply_gaussian_blur(img, kernel_size=(5, 5), sigma=1.0):
+# Sigma from which stacked box filters beat cv2.GaussianBlur (12 MP BGR, one core)
+BOX_BLUR_MIN_SIGMA = 8.0
+
+_CV_DEPTHS = {np.dtype(np.uint8): cv2.CV_8U, np.dtype(np.uint16): cv2.CV_16U, np.dtype(np.int16): cv2.CV_16S,
+              np.dtype(np.float32): cv2.CV_32F, np.dtype(np.float64): cv2.CV_64F}
+
+def apply_gaussian_blur(img, kernel_size=(5, 5), sigma=1.0, method='auto'):
     """
     Apply Gaussian blur to the image
     
@@ -10,11 +20,68 @@ def apply_gaussian_blur(img, kernel_size=(5, 5), sigma=1.0):
         img: Input image (BGR format)
         kernel_size: Size of Gaussian kernel (width, height)
         sigma: Standard deviation of Gaussian kernel
+        method: 'opencv' for cv2.GaussianBlur, whose cost grows with sigma,
+            'box' for box_gaussian_blur, whose cost does not, or 'auto' to
+            use 'box' from BOX_BLUR_MIN_SIGMA on unless kernel_size
+            truncates the Gaussian
     
     Returns:
         Blurred image
     """
-    return cv2.GaussianBlur(img, kernel_size, sigma)
+    if method == 'auto':
+        truncated = min(kernel_size) > 0 and min(kernel_size) < 6 * sigma
+        method = 'box' if sigma >= BOX_BLUR_MIN_SIGMA and not truncated else 'opencv'
+    if method == 'opencv':
+        return cv2.GaussianBlur(img, kernel_size, sigma)
+    if method == 'box':
+        return box_gaussian_blur(img, sigma)
+    raise ValueError(f"Unknown Gaussian blur method: {method}")
+
+def box_sizes_for_gaussian(sigma, passes=3):
+    """
+    Odd box widths whose repeated application has variance sigma^2
+    
+    Uses the two widths closest to the ideal one (Kovesi, "Fast almost-
+    Gaussian filtering"), so the variance matches sigma within rounding.
+    
+    Returns:
+        List of passes box widths
+    """
+    ideal = np.sqrt(12 * sigma * sigma / passes + 1)
+    lower = int(ideal)
+    if lower % 2 == 0:
+        lower -= 1
+    n_lower = int(round((12 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes)
+                        / (-4 * lower - 4)))
+    return [lower if i < n_lower else lower + 2 for i in range(passes)]
+
+def box_gaussian_blur(img, sigma, passes=3):
+    """
+    Gaussian blur approximated by repeated box filters
+    
+    Each cv2.boxFilter pass uses running sums, so the cost per pixel is the
+    same for any sigma; three passes give a piecewise-quadratic kernel that
+    stays within 50-60 dB PSNR of cv2.GaussianBlur (see benchmark_gaussian
+    in benchmarks/benchmark_image_processing.py). Intermediate passes are
+    float so uint8 input is rounded only once.
+    
+    Args:
+        img: Input image (uint8, uint16, int16 or float, any channel count)
+        sigma: Standard deviation of the Gaussian
+        passes: Number of box filters (more passes follow the Gaussian tails
+            more closely)
+    
+    Returns:
+        Blurred image, same type as img
+    """
+    depth = _CV_DEPTHS[img.dtype]
+    work = cv2.CV_64F if depth == cv2.CV_64F else cv2.CV_32F
+    widths = box_sizes_for_gaussian(sigma, passes)
+    out = img
+    for i, width in enumerate(widths):
+        out = cv2.boxFilter(out, depth if i == len(widths) - 1 else work, (width, width),
+                            borderType=cv2.BORDER_REFLECT_101)
+    return out
 
 def apply_median_filter(img, kernel_size=5):
     """
@@ -29,7 +96,101 @@ def apply_median_filter(img, kernel_size=5):
     """
     return cv2.medianBlur(img, kernel_size)
 
-def apply_bilateral_filter(img, d=15, sigma_color=75, sigma_space=75):
+def _count_at_least(src, threshold, kernel_size, depth):
+    """Number of pixels >= threshold in every kernel_size window of src"""
+    above = cv2.threshold(src, threshold - 1, 1, cv2.THRESH_BINARY)[1]
+    return cv2.boxFilter(above, depth, (kernel_size, kernel_size), normalize=False)
+
+def _rank_strip(padded, out, kernel_size, target, y0, y1, tile=(128, 512), coarse_width=16):
+    """
+    Rank filter of output rows y0:y1 by two-level threshold search
+    
+    A window's rank value is >= t exactly when at least target of its pixels
+    are >= t. The coarse pass finds the 16-level bin of every output pixel
+    from whole-strip window counts; the fine pass then counts the levels
+    inside each bin, only over the tile area whose pixels fell in that bin.
+    """
+    r = kernel_size // 2
+    w = out.shape[1]
+    depth = cv2.CV_16U if kernel_size * kernel_size < 65536 else cv2.CV_32S
+    src = padded[y0:y1 + 2 * r]
+    dst = out[y0:y1]
+    dst[:] = 0
+    for t in range(coarse_width, 256, coarse_width):
+        count = _count_at_least(src, t, kernel_size, depth)[r:r + y1 - y0, r:r + w]
+        cv2.add(dst, coarse_width, dst=dst, mask=cv2.compare(count, target, cv2.CMP_GE))
+    coarse = dst.copy()
+    th, tw = tile
+    for ty in range(0, y1 - y0, th):
+        for tx in range(0, w, tw):
+            block = coarse[ty:ty + th, tx:tx + tw]
+            for level in np.flatnonzero(np.bincount(block.ravel(), minlength=256)):
+                # Bounding box of the pixels whose rank value lies in this bin
+                inside = block == level
+                rows, cols = np.flatnonzero(inside.any(1)), np.flatnonzero(inside.any(0))
+                ya, yb = ty + rows[0], ty + rows[-1] + 1
+                xa, xb = tx + cols[0], tx + cols[-1] + 1
+                window = src[ya:yb + 2 * r, xa:xb + 2 * r]
+                mask = inside[ya - ty:yb - ty, xa - tx:xb - tx]
+                values = dst[ya:yb, xa:xb]
+                for t in range(level + 1, level + coarse_width):
+                    count = _count_at_least(window, t, kernel_size, depth)[r:r + yb - ya, r:r + xb - xa]
+                    values += (count >= target) & mask
+
+def rank_filter(img, kernel_size=15, percentile=50, strip_height=512, workers=None):
+    """
+    Percentile (rank) filter over square windows with a per-pixel cost
+    independent of the kernel size
+    
+    Threshold decomposition: a window's rank value is >= t exactly when
+    enough of its pixels are >= t, and the window counts of each threshold
+    come from cv2.boxFilter over a binary image. Thresholds are searched
+    first at 16 coarse levels, then at the 16 fine levels of the coarse
+    bins that occur in a tile. Strips of rows are processed in parallel
+    threads. For percentile=50 the result matches cv2.medianBlur, including
+    its replicated border, but cv2.medianBlur is 4-70x faster, so medians
+    should use it; this filter is for the other percentiles, which OpenCV
+    has no filter for.
+    
+    Args:
+        img: Input image (uint8, grayscale or multi-channel)
+        kernel_size: Odd window size
+        percentile: Rank as a percentile of the window (0 = minimum,
+            50 = median, 100 = maximum)
+        strip_height: Rows per parallel strip
+        workers: Thread count for strips (default: CPU count)
+    
+    Returns:
+        Filtered image, same shape as img
+    """
+    if kernel_size % 2 == 0:
+        raise ValueError("kernel_size must be odd")
+    if img.dtype != np.uint8:
+        raise ValueError("rank_filter expects a uint8 image")
+    if img.ndim == 3:
+        return cv2.merge([rank_filter(plane, kernel_size, percentile, strip_height, workers)
+                          for plane in cv2.split(img)])
+    n = kernel_size * kernel_size
+    target = n - int(round(percentile / 100 * (n - 1)))
+    r = kernel_size // 2
+    padded = cv2.copyMakeBorder(img, r, r, r, r, cv2.BORDER_REPLICATE)
+    h = img.shape[0]
+    out = np.empty_like(img)
+    strips = [(y0, min(y0 + strip_height, h)) for y0 in range(0, h, strip_height)]
+    
+    def run(strip):
+        _rank_strip(padded, out, kernel_size, target, *strip)
+    
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(strips) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, strips))
+    else:
+        for strip in strips:
+            run(strip)
+    return out
+
+def apply_bilateral_filter(img, d=15, sigma_color=75, sigma_space=75, method='exact'):
     """
     Apply bilateral filter for edge-preserving smoothing
     
@@ -38,19 +199,166 @@ def apply_bilateral_filter(img, d=15, sigma_color=75, sigma_space=75):
         d: Diameter of each pixel neighborhood
         sigma_color: Filter sigma in the color space
         sigma_space: Filter sigma in the coordinate space
+        method: 'exact' for cv2.bilateralFilter, whose cost grows with d^2;
+            'grid' for the bilateral grid approximation or 'guided' for the
+            guided filter, both with a cost independent of d
     
     Returns:
         Filtered image
     """
-    return cv2.bilateralFilter(img, d, sigma_color, sigma_space)
+    if method == 'exact':
+        return cv2.bilateralFilter(img, d, sigma_color, sigma_space)
+    # Parameters matching cv2.bilateralFilter: its colour distance sums the
+    # three channel differences, about 2.5x the luma difference the fast
+    # modes compare, and its wide-sigma disc of diameter d is narrower than
+    # the Gaussian of the grid or the chained boxes of the guided filter
+    sigma_range = sigma_color / 2.5 if img.ndim == 3 else sigma_color
+    if method == 'grid':
+        return bilateral_grid(img, min(sigma_space, d / 6), sigma_range)
+    if method == 'guided':
+        radius = max(int(round(d / 6)), 1)
+        return guided_filter(img, radius=radius, eps=(sigma_range / 2) ** 2, downscale=max(radius // 2, min(radius, 2)))
+    raise ValueError(f"Unknown bilateral method: {method}")
+
+def _guide_image(img):
+    """Single-channel guide (luma for BGR images)"""
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+def bilateral_grid(img, sigma_space=8.0, sigma_color=30.0, guide=None):
+    """
+    Bilateral filter approximated on a downsampled (y, x, intensity) grid
+    
+    Pixels are splatted into grid cells of sigma_space pixels by sigma_color
+    intensity levels, the grid is blurred with a [1, 4, 6, 4, 1] kernel along
+    all three axes, and every pixel reads its result back by interpolation.
+    The cost is one pass over the image plus work on a grid of about
+    h * w / sigma_space^2 * 256 / sigma_color cells, so it beats the exact
+    filter for wide neighbourhoods (d >= 15 or so) and is slow for narrow
+    ones. Colour images use their luma as the range dimension.
+    
+    Args:
+        img: Input image (BGR or grayscale, uint8)
+        sigma_space: Spatial sigma in pixels
+        sigma_color: Range sigma in intensity levels
+        guide: Optional uint8 single-channel image defining the edges
+            (defaults to the luma of img)
+    
+    Returns:
+        Filtered image, same type as img
+    """
+    guide = _guide_image(img) if guide is None else guide
+    s, r = max(float(sigma_space), 1.0), max(float(sigma_color), 1.0)
+    h, w = guide.shape
+    gh, gw = int((h - 1) / s + 0.5) + 1, int((w - 1) / s + 0.5) + 1
+    gd = int(255 / r + 0.5) + 1
+    # Channel planes of range levels stacked along y, two empty rows apart so
+    # one 2D spatial blur covers all of them: (channels, levels, gh + 2, gw)
+    stride = gh + 2
+    planes = cv2.split(img) if img.ndim == 3 else [img]
+    
+    # Splat: nearest grid cell, values and counts accumulated with bincount
+    gy = (np.arange(h) / s + 0.5).astype(np.intp)
+    gx = (np.arange(w) / s + 0.5).astype(np.intp)
+    gz = (np.arange(256) / r + 0.5).astype(np.intp)
+    cell = ((gz[guide] * stride + gy[:, None]) * gw + gx).ravel()
+    size = gd * stride * gw
+    grid = np.empty((len(planes) + 1, gd * stride, gw), dtype=np.float32)
+    for c, plane in enumerate(planes):
+        grid[c] = np.bincount(cell, weights=plane.ravel(), minlength=size).reshape(-1, gw)
+    grid[-1] = np.bincount(cell, minlength=size).reshape(-1, gw)
+    
+    # Blur with [1, 4, 6, 4, 1] / 16: spatial axes in one cv2 call over the
+    # stacked planes, range axis as weighted sums of whole level slabs
+    kernel = np.array([1, 4, 6, 4, 1], dtype=np.float32) / 16
+    spatial = cv2.sepFilter2D(grid.reshape(-1, gw), -1, kernel, kernel, borderType=cv2.BORDER_CONSTANT)
+    spatial = spatial.reshape(len(planes) + 1, gd, stride, gw)
+    blurred = spatial * np.float32(6 / 16)
+    for shift, weight in ((1, 4 / 16), (2, 1 / 16)):
+        for c in range(len(planes) + 1):
+            for k in range(gd - shift):
+                cv2.scaleAdd(spatial[c, k], weight, blurred[c, k + shift], dst=blurred[c, k + shift])
+                cv2.scaleAdd(spatial[c, k + shift], weight, blurred[c, k], dst=blurred[c, k])
+    
+    # Slice: bilinear remaps of the channel-interleaved grid at the two
+    # nearest range levels and a linear blend between them
+    tiles = cv2.merge([plane.reshape(-1, gw) for plane in blurred])
+    z = guide.astype(np.float32) / np.float32(r)
+    level = np.floor(z)
+    map_x = np.repeat((np.arange(w, dtype=np.float32) / np.float32(s))[None, :], h, axis=0)
+    map_y = (np.arange(h, dtype=np.float32) / np.float32(s))[:, None] + level * stride
+    low = cv2.remap(tiles, *cv2.convertMaps(map_x, map_y, cv2.CV_16SC2), cv2.INTER_LINEAR,
+                    borderMode=cv2.BORDER_CONSTANT)
+    high = cv2.remap(tiles, *cv2.convertMaps(map_x, map_y + stride, cv2.CV_16SC2), cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_CONSTANT)
+    frac = cv2.merge([z - level] * tiles.shape[2])
+    sliced = list(cv2.split(cv2.add(low, cv2.multiply(frac, cv2.subtract(high, low)))))
+    weight = cv2.max(sliced.pop(), 1e-6)
+    out = [cv2.convertScaleAbs(cv2.divide(values, weight)) for values in sliced]
+    return cv2.merge(out) if img.ndim == 3 else out[0]
+
+def guided_filter(img, guide=None, radius=7, eps=75.0 ** 2, downscale=1):
+    """
+    Guided filter (He et al.) built on box filters
+    
+    Every output pixel is a local linear function of the guide, fitted over a
+    (2 * radius + 1)^2 box, so edges of the guide are kept while flat areas are
+    averaged. All box filters are O(1) per pixel. With downscale > 1 the
+    linear coefficients are fitted on a downsampled image and upsampled
+    (fast guided filter).
+    
+    Args:
+        img: Input image (BGR or grayscale)
+        guide: Optional single-channel guide (defaults to the luma of img)
+        radius: Box radius in pixels
+        eps: Regularization; edges with a variance well below eps are smoothed
+            (sigma_color ** 2 plays the role of the bilateral range sigma)
+        downscale: Subsampling factor for the coefficient fit
+    
+    Returns:
+        Filtered image, same type as img
+    """
+    guide = _guide_image(img) if guide is None else guide
+    I = guide.astype(np.float32)
+    p = img.astype(np.float32)
+    h, w = I.shape
+    if downscale > 1:
+        size = (max(w // downscale, 1), max(h // downscale, 1))
+        I_small = cv2.resize(I, size, interpolation=cv2.INTER_AREA)
+        p_small = cv2.resize(p, size, interpolation=cv2.INTER_AREA)
+        r = max(int(round(radius / downscale)), 1)
+    else:
+        I_small, p_small, r = I, p, radius
+    channels = 1 if p.ndim == 2 else p.shape[2]
+    
+    def box(x):
+        return cv2.boxFilter(x, -1, (2 * r + 1, 2 * r + 1), borderType=cv2.BORDER_REFLECT)
+    
+    def per_channel(x):
+        return x if channels == 1 else cv2.merge([x] * channels)
+    
+    # cv2 arithmetic on whole multi-channel images instead of broadcasting numpy
+    mean_I = box(I_small)
+    var_I = cv2.subtract(box(cv2.multiply(I_small, I_small)), cv2.multiply(mean_I, mean_I))
+    I_c, mean_I_c = per_channel(I_small), per_channel(mean_I)
+    mean_p = box(p_small)
+    cov_Ip = cv2.subtract(box(cv2.multiply(I_c, p_small)), cv2.multiply(mean_I_c, mean_p))
+    a = cv2.divide(cov_Ip, per_channel(cv2.add(var_I, float(eps))))
+    b = cv2.subtract(mean_p, cv2.multiply(a, mean_I_c))
+    mean_a, mean_b = box(a), box(b)
+    if downscale > 1:
+        mean_a = cv2.resize(mean_a, (w, h), interpolation=cv2.INTER_LINEAR)
+        mean_b = cv2.resize(mean_b, (w, h), interpolation=cv2.INTER_LINEAR)
+    q = cv2.add(cv2.multiply(mean_a, per_channel(I)), mean_b)
+    return np.clip(q + 0.5, 0, 255).astype(img.dtype).reshape(img.shape)
 
-def apply_sharpening_filter(img, kernel_type='laplacian'):
+def apply_sharpening_filter(img, kernel_type='laplacian', sigma=2.0):
     """
     Apply sharpening filter to enhance image details
     
     Args:
         img: Input image (BGR format)
         kernel_type: Type of sharpening kernel ('laplacian' or 'unsharp')
+        sigma: Blur sigma of the unsharp mask (large values use box blurs)
     
     Returns:
         Sharpened image
@@ -64,19 +372,23 @@ def apply_sharpening_filter(img, kernel_type='laplacian'):
     
     elif kernel_type == 'unsharp':
         # Unsharp masking
-        blurred = cv2.GaussianBlur(img, (0, 0), 2.0)
+        blurred = apply_gaussian_blur(img, (0, 0), sigma)
         sharpened = cv2.addWeighted(img, 1.5, blurred, -0.5, 0)
         return np.clip(sharpened, 0, 255).astype(np.uint8)
     
     else:
         return img
 
-def apply_histogram_equalization(img):
+def apply_histogram_equalization(img, method='global', clip_limit=2.0, tile_grid=(8, 8)):
     """
     Apply histogram equalization to improve contrast
     
     Args:
         img: Input image (BGR format)
+        method: 'global' for one histogram over the image or 'clahe' for
+            contrast limited equalization over a grid of tiles
+        clip_limit: CLAHE contrast limit
+        tile_grid: CLAHE tiles (x, y)
     
     Returns:
         Image with improved contrast
@@ -85,26 +397,42 @@ def apply_histogram_equalization(img):
     img_yuv = cv2.cvtColor(img, cv2.COLOR_BGR2YUV)
     
     # Apply histogram equalization to Y channel
-    img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
+    if method == 'global':
+        img_yuv[:,:,0] = cv2.equalizeHist(img_yuv[:,:,0])
+    elif method == 'clahe':
+        # cv2's CLAHE beats the tiled bincount/remap CLAHE in 1_Image_basics
+        # (86 vs 147 ms on 4000x3000, outputs within 1 level), so stay on it
+        img_yuv[:,:,0] = cv2.createCLAHE(clip_limit, tile_grid).apply(img_yuv[:,:,0])
+    else:
+        raise ValueError(f"Unknown equalization method: {method}")
     
     # Convert back to BGR
     return cv2.cvtColor(img_yuv, cv2.COLOR_YUV2BGR)
 
+@functools.lru_cache(maxsize=16)
+def _gamma_table(gamma, dtype):
+    """Gamma lookup table over every level of a uint8 / uint16 dtype"""
+    top = np.iinfo(dtype).max
+    levels = np.arange(top + 1) / top
+    return (levels ** (1.0 / gamma) * top).astype(dtype)
+
 def apply_gamma_correction(img, gamma=1.0):
     """
     Apply gamma correction to adjust brightness
     
     Args:
-        img: Input image (BGR format)
-        gamma: Gamma value (gamma < 1 brightens, gamma > 1 darkens)
+        img: Input image (BGR format, uint8 or uint16)
+        gamma: Gamma value (output is input ** (1 / gamma): gamma > 1
+            brightens, gamma < 1 darkens)
     
     Returns:
         Gamma-corrected image
     """
-    # Build lookup table
-    invGamma = 1.0 / gamma
-    table = np.array([((i / 255.0) ** invGamma) * 255
-                      for i in np.arange(0, 256)]).astype("uint8")
+    # Lookup table per (gamma, dtype), built with one vectorized power and
+    # kept in a small LRU cache
+    table = _gamma_table(float(gamma), img.dtype)
     
     # Apply gamma correction using lookup table
-    return cv2.LUT(img, table) 
\ No newline at end of file
+    if img.dtype == np.uint8:
+        return cv2.LUT(img, table)
+    return table[img]
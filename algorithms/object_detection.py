@@ -15,7 +15,9 @@ def apply_hog_detection(img):
     hog = cv2.HOGDescriptor()
     hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
     
-    # Detect people
+    # Detect people; detectMultiScale computes the gradients of every pyramid
+    # level internally and cannot take GradientEngine output, unlike the
+    # cell_histograms(gradients=...) path of 6_object_detection/HOG.py
     boxes, weights = hog.detectMultiScale(img, winStride=(8, 8), padding=(4, 4), scale=1.05)
     
     # Draw detection boxes
@@ -1,6 +1,6 @@
 import cv2
 import numpy as np
-from skimage import segmentation, color
+from skimage import segmentation, measure
 
 def apply_thresholding(img, threshold_type='otsu'):
     """
@@ -34,53 +34,319 @@ def apply_thresholding(img, threshold_type='otsu'):
     
     return cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
 
-def apply_watershed(img, markers_count=10):
+def find_distance_peaks(dist, max_peaks=None, min_distance=5, threshold_abs=1.0):
     """
-    Apply watershed segmentation
+    Local maxima of a distance transform, strongest first
+    
+    A pixel is a peak when it equals the maximum of its (2 * min_distance + 1)
+    box and is at least threshold_abs; every flat plateau of peak pixels
+    contributes a single peak.
     
     Args:
-        img: Input image (BGR format)
-        markers_count: Number of markers for watershed
+        dist: Distance transform (float32)
+        max_peaks: Keep only the strongest max_peaks peaks (None = all)
+        min_distance: Half-size of the local-maximum window in pixels
+        threshold_abs: Minimum distance value of a peak
     
     Returns:
-        Watershed segmented image
+        (K, 2) int array of (y, x) peak coordinates sorted by decreasing distance
     """
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    size = 2 * min_distance + 1
+    local_max = cv2.dilate(dist, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    peaks = ((dist == local_max) & (dist >= threshold_abs)).view(np.uint8)
+    n, plateaus = cv2.connectedComponents(peaks, connectivity=8)
+    ys, xs = np.nonzero(peaks)
+    # First pixel of every plateau in raster order
+    _, first = np.unique(plateaus[ys, xs], return_index=True)
+    ys, xs = ys[first], xs[first]
+    values = dist[ys, xs]
+    order = np.argsort(-values, kind='stable')
+    if max_peaks is not None and max_peaks < order.size:
+        order = order[:max_peaks]
+    return np.stack([ys[order], xs[order]], axis=1)
+
+def region_statistics(labels, intensity):
+    """
+    Per-region area, centroid, bounding box and mean intensity
     
-    # Apply threshold to get binary image
-    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    Only labelled pixels are visited: their raster indices give row and column
+    directly, sums come from one np.bincount per quantity and extents from
+    np.minimum.at/np.maximum.at, so the cost does not depend on the number of
+    regions.
     
-    # Noise removal
-    kernel = np.ones((3, 3), np.uint8)
-    opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
+    Args:
+        labels: int32 label map, 0 = background
+        intensity: Grayscale image of the same size
+    
+    Returns:
+        Dict of arrays with one entry per non-empty region: 'label', 'area',
+        'centroid' (y, x), 'bbox' (y0, x0, y1, x1, end-exclusive) and 'mean_intensity'
+    """
+    w = labels.shape[1]
+    index = np.flatnonzero(labels)
+    label = labels.ravel()[index].astype(np.intp)
+    y, x = np.divmod(index, w)
+    n = int(label.max()) + 1 if label.size else 1
+
+    area = np.bincount(label, minlength=n)
+    sum_y = np.bincount(label, weights=y, minlength=n)
+    sum_x = np.bincount(label, weights=x, minlength=n)
+    sum_i = np.bincount(label, weights=intensity.ravel()[index], minlength=n)
+    y0, y1 = np.full(n, labels.shape[0], dtype=np.intp), np.zeros(n, dtype=np.intp)
+    x0, x1 = np.full(n, w, dtype=np.intp), np.zeros(n, dtype=np.intp)
+    np.minimum.at(y0, label, y)
+    np.maximum.at(y1, label, y)
+    np.minimum.at(x0, label, x)
+    np.maximum.at(x1, label, x)
+
+    present = np.flatnonzero(area)
+    count = area[present]
+    return {
+        'label': present.astype(np.int32),
+        'area': count,
+        'centroid': np.stack([sum_y[present] / count, sum_x[present] / count], axis=1),
+        'bbox': np.stack([y0[present], x0[present], y1[present] + 1, x1[present] + 1], axis=1).astype(np.int32),
+        'mean_intensity': sum_i[present] / count,
+    }
+
+def watershed_regions(img, markers_count=None, min_distance=5, downscale=1):
+    """
+    Marker-controlled watershed of dark blobs returning labels and region statistics
     
-    # Sure background area
-    sure_bg = cv2.dilate(opening, kernel, iterations=3)
+    Markers are the strongest distance-transform peaks of the Otsu foreground,
+    one per region, and skimage's watershed floods the inverted distance
+    transform from them so touching blobs split along their neck.
     
-    # Finding sure foreground area
-    dist_transform = cv2.distanceTransform(opening, cv2.DIST_L2, 5)
-    _, sure_fg = cv2.threshold(dist_transform, 0.7 * dist_transform.max(), 255, 0)
-    sure_fg = np.uint8(sure_fg)
+    Args:
+        img: Input image (BGR format)
+        markers_count: Marker budget, the strongest peaks are kept (None = all)
+        min_distance: Minimum separation between markers in pixels
+        downscale: Compute the distance transform, peaks and flooding on a mask
+            this many times smaller and upsample the labels
+    
+    Returns:
+        (labels, stats): int32 label map (0 = background, boundaries included)
+        and the region_statistics dict
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = np.ones((3, 3), np.uint8)
+    foreground = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
+
+    mask = foreground
+    if downscale > 1:
+        mask = cv2.resize(foreground, (max(1, w // downscale), max(1, h // downscale)),
+                          interpolation=cv2.INTER_AREA)
+        mask = (mask > 127).view(np.uint8)
+    dist = cv2.distanceTransform(mask, cv2.DIST_L2, 5)
+    peaks = find_distance_peaks(dist, markers_count, max(1, min_distance // downscale))
+
+    markers = np.zeros(dist.shape, dtype=np.int32)
+    markers[peaks[:, 0], peaks[:, 1]] = np.arange(1, len(peaks) + 1, dtype=np.int32)
+    # cv2.watershed floods by neighbour colour differences, not by level, and
+    # does not split blobs on the inverted distance; skimage floods by level
+    labels = segmentation.watershed(-dist, markers, mask=mask > 0, watershed_line=True)
+    labels = labels.astype(np.int32, copy=False)
+    if downscale > 1:
+        labels = cv2.resize(labels, (w, h), interpolation=cv2.INTER_NEAREST)
+        labels[foreground == 0] = 0
+    return labels, region_statistics(labels, gray)
+
+def apply_watershed(img, markers_count=10):
+    """
+    Apply watershed segmentation
     
-    # Finding unknown region
-    unknown = cv2.subtract(sure_bg, sure_fg)
+    Args:
+        img: Input image (BGR format)
+        markers_count: Number of markers for watershed (strongest distance peaks)
     
-    # Marker labelling
-    _, markers = cv2.connectedComponents(sure_fg)
-    markers = markers + 1
-    markers[unknown == 255] = 0
+    Returns:
+        Watershed segmented image
+    """
+    labels, _ = watershed_regions(img, markers_count)
     
-    # Apply watershed
-    markers = cv2.watershed(img, markers)
+    # Region boundaries: label changes to the right or below
+    boundaries = np.zeros(labels.shape, dtype=bool)
+    boundaries[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    boundaries[1:] |= labels[1:] != labels[:-1]
     
     # Create result image
     result = img.copy()
-    result[markers == -1] = [255, 0, 0]  # Mark watershed boundaries in blue
+    result[boundaries] = [255, 0, 0]  # Mark watershed boundaries in blue
     
     return result
 
-def apply_slic_segmentation(img, n_segments=100, compactness=10):
+def paint_segment_means(img, labels):
+    """
+    Paint every segment with its mean colour
+    
+    Args:
+        img: Input image (H x W x C)
+        labels: Integer label map (H x W), labels >= 0
+    
+    Returns:
+        uint8 image of the same shape as img
+    """
+    flat = labels.ravel()
+    counts = np.bincount(flat)
+    n = counts.size
+    pixels = img.reshape(-1, img.shape[2])
+    means = np.empty((n, img.shape[2]), dtype=np.float32)
+    for c in range(img.shape[2]):
+        means[:, c] = np.bincount(flat, weights=pixels[:, c], minlength=n)
+    means /= np.maximum(counts, 1)[:, None]
+    lut = np.clip(means + 0.5, 0, 255).astype(np.uint8)
+    return lut[labels]
+
+def _merge_small_fragments(labels, min_size, rounds=4):
+    """Give connected fragments smaller than min_size the label of an adjacent larger fragment"""
+    fragments = measure.label(labels, connectivity=1, background=-1)
+    n = fragments.max() + 1
+    pixel_count = np.bincount(fragments.ravel(), minlength=n)
+    fragment_label = np.zeros(n, dtype=labels.dtype)
+    fragment_label[fragments.ravel()] = labels.ravel()
+
+    # Unique fragment adjacencies in both directions
+    a = np.concatenate([fragments[:, :-1].ravel(), fragments[:-1].ravel()])
+    b = np.concatenate([fragments[:, 1:].ravel(), fragments[1:].ravel()])
+    boundary = a != b
+    a, b = a[boundary], b[boundary]
+    pairs = np.unique(np.concatenate([a * n + b, b * n + a]))
+    a, b = pairs // n, pairs % n
+
+    root = np.arange(n)
+    for _ in range(rounds):
+        sizes = np.bincount(root, weights=pixel_count, minlength=n)
+        root_a, root_b = root[a], root[b]
+        take = (sizes[root_a] < min_size) & (sizes[root_b] >= min_size)
+        if not take.any():
+            break
+        # Only small roots move and only onto large ones, so no chains form
+        dest = np.arange(n)
+        dest[root_a[take]] = root_b[take]
+        root = dest[root]
+    return fragment_label[root][fragments]
+
+def slic_superpixels(img, n_segments=100, compactness=10, max_iter=10, centers=None, tol=0.25,
+                     enforce_connectivity=True):
+    """
+    SLIC superpixels on a regular grid of cluster cells
+    
+    SLIC searches a 2S x 2S window around every center, so a pixel in one
+    quadrant of its grid cell can only be claimed by its own cell and the three
+    neighbours on that side. The image is split into half-cell quadrant blocks
+    and each block is compared with its four candidate centers by broadcast
+    float32 operations, instead of scanning a window per cluster.
+    
+    Args:
+        img: Input image (BGR format)
+        n_segments: Approximate number of superpixels
+        compactness: Weight of spatial against Lab colour distance
+        max_iter: Maximum number of assignment/update iterations
+        centers: Cluster centers (grid_h x grid_w x 5, Lab + y, x) returned for a
+            previous frame of the same size; warm-starts the iteration
+        tol: Stop when centers move less than this many pixels on average
+        enforce_connectivity: Merge fragments smaller than half a cell into a neighbour
+    
+    Returns:
+        (labels, centers): int32 label map and the final cluster centers
+    """
+    h, w = img.shape[:2]
+    step = np.sqrt(h * w / n_segments)
+    grid_h, grid_w = max(1, int(round(h / step))), max(1, int(round(w / step)))
+    half_h, half_w = -(-h // (2 * grid_h)), -(-w // (2 * grid_w))
+    cell_h, cell_w = 2 * half_h, 2 * half_w
+    # 8-bit Lab conversion rescaled to L in [0, 100], a and b centred on 0
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2Lab).astype(np.float32)
+    lab -= np.float32([0, 128, 128])
+    lab *= np.float32([100 / 255, 1, 1])
+    flat_lab = lab.reshape(-1, 3)
+    lab = cv2.copyMakeBorder(lab, 0, grid_h * cell_h - h, 0, grid_w * cell_w - w, cv2.BORDER_REPLICATE)
+    blocks = lab.reshape(grid_h, 2, half_h, grid_w, 2, half_w, 3)
+    ys = np.arange(grid_h * cell_h, dtype=np.float32).reshape(grid_h, 2, half_h, 1, 1)
+    xs = np.arange(grid_w * cell_w, dtype=np.float32).reshape(1, 1, grid_w, 2, half_w)
+    spatial_weight = np.float32((compactness / step) ** 2)
+
+    if centers is None or centers.shape[:2] != (grid_h, grid_w):
+        centers = np.empty((grid_h, grid_w, 5), dtype=np.float32)
+        centers[..., 3] = np.minimum((np.arange(grid_h)[:, None] + 0.5) * cell_h, h - 1)
+        centers[..., 4] = np.minimum((np.arange(grid_w)[None, :] + 0.5) * cell_w, w - 1)
+        centers[..., :3] = lab[centers[..., 3].astype(int), centers[..., 4].astype(int)]
+    centers = np.minimum(centers.astype(np.float32), [np.inf, np.inf, np.inf, h - 1, w - 1])
+
+    # Contiguous Lab planes per quadrant, each (grid_h, half_h, grid_w, half_w)
+    quadrants = {(qy, qx): [np.ascontiguousarray(blocks[:, qy, :, :, qx, :, c]) for c in range(3)]
+                 for qy in (0, 1) for qx in (0, 1)}
+    cell_label = (np.arange(grid_h)[:, None, None, None] * grid_w
+                  + np.arange(grid_w)[None, None, :, None]).astype(np.int32)
+    flat_y = np.repeat(np.arange(h, dtype=np.float32), w)
+    flat_x = np.tile(np.arange(w, dtype=np.float32), h)
+    shape = (grid_h, half_h, grid_w, half_w)
+    best, dist, term = (np.empty(shape, dtype=np.float32) for _ in range(3))
+    better = np.empty(shape, dtype=bool)
+    choice = np.empty(shape, dtype=np.uint8)
+    labels = np.empty((grid_h, 2, half_h, grid_w, 2, half_w), dtype=np.int32)
+
+    for _ in range(max_iter):
+        # Out-of-grid neighbours sit infinitely far away
+        padded = np.full((grid_h + 2, grid_w + 2, 5), np.float32(1e9))
+        padded[1:-1, 1:-1] = centers
+        for (qy, qx), planes in quadrants.items():
+            offsets = np.array([(dy, dx) for dy in (0, 2 * qy - 1) for dx in (0, 2 * qx - 1)])
+            label_step = (offsets[:, 0] * grid_w + offsets[:, 1]).astype(np.int32)
+            qys, qxs = ys[:, qy], xs[:, :, :, qx]
+            best.fill(np.inf)
+            for o, (dy, dx) in enumerate(offsets):
+                c = padded[1 + dy:1 + dy + grid_h, 1 + dx:1 + dx + grid_w][:, None, :, None]
+                # |p - c|^2 without the per-pixel |p|^2, which does not change the argmin
+                row_term = np.square(c[..., :3]).sum(axis=-1) + spatial_weight * (c[..., 3] - 2 * qys) * c[..., 3]
+                col_term = spatial_weight * (c[..., 4] - 2 * qxs) * c[..., 4]
+                np.add(row_term, col_term, out=dist)
+                for plane, value in zip(planes, (c[..., 0], c[..., 1], c[..., 2])):
+                    np.multiply(plane, 2 * value, out=term)
+                    dist -= term
+                np.less(dist, best, out=better)
+                np.copyto(best, dist, where=better)
+                np.copyto(choice, o, where=better)
+            np.add(cell_label, label_step[choice], out=labels[:, qy, :, :, qx, :])
+        flat = labels.reshape(grid_h * cell_h, grid_w * cell_w)[:h, :w].ravel()
+
+        counts = np.bincount(flat, minlength=grid_h * grid_w)
+        updated = np.empty((grid_h * grid_w, 5), dtype=np.float32)
+        for c, values in enumerate((flat_lab[:, 0], flat_lab[:, 1], flat_lab[:, 2], flat_y, flat_x)):
+            updated[:, c] = np.bincount(flat, weights=values, minlength=grid_h * grid_w)
+        empty = counts == 0
+        updated /= np.maximum(counts, 1)[:, None]
+        updated[empty] = centers.reshape(-1, 5)[empty]
+        shift = np.hypot(*(updated[:, 3:] - centers.reshape(-1, 5)[:, 3:]).T).mean()
+        centers = updated.reshape(grid_h, grid_w, 5)
+        if shift < tol:
+            break
+
+    labels = flat.reshape(h, w)
+    if enforce_connectivity:
+        labels = _merge_small_fragments(labels, max(1, cell_h * cell_w // 2))
+    return labels, centers
+
+def _slic_labels(img, n_segments, compactness, method, downscale, max_iter=10, centers=None):
+    """SLIC labels at full resolution, optionally computed on a downscaled copy"""
+    h, w = img.shape[:2]
+    small = img
+    if downscale > 1:
+        small = cv2.resize(img, (max(1, round(w / downscale)), max(1, round(h / downscale))),
+                           interpolation=cv2.INTER_AREA)
+    if method == 'skimage':
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        labels = segmentation.slic(rgb, n_segments=n_segments, compactness=compactness,
+                                   max_num_iter=max_iter).astype(np.int32)
+    else:
+        labels, centers = slic_superpixels(small, n_segments, compactness, max_iter, centers)
+    if downscale > 1:
+        labels = cv2.resize(labels, (w, h), interpolation=cv2.INTER_NEAREST)
+    return labels, centers
+
+def apply_slic_segmentation(img, n_segments=100, compactness=10, method='skimage', downscale=1):
     """
     Apply SLIC (Simple Linear Iterative Clustering) superpixel segmentation
     
@@ -88,20 +354,34 @@ def apply_slic_segmentation(img, n_segments=100, compactness=10):
         img: Input image (BGR format)
         n_segments: Number of segments
         compactness: Compactness parameter
+        method: 'skimage' for skimage.segmentation.slic or 'fast' for the
+            grid-cell implementation in slic_superpixels
+        downscale: Compute superpixels on an image this many times smaller and
+            upsample the labels (1 = full resolution)
     
     Returns:
-        SLIC segmented image
+        SLIC segmented image, every superpixel painted with its mean colour
     """
-    # Convert BGR to RGB
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Apply SLIC
-    segments = segmentation.slic(img_rgb, n_segments=n_segments, compactness=compactness)
-    
-    # Create segmented image
-    segmented = color.label2rgb(segments, img_rgb, kind='avg')
+    labels, _ = _slic_labels(img, n_segments, compactness, method, downscale)
+    return paint_segment_means(img, labels)
+
+def apply_slic_video(frames, n_segments=100, compactness=10, downscale=1, warm_iter=3):
+    """
+    SLIC superpixels over a frame sequence, warm-starting each frame's
+    cluster centers from the previous frame
     
-    # Convert back to BGR
-    result = cv2.cvtColor(segmented, cv2.COLOR_RGB2BGR)
+    Args:
+        frames: Iterable of same-size BGR frames
+        n_segments: Number of segments
+        compactness: Compactness parameter
+        downscale: Compute superpixels on frames this many times smaller
+        warm_iter: Iterations for every frame after the first (the first runs 10)
     
-    return result 
\ No newline at end of file
+    Yields:
+        SLIC segmented frames
+    """
+    centers = None
+    for frame in frames:
+        labels, centers = _slic_labels(frame, n_segments, compactness, 'fast', downscale,
+                                       max_iter=10 if centers is None else warm_iter, centers=centers)
+        yield paint_segment_means(frame, labels)
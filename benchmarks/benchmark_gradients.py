@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for algorithms.gradients: separate cv2 calls against one shared
+GradientEngine feeding Sobel, Harris, Shi-Tomasi and Canny.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# Add the repository root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from algorithms.gradients import GradientEngine
+
+
+def _sobel_magnitude_float64(gray, ksize=3):
+    """Reference: the previous apply_sobel body (float64 Sobel, numpy magnitude)"""
+    sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=ksize)
+    sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=ksize)
+    magnitude = np.sqrt(sobelx**2 + sobely**2)
+    return np.uint8(magnitude * 255 / magnitude.max())
+
+
+def make_synthetic_frame(size=(3840, 2160), n_shapes=80, noise=6, seed=0):
+    """Grayscale frame with filled rectangles and discs plus noise"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.full((h, w), 90, dtype=np.uint8)
+    for _ in range(n_shapes):
+        x, y = int(rng.integers(0, w)), int(rng.integers(0, h))
+        r = int(rng.integers(w // 100, w // 15))
+        value = int(rng.integers(0, 256))
+        if rng.random() < 0.5:
+            cv2.rectangle(img, (x - r, y - r), (x + r, y + r), value, -1)
+        else:
+            cv2.circle(img, (x, y), r, value, -1)
+    noise_img = rng.normal(0, noise, img.shape).astype(np.float32)
+    return cv2.convertScaleAbs(cv2.add(img.astype(np.float32), noise_img))
+
+
+def benchmark_gradients(size=(3840, 2160), repeats=3):
+    """
+    Separate cv2 calls (each computing its own gradients, apply_sobel's old
+    float64 path) against one GradientEngine feeding all consumers, on a 4K
+    frame
+
+    Returns:
+        List of dicts with method, milliseconds per frame, peak memory
+        allocated while processing frames after one warm-up frame (traced
+        numpy allocations, in MB), and the largest differences from the cv2
+        results
+    """
+    gray = make_synthetic_frame(size)
+
+    def separate():
+        magnitude = _sobel_magnitude_float64(gray)
+        harris = cv2.cornerHarris(gray, 2, 3, 0.04)
+        eig = cv2.cornerMinEigenVal(gray, 3, 3)
+        edges = cv2.Canny(gray, 50, 150)
+        return magnitude, harris, eig, edges
+
+    engine = GradientEngine()
+
+    def shared():
+        engine.compute(gray)
+        magnitude = engine.magnitude()
+        peak = float(magnitude.max())
+        magnitude = cv2.convertScaleAbs(magnitude, alpha=255.0 / peak if peak > 0 else 0.0)
+        harris = engine.harris(2, 0.04).copy()
+        eig = engine.min_eigenvalue(3).copy()
+        edges = engine.canny(50, 150)
+        return magnitude, harris, eig, edges
+
+    results = []
+    outputs = {}
+    for name, fn in (('separate cv2 calls', separate), ('shared engine', shared)):
+        fn()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            outputs[name] = fn()
+        elapsed = (time.perf_counter() - t0) / repeats
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({'method': name, 'ms': 1e3 * elapsed, 'peak_mb': peak / 2**20})
+
+    ref, ours = outputs['separate cv2 calls'], outputs['shared engine']
+    results[-1]['errors'] = {
+        'sobel magnitude (levels)': int(cv2.absdiff(ref[0], ours[0]).max()),
+        'harris (relative)': float(np.abs(ref[1] - ours[1]).max() / np.abs(ref[1]).max()),
+        'min eigenvalue (relative)': float(np.abs(ref[2] - ours[2]).max() / np.abs(ref[2]).max()),
+        'canny (differing pixels)': int(np.count_nonzero(ref[3] != ours[3])),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_gradients():
+        print(f"{stats['method']:<20} {stats['ms']:8.1f} ms  peak {stats['peak_mb']:7.1f} MB")
+        for name, value in stats.get('errors', {}).items():
+            print(f"    max |difference| {name:<26} {value:.3g}")
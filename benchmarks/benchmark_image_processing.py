@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for algorithms.image_processing: bilateral grid and guided
+filter modes, rank filter medians and stacked-box Gaussian blur.
+"""
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Add the repository root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from algorithms.image_processing import (apply_bilateral_filter, apply_median_filter, box_gaussian_blur,
+                                       rank_filter)
+
+
+def make_synthetic_photo(size=(4000, 3000), n_shapes=60, noise=12, seed=0):
+    """
+    Colour gradients with sharp-edged discs plus Gaussian noise
+
+    Returns:
+        BGR uint8 image
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.empty((h, w, 3), dtype=np.float32)
+    img[..., 0] = np.linspace(0, 200, w, dtype=np.float32)[None, :]
+    img[..., 1] = np.linspace(0, 180, h, dtype=np.float32)[:, None]
+    img[..., 2] = 100
+    for _ in range(n_shapes):
+        center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        color = tuple(float(v) for v in rng.uniform(0, 255, 3))
+        cv2.circle(img, center, int(rng.integers(w // 200, w // 10)), color, -1)
+    img += rng.normal(0, noise, img.shape).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def benchmark_bilateral(size=(4000, 3000), diameters=(9, 15, 25, 41)):
+    """
+    Exact, bilateral grid and guided filter modes of apply_bilateral_filter
+    across neighbourhood diameters, with PSNR against the exact filter
+
+    Returns:
+        List of dicts with diameter, method, milliseconds and PSNR in dB
+    """
+    img = make_synthetic_photo(size)
+    results = []
+    for d in diameters:
+        t0 = time.perf_counter()
+        exact = apply_bilateral_filter(img, d)
+        results.append({'d': d, 'method': 'exact', 'ms': 1e3 * (time.perf_counter() - t0),
+                        'psnr': cv2.PSNR(exact, img)})
+        for method in ('grid', 'guided'):
+            t0 = time.perf_counter()
+            out = apply_bilateral_filter(img, d, method=method)
+            results.append({'d': d, 'method': method, 'ms': 1e3 * (time.perf_counter() - t0),
+                            'psnr': cv2.PSNR(exact, out)})
+    return results
+
+
+def benchmark_median(size=(4000, 3000), kernel_sizes=(5, 9, 15, 31, 51), percentile=25):
+    """
+    cv2.medianBlur against rank_filter across kernel sizes on the luma of
+    make_synthetic_photo, plus a non-median percentile OpenCV has no filter for
+
+    Returns:
+        List of dicts with kernel size, method, milliseconds and whether the
+        result equals cv2.medianBlur (None where there is no reference)
+    """
+    img = cv2.cvtColor(make_synthetic_photo(size), cv2.COLOR_BGR2GRAY)
+    results = []
+    for k in kernel_sizes:
+        t0 = time.perf_counter()
+        reference = apply_median_filter(img, k)
+        results.append({'kernel': k, 'method': 'opencv', 'ms': 1e3 * (time.perf_counter() - t0), 'exact': True})
+        t0 = time.perf_counter()
+        out = rank_filter(img, k, 50)
+        results.append({'kernel': k, 'method': 'rank p50', 'ms': 1e3 * (time.perf_counter() - t0),
+                        'exact': bool(np.array_equal(out, reference))})
+        t0 = time.perf_counter()
+        rank_filter(img, k, percentile)
+        results.append({'kernel': k, 'method': f'p{percentile}', 'ms': 1e3 * (time.perf_counter() - t0), 'exact': None})
+    return results
+
+
+def benchmark_gaussian(size=(4000, 3000), sigmas=(2, 4, 8, 15, 30, 100), passes=(3, 4)):
+    """
+    cv2.GaussianBlur against box_gaussian_blur across sigmas on a BGR photo
+
+    Returns:
+        List of dicts with sigma, method, milliseconds, and PSNR and largest
+        absolute difference against cv2.GaussianBlur
+    """
+    img = make_synthetic_photo(size)
+    results = []
+    for sigma in sigmas:
+        t0 = time.perf_counter()
+        reference = cv2.GaussianBlur(img, (0, 0), sigma)
+        results.append({'sigma': sigma, 'method': 'opencv', 'ms': 1e3 * (time.perf_counter() - t0),
+                        'psnr': float('inf'), 'max_error': 0})
+        for n in passes:
+            t0 = time.perf_counter()
+            out = box_gaussian_blur(img, sigma, n)
+            elapsed = time.perf_counter() - t0
+            results.append({'sigma': sigma, 'method': f'box x{n}', 'ms': 1e3 * elapsed,
+                            'psnr': cv2.PSNR(reference, out),
+                            'max_error': int(cv2.absdiff(reference, out).max())})
+    return results
+
+
+if __name__ == "__main__":
+    for stats in benchmark_gaussian():
+        print(f"sigma={stats['sigma']:<4} {stats['method']:<7} {stats['ms']:9.1f} ms  "
+              f"{stats['psnr']:6.2f} dB  max |diff| {stats['max_error']}")
+    for stats in benchmark_median():
+        print(f"k={stats['kernel']:<3} {stats['method']:<9} {stats['ms']:9.1f} ms  matches cv2: {stats['exact']}")
+    print("PSNR of 'exact' is against the unfiltered input")
+    for stats in benchmark_bilateral():
+        print(f"d={stats['d']:<3} {stats['method']:<7} {stats['ms']:9.1f} ms  {stats['psnr']:6.2f} dB")
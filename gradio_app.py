@@ -12,7 +12,7 @@ from algorithms.image_processing import (
     apply_sharpening_filter, apply_histogram_equalization, apply_gamma_correction
 )
 from algorithms.edge_detection import (
-    apply_sobel, apply_canny, apply_harris_corner_detection,
+    apply_sobel, apply_canny, apply_harris_corner_detection, apply_shi_tomasi_corners,
     apply_hough_lines, apply_hough_circles
 )
 from algorithms.feature_detection import (
@@ -69,6 +69,10 @@ def process_image_processing(img, algorithm):
         return apply_median_filter(img)
     elif algorithm == "Bilateral Filter":
         return apply_bilateral_filter(img)
+    elif algorithm == "Bilateral Grid":
+        return apply_bilateral_filter(img, method='grid')
+    elif algorithm == "Guided Filter":
+        return apply_bilateral_filter(img, method='guided')
     elif algorithm == "Sharpening":
         return apply_sharpening_filter(img)
     elif algorithm == "Histogram Equalization":
@@ -86,6 +90,8 @@ def process_edge_detection(img, algorithm):
         return apply_canny(img)
     elif algorithm == "Harris Corner":
         return apply_harris_corner_detection(img)
+    elif algorithm == "Shi-Tomasi Corner":
+        return apply_shi_tomasi_corners(img)
     elif algorithm == "Hough Lines":
         return apply_hough_lines(img)
     elif algorithm == "Hough Circles":
@@ -152,7 +158,7 @@ def create_interface():
                 
                 # Algorithm selection based on type
                 algorithm_params = gr.Dropdown(
-                    choices=["Gaussian Blur", "Median Filter", "Bilateral Filter", "Sharpening", "Histogram Equalization", "Gamma Correction"],
+                    choices=["Gaussian Blur", "Median Filter", "Bilateral Filter", "Bilateral Grid", "Guided Filter", "Sharpening", "Histogram Equalization", "Gamma Correction"],
                     label="Algorithm",
                     value="Gaussian Blur"
                 )
@@ -170,9 +176,9 @@ def create_interface():
         # Update algorithm choices based on type
         def update_algorithm_choices(algorithm_type):
             if algorithm_type == "Image Processing":
-                return gr.Dropdown(choices=["Gaussian Blur", "Median Filter", "Bilateral Filter", "Sharpening", "Histogram Equalization", "Gamma Correction"])
+                return gr.Dropdown(choices=["Gaussian Blur", "Median Filter", "Bilateral Filter", "Bilateral Grid", "Guided Filter", "Sharpening", "Histogram Equalization", "Gamma Correction"])
             elif algorithm_type == "Edge Detection":
-                return gr.Dropdown(choices=["Sobel", "Canny", "Harris Corner", "Hough Lines", "Hough Circles"])
+                return gr.Dropdown(choices=["Sobel", "Canny", "Harris Corner", "Shi-Tomasi Corner", "Hough Lines", "Hough Circles"])
             elif algorithm_type == "Feature Detection":
                 return gr.Dropdown(choices=["SIFT", "SURF", "ORB", "BRIEF"])
             elif algorithm_type == "Segmentation":
@@ -215,6 +221,7 @@ def create_interface():
         - Gaussian Blur: Smooths image using Gaussian kernel
         - Median Filter: Removes salt-and-pepper noise
         - Bilateral Filter: Edge-preserving smoothing
+        - Bilateral Grid / Guided Filter: Fast edge-preserving smoothing, cost independent of radius
         - Sharpening: Enhances image details
         - Histogram Equalization: Improves contrast
         - Gamma Correction: Adjusts brightness
@@ -223,6 +230,7 @@ def create_interface():
         - Sobel: Gradient-based edge detection
         - Canny: Multi-stage edge detection
         - Harris Corner: Corner detection
+        - Shi-Tomasi Corner: Corners by the smaller structure tensor eigenvalue
         - Hough Lines: Line detection
         - Hough Circles: Circle detection
         
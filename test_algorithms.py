@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Behavioural checks for the algorithm modes wired into the Gradio apps
+
+Runs under pytest or directly: python test_algorithms.py
+"""
+
+import sys
+import os
+
+import cv2
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from algorithms.image_processing import (apply_bilateral_filter, apply_gaussian_blur, box_gaussian_blur,
+                                         apply_histogram_equalization, BOX_BLUR_MIN_SIGMA)
+from algorithms.edge_detection import apply_sobel, apply_canny
+from algorithms.gradients import GradientEngine
+from algorithms.segmentation import (slic_superpixels, apply_slic_segmentation, watershed_regions,
+                                     apply_watershed)
+
+
+def make_noisy_step(seed=0):
+    """BGR step edge (60 | 190) with Gaussian noise, and the clean image"""
+    rng = np.random.default_rng(seed)
+    clean = np.full((120, 160, 3), 60, dtype=np.uint8)
+    clean[:, 80:] = 190
+    noisy = np.clip(clean + rng.normal(0, 10, clean.shape), 0, 255).astype(np.uint8)
+    return noisy, clean
+
+
+def make_photo(size=(240, 180), seed=0):
+    """Smooth random BGR texture"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    return cv2.GaussianBlur(rng.integers(0, 256, (h, w, 3), dtype=np.uint8), (0, 0), 3)
+
+
+def test_bilateral_fast_modes():
+    """'grid' and 'guided' denoise like cv2.bilateralFilter and keep the edge"""
+    noisy, clean = make_noisy_step()
+    exact = apply_bilateral_filter(noisy, 15)
+    for method in ('grid', 'guided'):
+        result = apply_bilateral_filter(noisy, 15, method=method)
+        assert result.shape == noisy.shape and result.dtype == np.uint8, method
+        assert cv2.PSNR(result, exact) > 38, method
+        assert cv2.PSNR(result, clean) > cv2.PSNR(noisy, clean) + 10, method
+        # Both sides of the step stay at their own level
+        assert abs(result[:, 70:76].mean() - 60) < 3, method
+        assert abs(result[:, 84:90].mean() - 190) < 3, method
+
+
+def test_bilateral_unknown_method():
+    noisy, _ = make_noisy_step()
+    try:
+        apply_bilateral_filter(noisy, method='nope')
+    except ValueError:
+        return
+    raise AssertionError("unknown method accepted")
+
+
+def test_gaussian_auto():
+    """'auto' is cv2.GaussianBlur below BOX_BLUR_MIN_SIGMA or for truncated kernels, boxes otherwise"""
+    photo = make_photo()
+    small = BOX_BLUR_MIN_SIGMA / 4
+    assert np.array_equal(apply_gaussian_blur(photo, (0, 0), small), cv2.GaussianBlur(photo, (0, 0), small))
+    assert np.array_equal(apply_gaussian_blur(photo, (5, 5), 15), cv2.GaussianBlur(photo, (5, 5), 15))
+
+    result = apply_gaussian_blur(photo, (0, 0), 15)
+    assert np.array_equal(result, box_gaussian_blur(photo, 15))
+    assert result.shape == photo.shape and result.dtype == np.uint8
+    assert cv2.PSNR(result, cv2.GaussianBlur(photo, (0, 0), 15)) > 45
+
+
+def test_histogram_equalization_modes():
+    """'global' and 'clahe' equalize the Y channel only; unknown modes raise"""
+    photo = cv2.convertScaleAbs(make_photo(), alpha=0.4, beta=80)
+    yuv = cv2.cvtColor(photo, cv2.COLOR_BGR2YUV)
+    for method, y in (('global', cv2.equalizeHist(yuv[:, :, 0])),
+                      ('clahe', cv2.createCLAHE(2.0, (8, 8)).apply(yuv[:, :, 0]))):
+        expected = yuv.copy()
+        expected[:, :, 0] = y
+        result = apply_histogram_equalization(photo, method)
+        assert np.array_equal(result, cv2.cvtColor(expected, cv2.COLOR_YUV2BGR)), method
+        assert result.std() > photo.std(), method
+    try:
+        apply_histogram_equalization(photo, 'nope')
+    except ValueError:
+        return
+    raise AssertionError("unknown method accepted")
+
+
+def _relative_error(result, reference):
+    return float(np.abs(result - reference).max() / np.abs(reference).max())
+
+
+def test_gradient_engine_corners():
+    """Harris and Shi-Tomasi responses match cv2 for uint8 and float32 images"""
+    gray = cv2.cvtColor(make_photo(), cv2.COLOR_BGR2GRAY)
+    for img in (gray, gray.astype(np.float32) / 255):
+        for ksize in (1, 3):
+            engine = GradientEngine(ksize)
+            engine.compute(img)
+            harris = engine.harris(2, 0.04).copy()
+            assert _relative_error(harris, cv2.cornerHarris(img, 2, ksize, 0.04)) < 1e-4, (img.dtype, ksize)
+            # cv2.cornerMinEigenVal takes its own ksize=1 path; the eigenvalues
+            # of cv2.cornerEigenValsAndVecs are the definition
+            eigen = cv2.cornerEigenValsAndVecs(img, 3, ksize)
+            smaller = np.minimum(eigen[:, :, 0], eigen[:, :, 1])
+            assert _relative_error(engine.min_eigenvalue(3), smaller) < 1e-4, (img.dtype, ksize)
+        engine = GradientEngine(3)
+        engine.compute(img)
+        assert _relative_error(engine.min_eigenvalue(3), cv2.cornerMinEigenVal(img, 3, 3)) < 1e-4, img.dtype
+
+
+def test_gradient_engine_edges():
+    """apply_canny equals cv2.Canny; apply_sobel keeps a flat image black"""
+    photo = make_photo()
+    gray = cv2.cvtColor(photo, cv2.COLOR_BGR2GRAY)
+    edges = apply_canny(photo)
+    assert edges.shape == photo.shape
+    assert np.array_equal(edges[:, :, 0], cv2.Canny(gray, 50, 150))
+
+    magnitude = apply_sobel(photo)
+    assert magnitude.shape == photo.shape and magnitude.max() == 255
+    assert not apply_sobel(np.full_like(photo, 128)).any()
+
+
+def test_slic_fast():
+    """'fast' SLIC gives about n_segments connected superpixels and warm-starts"""
+    photo = make_photo()
+    labels, centers = slic_superpixels(photo, 100)
+    assert labels.shape == photo.shape[:2] and labels.dtype == np.int32
+    ids = np.unique(labels)
+    assert 70 <= len(ids) <= 130
+    for i in ids:
+        count, _ = cv2.connectedComponents((labels == i).view(np.uint8), connectivity=4)
+        assert count == 2, i
+
+    warm, _ = slic_superpixels(photo, 100, max_iter=3, centers=centers)
+    assert np.mean(warm == labels) > 0.9
+
+    result = apply_slic_segmentation(photo, 100, method='fast')
+    assert result.shape == photo.shape and result.dtype == np.uint8
+
+
+def make_touching_discs():
+    """Two overlapping dark discs on a light background"""
+    img = np.full((200, 300, 3), 230, dtype=np.uint8)
+    cv2.circle(img, (110, 100), 50, (30, 30, 30), -1)
+    cv2.circle(img, (190, 100), 50, (30, 30, 30), -1)
+    return img
+
+
+def test_watershed_regions():
+    """Touching discs split into one region each; markers_count caps the regions"""
+    img = make_touching_discs()
+    for downscale in (1, 2):
+        labels, stats = watershed_regions(img, downscale=downscale)
+        assert labels.shape == img.shape[:2] and labels.dtype == np.int32
+        assert list(stats['label']) == [1, 2], downscale
+        # Regions split at the neck (x = 150) and hold about half the pixels each
+        centroids_x = sorted(float(c[1]) for c in stats['centroid'])
+        assert abs(centroids_x[0] - 100) < 10 and abs(centroids_x[1] - 200) < 10, downscale
+        assert np.all(np.abs(stats['mean_intensity'] - 30) < 1), downscale
+
+    labels, stats = watershed_regions(img, markers_count=1)
+    assert list(stats['label']) == [1]
+
+    result = apply_watershed(img)
+    assert result.shape == img.shape and result.dtype == np.uint8
+
+
+if __name__ == "__main__":
+    print("🧪 Testing algorithm modes...\n")
+
+    failed = 0
+    for name, test in sorted(globals().items()):
+        if not name.startswith('test_') or not callable(test):
+            continue
+        try:
+            test()
+            print(f"✅ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {e!r}")
+
+    if failed:
+        print(f"\n⚠️  {failed} test(s) failed")
+        sys.exit(1)
+    print("\n🚀 All algorithm tests passed!")